@@ -0,0 +1,110 @@
+"""
+Fingerprint index benchmark
+Builds a local fingerprint index from a synthetic corpus (random melodies of
+harmonic tones), then queries it with noisy excerpts of indexed tracks and
+with excerpts of tracks that were never indexed. Reports recall, precision,
+false matches on unknown tracks and the latency of a local lookup.
+
+Usage: python benchmarks/bench_fingerprint.py [tracks] [queries]
+"""
+
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Add project directory to Python path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.fingerprint import SAMPLE_RATE, FingerprintIndex, fingerprint
+
+TRACK_SECONDS = 90
+CLIP_SECONDS = 8
+# Signal-to-noise ratios of the queries, in dB
+NOISE_LEVELS = (20, 10, 5, 0)
+
+
+def synthetic_track(rng: np.random.Generator, seconds: float = TRACK_SECONDS) -> np.ndarray:
+    """A melody of harmonic notes with random pitches and lengths"""
+    samples = []
+    total = 0
+    while total < seconds * SAMPLE_RATE:
+        length = int(SAMPLE_RATE * rng.uniform(0.15, 0.6))
+        t = np.arange(length) / SAMPLE_RATE
+        pitch = 110 * 2 ** (rng.integers(0, 36) / 12)
+        chord = [pitch, pitch * 2 ** (rng.choice([3, 4, 7]) / 12)]
+        note = sum(
+            np.sin(2 * np.pi * f * harmonic * t) / harmonic
+            for f in chord
+            for harmonic in (1, 2, 3)
+            if f * harmonic < SAMPLE_RATE / 2
+        )
+        envelope = np.exp(-t * rng.uniform(2, 8))
+        samples.append((note * envelope).astype(np.float32))
+        total += length
+    track = np.concatenate(samples)[:int(seconds * SAMPLE_RATE)]
+    return track / np.abs(track).max() * 0.8
+
+
+def excerpt(rng: np.random.Generator, track: np.ndarray, snr_db: float) -> np.ndarray:
+    """A random clip of the track with white noise and a gain change"""
+    start = rng.integers(0, len(track) - CLIP_SECONDS * SAMPLE_RATE)
+    clip = track[start:start + CLIP_SECONDS * SAMPLE_RATE] * rng.uniform(0.3, 1.0)
+    noise = rng.normal(0, 1, len(clip)).astype(np.float32)
+    noise *= np.sqrt(np.mean(clip ** 2) / 10 ** (snr_db / 10)) / noise.std()
+    return clip + noise
+
+
+def main():
+    tracks = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    queries = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    rng = np.random.default_rng(7)
+
+    corpus = [synthetic_track(rng) for _ in range(tracks)]
+    unknown = [synthetic_track(rng) for _ in range(max(1, queries // 5))]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index = FingerprintIndex(str(Path(tmp) / 'fingerprints.sqlite3'))
+
+        start = time.perf_counter()
+        hash_count = 0
+        for i, track in enumerate(corpus):
+            hashes, offsets = fingerprint(track)
+            index.add(f'synthetic:{i}', {'title': str(i)}, hashes, offsets)
+            hash_count += len(hashes)
+        build = time.perf_counter() - start
+        print(f"Indexed {tracks} tracks of {TRACK_SECONDS}s: {hash_count / tracks:.0f} hashes/track, "
+              f"{build / tracks * 1000:.1f} ms/track")
+
+        print(f"\n{'SNR':>6} {'recall':>8} {'precision':>10} {'p50 ms':>8} {'p95 ms':>8}")
+        for snr_db in NOISE_LEVELS:
+            correct = wrong = 0
+            latencies = []
+            for _ in range(queries):
+                expected = int(rng.integers(0, tracks))
+                clip = excerpt(rng, corpus[expected], snr_db)
+                start = time.perf_counter()
+                match = index.match(*fingerprint(clip))
+                latencies.append((time.perf_counter() - start) * 1000)
+                if match:
+                    if match[0]['title'] == str(expected):
+                        correct += 1
+                    else:
+                        wrong += 1
+            latencies.sort()
+            precision = correct / (correct + wrong) if correct + wrong else 1.0
+            print(f"{snr_db:>4}dB {correct / queries:>8.0%} {precision:>10.0%} "
+                  f"{statistics.median(latencies):>8.1f} {latencies[int(len(latencies) * 0.95) - 1]:>8.1f}")
+
+        false_matches = sum(
+            1 for track in unknown for _ in range(5) if index.match(*fingerprint(excerpt(rng, track, 10)))
+        )
+        print(f"\nFalse matches on {len(unknown) * 5} clips of unindexed tracks: {false_matches}")
+        index.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Logging cost benchmark
+Measures what one logger.info() call costs the calling thread with the old
+synchronous FileHandler + StreamHandler setup and with the queue-based
+setup from src.logging_setup.
+
+Usage: python benchmarks/bench_logging.py
+"""
+
+import io
+import logging
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add project directory to Python path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src import logging_setup
+
+CALLS = 20000
+
+
+def measure(logger: logging.Logger) -> float:
+    """Average microseconds per call on the calling thread"""
+    start = time.perf_counter()
+    for i in range(CALLS):
+        logger.info("Media cache hit for %s", f"https://youtu.be/{i:011d}")
+    return (time.perf_counter() - start) / CALLS * 1e6
+
+
+def reset_root():
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        handler.close()
+
+
+def main():
+    # Console output goes to a buffer so the terminal doesn't dominate
+    stdout, sys.stdout = sys.stdout, io.StringIO()
+    try:
+        with tempfile.TemporaryDirectory() as log_dir:
+            reset_root()
+            formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+            for handler in (logging.FileHandler(Path(log_dir) / 'sync.log'), logging.StreamHandler(sys.stdout)):
+                handler.setFormatter(formatter)
+                logging.getLogger().addHandler(handler)
+            logging.getLogger().setLevel(logging.INFO)
+            sync_cost = measure(logging.getLogger('bench'))
+            reset_root()
+
+            logging_setup.setup_logging(log_dir)
+            queued_cost = measure(logging.getLogger('bench'))
+            drain_start = time.perf_counter()
+            logging_setup.stop_logging()
+            drain = time.perf_counter() - drain_start
+    finally:
+        sys.stdout = stdout
+
+    print(f"{CALLS} calls")
+    print(f"  FileHandler + StreamHandler: {sync_cost:6.1f} us/call on the caller")
+    print(f"  LazyQueueHandler:            {queued_cost:6.1f} us/call on the caller"
+          f" (listener drained the backlog in {drain:.2f}s)")
+
+
+if __name__ == '__main__':
+    main()
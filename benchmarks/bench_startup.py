@@ -0,0 +1,102 @@
+"""
+Cold start benchmark
+Imports src.main_optimized under ``python -X importtime`` in a fresh
+interpreter, lists the most expensive imports and checks that the heavy
+optional modules are no longer loaded at startup. Then measures the time
+until the bot is ready to fetch its first update (imports plus building the
+Application) against STARTUP_TARGET.
+
+Usage: python benchmarks/bench_startup.py [runs]
+"""
+
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+
+# Seconds from interpreter start until polling can begin
+STARTUP_TARGET = 1.5
+
+# Modules that must not be imported before the first request needs them
+DEFERRED_MODULES = ('yt_dlp', 'shazamio', 'spotipy', 'bs4', 'requests', 'psutil', 'numpy')
+
+IMPORTTIME_LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+READY_SCRIPT = """
+import src.main_optimized as m
+m.Application.builder().token('123456:TEST').rate_limiter(m.PriorityRateLimiter()).build()
+"""
+
+
+def run_python(args, **kwargs):
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+    return subprocess.run(
+        [sys.executable, *args], cwd=PROJECT_DIR, env=env, capture_output=True, text=True, **kwargs
+    )
+
+
+def import_profile():
+    """Return (cumulative us, depth, module) for every import of src.main_optimized"""
+    result = run_python(['-X', 'importtime', '-c', 'import src.main_optimized'])
+    if result.returncode != 0:
+        sys.exit(f"Importing src.main_optimized failed:\n{result.stderr[-2000:]}")
+
+    imports = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            cumulative, indent, module = int(match.group(2)), len(match.group(3)), match.group(4)
+            imports.append((cumulative, indent, module))
+    return imports
+
+
+def time_to_ready(runs):
+    """Wall time of a fresh interpreter importing the bot and building the Application"""
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = run_python(['-c', READY_SCRIPT])
+        samples.append(time.perf_counter() - start)
+        if result.returncode != 0:
+            sys.exit(f"Startup script failed:\n{result.stderr[-2000:]}")
+    return samples
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    imports = import_profile()
+    total = max(cumulative for cumulative, _, module in imports if module == 'src.main_optimized')
+
+    # The outermost import of a package has the largest cumulative time
+    packages = {}
+    for cumulative, _, module in imports:
+        package = module.split('.')[0]
+        if package not in ('src', 'config'):
+            packages[package] = max(packages.get(package, 0), cumulative)
+
+    print(f"Importing src.main_optimized: {total / 1000:.0f} ms")
+    print("Most expensive packages:")
+    for package, cumulative in sorted(packages.items(), key=lambda item: -item[1])[:15]:
+        print(f"  {cumulative / 1000:8.1f} ms  {package}")
+
+    loaded = {module.split('.')[0] for _, _, module in imports}
+    eager = [module for module in DEFERRED_MODULES if module in loaded]
+    print(f"Deferred modules loaded at startup: {', '.join(eager) if eager else 'none'}")
+
+    samples = time_to_ready(runs)
+    median = statistics.median(samples)
+    verdict = 'OK' if median <= STARTUP_TARGET else 'OVER TARGET'
+    print(f"\nTime to ready for the first update: median {median:.2f}s over {runs} runs "
+          f"(target {STARTUP_TARGET:.1f}s) {verdict}")
+
+    sys.exit(0 if median <= STARTUP_TARGET and not eager else 1)
+
+
+if __name__ == '__main__':
+    main()
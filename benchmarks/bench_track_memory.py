@@ -0,0 +1,170 @@
+"""
+Track record memory benchmark
+Builds synthetic Shazam track responses shaped like real ones (hub
+actions and providers, song, lyrics, video and related sections, share
+links, images), parses them as the bot receives them and measures the
+memory a cache holds per track: the raw dict as before, and the compact
+Track built from it.
+
+Usage: python benchmarks/bench_track_memory.py [tracks]
+"""
+
+import gc
+import json
+import random
+import sys
+import tracemalloc
+from pathlib import Path
+
+# Add project directory to Python path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.track import Track
+
+# Cached tracks repeat artists and albums
+ARTISTS = 60
+ALBUMS_PER_ARTIST = 3
+LYRICS_LINES = 40
+
+
+def words(rng: random.Random, count: int) -> str:
+    return ' '.join(rng.choice(('love', 'night', 'fire', 'heart', 'rain', 'go', 'stay', 'light', 'dream', 'home'))
+                    for _ in range(count))
+
+
+def shazam_track(rng: random.Random, i: int) -> str:
+    """One track as Shazam's JSON API returns it"""
+    artist_id = rng.randrange(ARTISTS)
+    artist = f"Artist {artist_id}"
+    album = f"Album {artist_id}-{rng.randrange(ALBUMS_PER_ARTIST)}"
+    title = words(rng, 3).title()
+    key = str(400000000 + i)
+    art = f"https://is1-ssl.mzstatic.com/image/thumb/Music/v4/{i:08x}/400x400cc.jpg"
+    track = {
+        'layout': '5',
+        'type': 'MUSIC',
+        'key': key,
+        'title': title,
+        'subtitle': artist,
+        'images': {
+            'background': art.replace('400x400', '800x800'),
+            'coverart': art,
+            'coverarthq': art.replace('400x400', '1000x1000'),
+            'joecolor': 'b:0a0a0a p:f2e3d1 s:d6c0a8 t:c4b6a8 q:ad9c88',
+        },
+        'share': {
+            'subject': f'{title} - {artist}',
+            'text': f'I used Shazam to discover {title} by {artist}.',
+            'href': f'https://www.shazam.com/track/{key}/{title.lower().replace(" ", "-")}',
+            'image': art,
+            'twitter': f'I used @Shazam to discover {title} by {artist}.',
+            'html': f'https://www.shazam.com/snippets/email-share/{key}?lang=en-US&country=US',
+            'avatar': art,
+            'snapchat': f'https://www.shazam.com/partner/sc/track/{key}',
+        },
+        'hub': {
+            'type': 'APPLEMUSIC',
+            'image': 'https://images.shazam.com/static/icons/hub/ios/v5/applemusic_{scalefactor}.png',
+            'actions': [
+                {'name': 'apple', 'type': 'applemusicplay', 'id': str(1500000000 + i)},
+                {'name': 'apple', 'type': 'uri', 'uri': f'https://audio-ssl.itunes.apple.com/itunes-assets/AudioPreview/{i:08x}.m4a'},
+            ],
+            'options': [{
+                'caption': 'OPEN',
+                'actions': [
+                    {'name': 'hub:applemusic:deeplink', 'type': 'applemusicopen',
+                     'uri': f'https://music.apple.com/us/album/{album.lower().replace(" ", "-")}/{i}?i={i}'},
+                ],
+                'beacondata': {'type': 'open', 'providername': 'applemusic'},
+                'image': 'https://images.shazam.com/static/icons/hub/ios/v5/overflow-open-option_{scalefactor}.png',
+                'type': 'open',
+                'listcaption': 'Open in Apple Music',
+                'overflowimage': 'https://images.shazam.com/static/icons/hub/ios/v5/applemusic-overflow_{scalefactor}.png',
+                'colouroverflowimage': False,
+                'providername': 'applemusic',
+            }],
+            'providers': [
+                {
+                    'caption': f'Open in {name}',
+                    'images': {
+                        'overflow': f'https://images.shazam.com/static/icons/hub/ios/v5/{name}-overflow_{{scalefactor}}.png',
+                        'default': f'https://images.shazam.com/static/icons/hub/ios/v5/{name}_{{scalefactor}}.png',
+                    },
+                    'actions': [
+                        {'name': f'hub:{name}:searchdeeplink', 'type': 'uri',
+                         'uri': f'{name}:search:{title.replace(" ", "%20")}%20{artist.replace(" ", "%20")}'},
+                    ],
+                    'type': name.upper(),
+                }
+                for name in ('spotify', 'deezer')
+            ],
+            'explicit': False,
+            'displayname': 'APPLE MUSIC',
+        },
+        'sections': [
+            {
+                'type': 'SONG',
+                'metadata': [
+                    {'title': 'Album', 'text': album},
+                    {'title': 'Label', 'text': f'{artist} Records'},
+                    {'title': 'Released', 'text': str(rng.randrange(1980, 2025))},
+                ],
+                'metapages': [{'image': art, 'caption': title}, {'image': art, 'caption': artist}],
+                'tabname': 'Song',
+            },
+            {
+                'type': 'LYRICS',
+                'text': [words(rng, rng.randrange(4, 9)) for _ in range(LYRICS_LINES)],
+                'footer': f'Writer(s): {artist}\nLyrics powered by www.musixmatch.com',
+                'tabname': 'Lyrics',
+                'beacondata': {'lyricsid': str(30000000 + i), 'providername': 'musixmatch', 'commontrackid': str(i)},
+            },
+            {
+                'type': 'VIDEO',
+                'tabname': 'Video',
+                'youtubeurl': f'https://cdn.shazam.com/video/v3/-/US/web/{key}/youtube/video?q={title}',
+            },
+            {'type': 'RELATED', 'url': f'https://cdn.shazam.com/shazam/v3/en/US/web/-/tracks/track-similarities-id-{key}'},
+        ],
+        'url': f'https://www.shazam.com/track/{key}',
+        'artists': [{'id': str(artist_id), 'adamid': str(100000 + artist_id)}],
+        'isrc': f'USRC1{i:07d}',
+        'genres': {'primary': 'Pop'},
+        'urlparams': {'{tracktitle}': title.replace(' ', '+'), '{trackartist}': artist.replace(' ', '+')},
+        'myshazam': {'apple': {'actions': [{'name': 'myshazam:apple', 'type': 'uri', 'uri': f'https://music.apple.com/{i}'}]}},
+        'albumadamid': str(1500000000 + i),
+        'trackadamid': str(1500000000 + i),
+        'releasedate': '01-01-2020',
+    }
+    return json.dumps(track)
+
+
+def retained(build) -> int:
+    """Bytes still allocated after build() returns its result"""
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    rng = random.Random(3)
+    responses = [shazam_track(rng, i) for i in range(count)]
+    print(f"{count} tracks, {sum(map(len, responses)) / count / 1024:.1f} KB of JSON each")
+
+    raw = retained(lambda: [json.loads(response) for response in responses])
+    compact = retained(lambda: [Track.from_shazam(json.loads(response)) for response in responses])
+
+    print(f"\n{'cached as':>12} {'bytes/track':>12}")
+    print(f"{'raw dict':>12} {raw / count:>12.0f}")
+    print(f"{'Track':>12} {compact / count:>12.0f}")
+    print(f"\n{raw / compact:.0f}x smaller, {(raw - compact) / 1024 / 1024:.1f} MB saved per {count} cached tracks")
+
+
+if __name__ == '__main__':
+    main()
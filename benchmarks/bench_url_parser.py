@@ -0,0 +1,94 @@
+"""
+Microbenchmark for URL classification
+Compares the old substring scan over SUPPORTED_PLATFORMS with the
+host-suffix lookup in src/url_parser.py on a corpus of real links.
+
+Usage: python benchmarks/bench_url_parser.py
+"""
+
+import sys
+import timeit
+from pathlib import Path
+from urllib.parse import urlsplit
+
+# Add project directory to Python path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from config.config import SUPPORTED_PLATFORMS
+from src.url_parser import extract_urls, lookup_platform, parse_url
+
+# Links as users actually paste them, including tracking parameters
+CORPUS = [
+    "https://www.youtube.com/watch?v=dQw4w9WgXcQ",
+    "https://youtu.be/dQw4w9WgXcQ?si=Q7mV0gE7l9xqG1jk",
+    "https://www.youtube.com/watch?v=kJQP7kiw5Fk&t=30s",
+    "https://music.youtube.com/watch?v=fJ9rUzIMcZQ&feature=share",
+    "https://m.youtube.com/watch?v=9bZkp7q19f0&pp=ygUKZ2FuZ25hbSBzdHlsZQ%3D%3D",
+    "https://www.youtube.com/shorts/Ox3G8H9rZfk",
+    "https://youtube.com/shorts/Ox3G8H9rZfk?feature=share",
+    "https://www.youtube.com/playlist?list=PLFgquLnL59alCl_2TQvOiD5Vgm1hCaGSI",
+    "https://www.youtube.com/embed/hTWKbfoikeg?autoplay=1",
+    "https://www.instagram.com/reel/C4xQk2JLw1P/?igsh=MWd0ZXhrY3Ntb2N2bQ==",
+    "https://www.instagram.com/p/C3Z9vXqsYtL/?utm_source=ig_web_copy_link",
+    "https://instagram.com/reels/C5aBcDeFgHi/",
+    "https://www.tiktok.com/@khaby.lame/video/7181562314651209989",
+    "https://www.tiktok.com/@bellapoarch/video/6862153058223197445?is_from_webapp=1&sender_device=pc",
+    "https://vm.tiktok.com/ZMYQ7q3kX/",
+    "https://www.tiktok.com/t/ZT8Fq1XyZ/",
+    "https://www.pinterest.com/pin/763586361004447766/",
+    "https://pinterest.com/pin/lofi-girl-aesthetic--437201076329393547/",
+    "https://www.pinterest.com/pin/99149629291776474/?mt=login",
+    "https://soundcloud.com/octobersveryown/drake-hotline-bling",
+    "https://soundcloud.com/flume/never-be-like-you-feat-kai?si=1c2d3e4f&utm_medium=text",
+    "https://m.soundcloud.com/kygo/firestone",
+    "https://soundcloud.com/lofi_girl/sets/lofi-hip-hop-radio",
+    # Unsupported or hostile links
+    "https://evil.com/?r=youtube.com",
+    "https://youtube.com.evil.example/watch?v=dQw4w9WgXcQ",
+    "https://open.spotify.com/track/4cOdK2wGLETKBW3PvgPWqT",
+    "https://t.me/some_channel/1234",
+    "https://en.wikipedia.org/wiki/Shazam_(application)",
+]
+
+MESSAGE = "check these out " + " and ".join(CORPUS[:6]) + " thanks!"
+
+
+def legacy_detect_platform(url):
+    """The substring scan src/main_optimized.py used before src/url_parser.py"""
+    for platform, domains in SUPPORTED_PLATFORMS.items():
+        for domain in domains:
+            if domain in url:
+                return platform
+    return None
+
+
+def run(label, func, number):
+    """Time one pass over the corpus and print per-URL cost"""
+    best = min(timeit.repeat(func, number=number, repeat=5))
+    per_url = best / (number * len(CORPUS)) * 1e9
+    print(f"{label:<28} {per_url:8.0f} ns/url")
+
+
+def main():
+    number = 2000
+
+    print(f"Corpus: {len(CORPUS)} links\n")
+    run("legacy substring scan", lambda: [legacy_detect_platform(u) for u in CORPUS], number)
+    run("host suffix lookup", lambda: [lookup_platform(urlsplit(u).hostname) for u in CORPUS], number)
+    run("parse_url (platform + id)", lambda: [parse_url(u) for u in CORPUS], number)
+
+    best = min(timeit.repeat(lambda: extract_urls(MESSAGE), number=number, repeat=5))
+    print(f"{'extract_urls (6-link msg)':<28} {best / number * 1e6:8.1f} us/message")
+
+    misclassified = [
+        u for u in CORPUS
+        if legacy_detect_platform(u) != (parse_url(u).platform if parse_url(u) else None)
+    ]
+    print("\nLinks the legacy scan classifies differently:")
+    for url in misclassified:
+        parsed = parse_url(url)
+        print(f"  {url}\n    legacy={legacy_detect_platform(url)} parser={parsed.platform if parsed else None}")
+
+
+if __name__ == '__main__':
+    main()
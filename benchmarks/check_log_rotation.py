@@ -0,0 +1,55 @@
+"""
+Log rotation check
+Writes numbered records through a SizedTimedRotatingFileHandler with a
+small size limit in a temporary directory and checks that rotation keeps
+the newest records: the last backup_count backups plus the current file
+hold an unbroken run of records ending with the last one written.
+
+Usage: python benchmarks/check_log_rotation.py
+"""
+
+import logging
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Add project directory to Python path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.logging_setup import SizedTimedRotatingFileHandler
+
+RECORDS = 500
+BACKUP_COUNT = 3
+
+
+def check(condition: bool, message: str):
+    print(f"{'ok' if condition else 'FAILED'}: {message}")
+    if not condition:
+        sys.exit(1)
+
+
+def main():
+    with tempfile.TemporaryDirectory() as root:
+        handler = SizedTimedRotatingFileHandler(os.path.join(root, 'bot.log'), max_bytes=2000, backup_count=BACKUP_COUNT)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger = logging.getLogger('check_log_rotation')
+        logger.propagate = False
+        logger.addHandler(handler)
+        for number in range(RECORDS):
+            logger.warning("record %05d %s", number, 'x' * 40)
+        handler.close()
+
+        names = sorted(os.listdir(root))
+        backups = [name for name in names if name != 'bot.log']
+        check(len(backups) == BACKUP_COUNT, f"{BACKUP_COUNT} backups kept: {', '.join(backups)}")
+
+        kept = []
+        for name in backups + ['bot.log']:
+            kept += [int(line.split()[1]) for line in Path(root, name).read_text().splitlines()]
+        check(kept[-1] == RECORDS - 1, "the last record is kept")
+        check(kept == list(range(kept[0], RECORDS)), f"records {kept[0]}-{RECORDS - 1} are kept in order without gaps")
+
+
+if __name__ == '__main__':
+    main()
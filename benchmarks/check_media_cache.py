@@ -0,0 +1,108 @@
+"""
+Media cache check
+Puts files into a MediaCache in a temporary directory and checks that
+every returned path exists and the index and size accounting stay right:
+a new key, the same content under another key (deduplicated), the same
+content under the same key again, new content under an existing key,
+eviction over the size budget, pinned files surviving eviction, reloading
+the index from disk and a filesystem that refuses hardlinks.
+
+Usage: python benchmarks/check_media_cache.py
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Add project directory to Python path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.media_cache import MediaCache
+
+
+def download(cache: MediaCache, name: str, content: bytes) -> str:
+    """A finished download in the cache's staging area"""
+    path = cache.tmp_dir / f"{name}.mp3"
+    path.write_bytes(content)
+    return str(path)
+
+
+def check(condition: bool, message: str):
+    print(f"{'ok' if condition else 'FAILED'}: {message}")
+    if not condition:
+        sys.exit(1)
+
+
+def cached(cache: MediaCache, key: str, content: bytes) -> bool:
+    path = cache.get(key)
+    return path is not None and Path(path).read_bytes() == content
+
+
+def main():
+    with tempfile.TemporaryDirectory() as root:
+        cache = MediaCache(root, max_bytes=1000)
+        a, b = b'a' * 300, b'b' * 300
+
+        path = cache.put('one', download(cache, 'one', a))
+        check(Path(path).exists() and cached(cache, 'one', a), "new key is cached")
+
+        cache.put('two', download(cache, 'two', a))
+        check(cached(cache, 'two', a) and cache.stats()['blobs'] == 1, "same content under another key shares its blob")
+
+        path = cache.put('one', download(cache, 'again', a))
+        check(Path(path).exists() and cached(cache, 'one', a), "same content under the same key again")
+
+        cache.put('two', download(cache, 'new', b))
+        check(cached(cache, 'two', b) and cached(cache, 'one', a), "new content under an existing key")
+        check(cache.stats()['blobs'] == 2 and cache.total_bytes == 600, "size accounting after replacing content")
+
+        path = cache.put('solo', download(cache, 'solo', b'c' * 300))
+        path = cache.put('solo', download(cache, 'solo-again', b'c' * 300))
+        check(Path(path).exists() and cached(cache, 'solo', b'c' * 300), "re-put of a key that is its blob's only link")
+
+        cache.put('three', download(cache, 'three', b'd' * 300))
+        check(cache.total_bytes <= 1000 and cached(cache, 'three', b'd' * 300), "least recently used content is evicted")
+
+        cache.pin('three')
+        pinned = cache.get('three')
+        for name in ('e', 'f', 'g'):
+            cache.put(name, download(cache, name, name.encode() * 300))
+        check(cached(cache, 'three', b'd' * 300), "a pinned file is not evicted")
+        cache.resize(0)
+        check('three' in cache, "a pinned file survives a lowered budget")
+        cache.release(pinned)
+        cache.resize(1000)
+        cache.put('h', download(cache, 'h', b'h' * 300))
+        cache.resize(0)
+        check('three' not in cache and cache.stats()['entries'] == 1, "a released file is evicted again")
+        cache.resize(1000)
+
+        staged = download(cache, 'staged', b'i' * 10)
+        cache.release(staged)
+        check(not os.path.exists(staged), "a file outside the cache is removed on release")
+
+        entries = cache.stats()['entries']
+        reloaded = MediaCache(root, max_bytes=1000)
+        check(reloaded.stats()['entries'] == entries and reloaded.total_bytes == cache.total_bytes, "index reloads from disk")
+
+    with tempfile.TemporaryDirectory() as root:
+        cache = MediaCache(root, max_bytes=1000)
+        cache.put('one', download(cache, 'one', b'a' * 300))
+        link = os.link
+
+        def refuse(*args, **kwargs):
+            raise OSError("hardlinks not supported")
+
+        os.link = refuse
+        try:
+            path = cache.put('two', download(cache, 'two', b'b' * 300))
+            check(not cache.contains(path) and Path(path).read_bytes() == b'b' * 300, "a failed link hands back a plain file")
+            check(not cache.enabled and cache.get('one') is None, "a failed link turns the cache off")
+            check(not MediaCache(root, max_bytes=1000).enabled, "no hardlinks at startup turns the cache off")
+        finally:
+            os.link = link
+
+
+if __name__ == '__main__':
+    main()
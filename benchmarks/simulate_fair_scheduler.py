@@ -0,0 +1,127 @@
+"""
+Fair scheduler simulator
+Ten regular users and the admin send links at a steady rate while one
+abusive user floods the bot with twice as many downloads as it can serve.
+The same load runs against a plain FIFO semaphore and against
+FairScheduler (without and with an hourly quota), and the latency of each
+group of users is reported.
+
+Simulated time runs SPEED times faster than the wall clock so the run
+takes seconds instead of minutes; latencies are reported in simulated time.
+
+Usage: python benchmarks/simulate_fair_scheduler.py
+"""
+
+import asyncio
+import random
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+# Add project directory to Python path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.fair_scheduler import FairScheduler, QuotaExceeded
+
+SPEED = 20
+DURATION = 300  # simulated seconds of arrivals
+CAPACITY = 3  # download slots
+SERVICE_SECONDS = (1.0, 3.0)  # download time, uniform
+
+ADMIN = 1
+ABUSER = 666
+REGULAR_USERS = [1000 + i for i in range(10)]
+REGULAR_INTERVAL = 12  # mean seconds between links of a regular user
+ADMIN_INTERVAL = 20
+ABUSER_RATE = 3  # links per second, twice what the slots can serve
+
+
+class FifoScheduler:
+    """What the bot did before: one queue, first come first served"""
+
+    name = 'fifo'
+
+    def __init__(self, capacity):
+        self.semaphore = asyncio.Semaphore(capacity)
+
+    def slot(self, user_id, chat_id=None):
+        return self.semaphore
+
+
+def group(user_id):
+    if user_id == ADMIN:
+        return 'admin'
+    if user_id == ABUSER:
+        return 'abuser'
+    return 'regular'
+
+
+async def request(scheduler, user_id, rng, latencies, outcomes):
+    start = time.monotonic()
+    try:
+        async with scheduler.slot(user_id, user_id):
+            await asyncio.sleep(rng.uniform(*SERVICE_SECONDS) / SPEED)
+    except QuotaExceeded:
+        outcomes[group(user_id)]['rejected'] += 1
+        return
+    latencies[group(user_id)].append((time.monotonic() - start) * SPEED)
+    outcomes[group(user_id)]['served'] += 1
+
+
+async def arrivals(scheduler, user_id, rate, rng, tasks, latencies, outcomes):
+    """Poisson arrivals of one user until the end of the run"""
+    end = time.monotonic() + DURATION / SPEED
+    while True:
+        await asyncio.sleep(rng.expovariate(rate) / SPEED)
+        if time.monotonic() >= end:
+            return
+        outcomes[group(user_id)]['submitted'] += 1
+        tasks.append(asyncio.ensure_future(request(scheduler, user_id, rng, latencies, outcomes)))
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else float('nan')
+
+
+async def run(name, scheduler):
+    rng = random.Random(11)
+    latencies = defaultdict(list)
+    outcomes = defaultdict(lambda: {'submitted': 0, 'served': 0, 'rejected': 0})
+    tasks = []
+
+    sources = [(user_id, 1 / REGULAR_INTERVAL) for user_id in REGULAR_USERS]
+    sources += [(ADMIN, 1 / ADMIN_INTERVAL), (ABUSER, ABUSER_RATE)]
+    await asyncio.gather(*(
+        arrivals(scheduler, user_id, rate, rng, tasks, latencies, outcomes) for user_id, rate in sources
+    ))
+    # Whatever is still queued when arrivals stop is cut off
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    print(f"\n{name}")
+    print(f"{'users':>8} {'served':>7} {'cut off':>8} {'quota':>6} {'p50 s':>7} {'p95 s':>7} {'p99 s':>7} {'max s':>7}")
+    for label in ('regular', 'admin', 'abuser'):
+        values = sorted(latencies[label])
+        submitted, served, rejected = (outcomes[label][key] for key in ('submitted', 'served', 'rejected'))
+        print(f"{label:>8} {served:>7} {submitted - served - rejected:>8} {rejected:>6} "
+              f"{percentile(values, 0.5):>7.1f} {percentile(values, 0.95):>7.1f} "
+              f"{percentile(values, 0.99):>7.1f} {values[-1] if values else float('nan'):>7.1f}")
+
+
+def main():
+    print(f"{CAPACITY} slots, {len(REGULAR_USERS)} regular users, the admin and one user sending "
+          f"{ABUSER_RATE} links/s for {DURATION}s (simulated)")
+    weights = {ADMIN: 4}
+    asyncio.run(run('FIFO semaphore', FifoScheduler(CAPACITY)))
+    asyncio.run(run('FairScheduler', FairScheduler(
+        'download', CAPACITY, per_user=2, per_chat=2, weights=weights, exempt=(ADMIN,)
+    )))
+    asyncio.run(run('FairScheduler, 60 per hour quota', FairScheduler(
+        'download', CAPACITY, per_user=2, per_chat=2, hourly_quota=60, weights=weights, exempt=(ADMIN,)
+    )))
+
+
+if __name__ == '__main__':
+    main()
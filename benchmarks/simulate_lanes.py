@@ -0,0 +1,143 @@
+"""
+Latency lane simulator
+Floods the bot with links faster than the download threads can serve them
+while users keep pressing menu buttons and sending voice notes. Runs once
+with one concurrency limit and one thread pool for everything (as before)
+and once with LaneUpdateProcessor and a separate recognition pool, and
+reports the latency of each kind of update.
+
+Simulated time runs SPEED times faster than the wall clock so the run
+takes seconds instead of minutes; latencies are reported in simulated time.
+
+Usage: python benchmarks/simulate_lanes.py
+"""
+
+import asyncio
+import logging
+import random
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+# Add project directory to Python path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from telegram import CallbackQuery, Chat, Message, Update, User, Voice
+from telegram.ext import SimpleUpdateProcessor
+
+from src.lanes import DOWNLOAD, INTERACTIVE, RECOGNITION, LaneUpdateProcessor, update_lane
+
+SPEED = 5
+DURATION = 60  # simulated seconds of arrivals
+
+# Arrivals per second and the work each update does
+LINK_RATE = 4  # a 2s download in a download thread: twice what 3 threads serve
+VOICE_RATE = 1  # 0.1s of decoding and matching in a thread, then 0.4s waiting on Shazam
+CALLBACK_RATE = 2  # 20ms answering the button
+
+DOWNLOAD_THREADS = 3
+RECOGNITION_THREADS = 2
+
+# Updates turned away by a full lane are counted instead of logged
+logging.getLogger('src.lanes').setLevel(logging.ERROR)
+turned_away = defaultdict(int)
+
+USER = User(1, 'user', False)
+CHAT = Chat(1, 'private')
+
+
+def make_update(update_id: int, kind: str) -> Update:
+    if kind == INTERACTIVE:
+        return Update(update_id, callback_query=CallbackQuery(str(update_id), USER, 'menu', data='back_to_main'))
+    date = datetime.now()
+    if kind == RECOGNITION:
+        message = Message(update_id, date, CHAT, from_user=USER, voice=Voice('v', 'v', 5))
+    else:
+        message = Message(update_id, date, CHAT, from_user=USER, text='https://youtu.be/dQw4w9WgXcQ')
+    return Update(update_id, message=message)
+
+
+async def handle(kind: str, pools):
+    loop = asyncio.get_running_loop()
+    if kind == DOWNLOAD:
+        await loop.run_in_executor(pools[DOWNLOAD], time.sleep, 2 / SPEED)
+    elif kind == RECOGNITION:
+        await loop.run_in_executor(pools[RECOGNITION], time.sleep, 0.1 / SPEED)
+        await asyncio.sleep(0.4 / SPEED)
+    else:
+        await asyncio.sleep(0.02 / SPEED)
+
+
+async def timed(kind, pools, latencies, start):
+    await handle(kind, pools)
+    latencies[kind].append((time.monotonic() - start) * SPEED)
+
+
+async def run(name, processor, pools):
+    rng = random.Random(5)
+    latencies = defaultdict(list)
+    tasks = []
+    coroutines = []
+    update_id = 0
+    rates = {DOWNLOAD: LINK_RATE, RECOGNITION: VOICE_RATE, INTERACTIVE: CALLBACK_RATE}
+    total = sum(rates.values())
+
+    end = time.monotonic() + DURATION / SPEED
+    while time.monotonic() < end:
+        await asyncio.sleep(rng.expovariate(total) / SPEED)
+        kind = rng.choices(list(rates), weights=list(rates.values()))[0]
+        update_id += 1
+        update = make_update(update_id, kind)
+        assert update_lane(update) == kind
+        # As Application does for every update it receives
+        coroutine = timed(kind, pools, latencies, time.monotonic())
+        coroutines.append(coroutine)
+        tasks.append(asyncio.ensure_future(processor.process_update(update, coroutine)))
+
+    # Measure what finished during the run, the backlog is cut off
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    for coroutine in coroutines:
+        # Never started if the update was still waiting for a slot
+        coroutine.close()
+
+    print(f"\n{name}")
+    print(f"{'update':>12} {'handled':>8} {'busy':>5} {'p50 s':>7} {'p95 s':>7} {'p99 s':>7}")
+    for kind in (INTERACTIVE, RECOGNITION, DOWNLOAD):
+        values = sorted(latencies[kind])
+        busy = turned_away.pop(kind, 0)
+        if not values:
+            print(f"{kind:>12} {0:>8} {busy:>5}")
+            continue
+        pick = lambda fraction: values[min(len(values) - 1, int(len(values) * fraction))]
+        print(f"{kind:>12} {len(values):>8} {busy:>5} {pick(0.5):>7.2f} {pick(0.95):>7.2f} {pick(0.99):>7.2f}")
+
+
+async def count_turned_away(update, lane):
+    turned_away[lane] += 1
+
+
+def main():
+    print(f"{LINK_RATE} links/s against {DOWNLOAD_THREADS} download threads, "
+          f"{VOICE_RATE} voice notes/s, {CALLBACK_RATE} button presses/s for {DURATION}s (simulated)")
+
+    with ThreadPoolExecutor(DOWNLOAD_THREADS) as shared:
+        pools = {DOWNLOAD: shared, RECOGNITION: shared}
+        asyncio.run(run('One limit (64 updates), one pool', SimpleUpdateProcessor(64), pools))
+
+    with ThreadPoolExecutor(DOWNLOAD_THREADS) as downloads, ThreadPoolExecutor(RECOGNITION_THREADS) as recognition:
+        pools = {DOWNLOAD: downloads, RECOGNITION: recognition}
+        processor = LaneUpdateProcessor(
+            {INTERACTIVE: 16, RECOGNITION: 8, DOWNLOAD: 32},
+            {INTERACTIVE: 64, RECOGNITION: 32, DOWNLOAD: 64},
+            on_full=count_turned_away,
+        )
+        asyncio.run(run('Lanes, separate recognition pool', processor, pools))
+
+
+if __name__ == '__main__':
+    main()
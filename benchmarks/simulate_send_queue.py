@@ -0,0 +1,174 @@
+"""
+Send queue simulator
+Replays a burst of edits, replies and audio uploads against a fake Bot API
+that enforces Telegram's limits and answers 429 with retry_after, once
+sent directly and once through PriorityRateLimiter.
+
+Simulated time runs SPEED times faster than the wall clock so the run
+takes seconds instead of minutes; latencies are reported in simulated time.
+
+Usage: python benchmarks/simulate_send_queue.py
+"""
+
+import asyncio
+import random
+import sys
+import time
+from collections import defaultdict, deque
+from pathlib import Path
+
+# Add project directory to Python path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from telegram.error import RetryAfter
+
+from src.send_queue import PriorityRateLimiter, retry_after_seconds
+
+SPEED = 10
+
+# Telegram's documented limits
+GLOBAL_PER_SECOND = 30
+PRIVATE_PER_SECOND = 1
+GROUP_PER_MINUTE = 20
+
+# Short bursts Telegram tolerates on top of the average rates
+GLOBAL_BURST = 30
+CHAT_BURST = 3
+
+PRIVATE_CHATS = [1000 + i for i in range(20)]
+GROUP_CHATS = [-100 - i for i in range(3)]
+
+
+class FakeBotAPI:
+    """Counts requests in sliding windows and rejects the ones over the limit
+
+    A window of ``period`` simulated seconds admits ``rate * period`` requests
+    plus the burst allowance.
+    """
+
+    def __init__(self):
+        self.global_window = deque()
+        self.chat_windows = defaultdict(deque)
+        self.calls = 0
+        self.rejected = 0
+
+    @staticmethod
+    def _over(window, limit, period, now):
+        while window and now - window[0] > period / SPEED:
+            window.popleft()
+        return len(window) >= limit
+
+    async def call(self, endpoint, chat_id):
+        now = time.monotonic()
+        self.calls += 1
+
+        if chat_id < 0:
+            chat_over = self._over(self.chat_windows[chat_id], GROUP_PER_MINUTE + CHAT_BURST, 60, now)
+        else:
+            chat_over = self._over(self.chat_windows[chat_id], PRIVATE_PER_SECOND + CHAT_BURST, 1, now)
+        global_over = self._over(self.global_window, GLOBAL_PER_SECOND + GLOBAL_BURST, 1, now)
+
+        if chat_over or global_over:
+            self.rejected += 1
+            raise RetryAfter(1)
+
+        self.global_window.append(now)
+        self.chat_windows[chat_id].append(now)
+        # Uploads take longer than edits
+        await asyncio.sleep((0.5 if endpoint == 'sendAudio' else 0.05) / SPEED)
+        return True
+
+
+def workload():
+    """A burst typical of a busy group: progress edits, replies and uploads"""
+    requests = []
+    for chat_id in PRIVATE_CHATS:
+        requests += [('editMessageText', chat_id)] * 5
+        requests += [('sendMessage', chat_id), ('sendAudio', chat_id)]
+    for chat_id in GROUP_CHATS:
+        requests += [('editMessageText', chat_id)] * 40
+        requests += [('sendMessage', chat_id)] * 20
+        requests += [('sendAudio', chat_id)] * 30
+    random.shuffle(requests)
+    return requests
+
+
+async def run_direct(api, requests):
+    """Send everything at once, retrying blindly after retry_after"""
+    latencies = defaultdict(list)
+
+    async def send(endpoint, chat_id):
+        start = time.monotonic()
+        for _ in range(4):
+            try:
+                await api.call(endpoint, chat_id)
+                latencies[endpoint].append(time.monotonic() - start)
+                return
+            except RetryAfter as e:
+                await asyncio.sleep(retry_after_seconds(e) / SPEED)
+
+    await asyncio.gather(*(send(e, c) for e, c in requests))
+    return latencies
+
+
+async def run_limited(api, requests):
+    """Send everything through PriorityRateLimiter"""
+    limiter = PriorityRateLimiter(
+        global_rate=GLOBAL_PER_SECOND * SPEED,
+        private_chat_rate=PRIVATE_PER_SECOND * SPEED,
+        group_chat_rate_per_minute=GROUP_PER_MINUTE * SPEED,
+        max_retries=3,
+        global_burst=GLOBAL_BURST,
+        chat_burst=CHAT_BURST,
+    )
+    await limiter.initialize()
+    latencies = defaultdict(list)
+
+    async def send(endpoint, chat_id):
+        start = time.monotonic()
+        try:
+            await limiter.process_request(
+                api.call, (endpoint, chat_id), {}, endpoint, {'chat_id': chat_id}, None
+            )
+            latencies[endpoint].append(time.monotonic() - start)
+        except RetryAfter:
+            pass
+
+    await asyncio.gather(*(send(e, c) for e, c in requests))
+    await limiter.shutdown()
+    return latencies
+
+
+def percentile(values, p):
+    """Nearest-rank percentile"""
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def report(label, api, latencies, total):
+    delivered = sum(len(v) for v in latencies.values())
+    print(f"\n{label}: {delivered}/{total} delivered, {api.rejected} x 429 out of {api.calls} calls")
+    for endpoint in ('editMessageText', 'sendMessage', 'sendAudio'):
+        values = latencies[endpoint]
+        print(
+            f"  {endpoint:<16} p50 {percentile(values, 0.5) * SPEED:6.2f}s"
+            f"  p95 {percentile(values, 0.95) * SPEED:6.2f}s"
+        )
+
+
+async def main():
+    random.seed(1)
+    requests = workload()
+    print(f"Workload: {len(requests)} requests to {len(PRIVATE_CHATS)} private chats and {len(GROUP_CHATS)} groups")
+
+    api = FakeBotAPI()
+    report("Direct", api, await run_direct(api, requests), len(requests))
+
+    api = FakeBotAPI()
+    report("PriorityRateLimiter", api, await run_limited(api, requests), len(requests))
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,130 @@
+"""
+Local Bot API mode check
+Starts a stub telegram-bot-api server that behaves like one running with
+--local (getFile answers with an absolute path on this machine), points a
+Bot at it in local mode and checks that a voice note is read straight from
+that path and that audio is uploaded by file:// path instead of as a
+multipart body.
+
+Usage: python benchmarks/stub_bot_api.py
+"""
+
+import asyncio
+import json
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest import mock
+from urllib.parse import parse_qs
+
+# Add project directory to Python path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from telegram import Bot, Voice
+
+from src import telegram_files
+
+TOKEN = '123456:STUB'
+
+
+class StubBotAPI(BaseHTTPRequestHandler):
+    """Answers the few Bot API methods the check uses"""
+
+    stored_file = ''
+    stored_file_size = 0
+    requests = []
+
+    def do_POST(self):
+        method = self.path.rsplit('/', 1)[-1]
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        content_type = self.headers.get('Content-Type', '')
+        params = {}
+        if content_type.startswith('application/json'):
+            params = json.loads(body or b'{}')
+        elif content_type.startswith('application/x-www-form-urlencoded'):
+            params = {key: values[0] for key, values in parse_qs(body.decode()).items()}
+        self.requests.append({'method': method, 'content_type': content_type, 'size': len(body), 'params': params})
+
+        if method == 'getMe':
+            result = {'id': 1, 'is_bot': True, 'first_name': 'Stub', 'username': 'stub_bot'}
+        elif method == 'getFile':
+            result = {
+                'file_id': params.get('file_id', 'voice'),
+                'file_unique_id': 'voice-unique',
+                'file_size': Path(self.stored_file).stat().st_size,
+                'file_path': self.stored_file,
+            }
+        elif method == 'sendAudio':
+            result = {
+                'message_id': 2,
+                'date': 0,
+                'chat': {'id': 1, 'type': 'private'},
+                'audio': {'file_id': 'audio', 'file_unique_id': 'audio-unique', 'duration': 1},
+            }
+        else:
+            self.send_error(404)
+            return
+
+        payload = json.dumps({'ok': True, 'result': result}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+async def check(base_url: str, upload_path: Path) -> bool:
+    async with Bot(TOKEN, base_url=base_url, base_file_url=base_url, local_mode=True) as bot:
+        voice = Voice('voice', 'voice-unique', duration=3, mime_type='audio/ogg', file_size=StubBotAPI.stored_file_size)
+        voice.set_bot(bot)
+
+        ok = True
+        async with telegram_files.downloaded_clip(voice, '.ogg') as clip:
+            zero_copy = clip == StubBotAPI.stored_file
+            print(f"Incoming voice note read from the server's path: {'yes' if zero_copy else 'no'} ({clip!r:.60})")
+            ok &= zero_copy
+        kept = Path(StubBotAPI.stored_file).exists()
+        print(f"Server's file left in place: {'yes' if kept else 'no'}")
+        ok &= kept
+
+        with telegram_files.upload_source(str(upload_path)) as audio:
+            await bot.send_audio(chat_id=1, audio=audio)
+        upload = StubBotAPI.requests[-1]
+        by_path = upload['params'].get('audio', '').startswith('file://')
+        print(f"Audio uploaded by path: {'yes' if by_path else 'no'} "
+              f"({upload['content_type'].split(';')[0]}, {upload['size']} bytes for a {upload_path.stat().st_size} byte file)")
+        ok &= by_path
+    return ok
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        server_dir = Path(tmp)
+        stored = server_dir / 'voice' / 'file_0.oga'
+        stored.parent.mkdir()
+        stored.write_bytes(b'\0' * 40_000)
+        upload_path = server_dir / 'track.mp3'
+        upload_path.write_bytes(b'\0' * 5_000_000)
+        StubBotAPI.stored_file = str(stored)
+        StubBotAPI.stored_file_size = stored.stat().st_size
+
+        server = ThreadingHTTPServer(('127.0.0.1', 0), StubBotAPI)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f'http://127.0.0.1:{server.server_port}/bot'
+
+        # As configured with LOCAL_BOT_API_URL and LOCAL_BOT_API_LOCAL_MODE
+        with mock.patch.object(telegram_files, 'LOCAL_MODE', True):
+            ok = asyncio.run(check(base_url, upload_path))
+        server.shutdown()
+
+    print('OK' if ok else 'FAILED')
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -9,11 +9,155 @@ BOT_USERNAME = "YourMusicBot"  # Replace with your bot username
 
 # Admin Configuration
 ADMIN_USER_ID = 123456789  # Replace with your admin user ID
+ADMIN_STATS_WINDOW = 300  # seconds of history behind the throughput in /stats
 
 # Download Configuration
 DOWNLOAD_PATH = "./downloads"
 MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB Telegram limit
 
+# Telegram Media Configuration
+TELEGRAM_DOWNLOAD_LIMIT = 20 * 1024 * 1024  # Largest file the Bot API lets bots download
+CLIP_MEMORY_MAX_BYTES = 2 * 1024 * 1024  # Voice notes and audio up to this size are recognized from memory
+CLIP_RECOGNITION_SECONDS = 30  # Of longer clips only about this much audio is fetched
+
+# Local Bot API Server Configuration
+# Talk to a self-hosted telegram-bot-api server instead of api.telegram.org.
+# Started with --local on the same machine (LOCAL_BOT_API_LOCAL_MODE), it
+# hands incoming files over by path and takes uploads by path, and the
+# 20MB download and 50MB upload limits rise to 2000MB
+LOCAL_BOT_API_URL = ""  # e.g. "http://127.0.0.1:8081/bot", empty for api.telegram.org
+LOCAL_BOT_API_FILE_URL = ""  # e.g. "http://127.0.0.1:8081/file/bot"
+LOCAL_BOT_API_LOCAL_MODE = True
+LOCAL_BOT_API_FILE_LIMIT = 2000 * 1024 * 1024
+
+# Media Cache Configuration
+MEDIA_CACHE_PATH = "./downloads/cache"  # Downloaded audio, stored by content hash
+MEDIA_CACHE_MAX_SIZE = 200 * 1024 * 1024  # 200MB, least recently used files are evicted first
+
+# Download Pool Configuration
+DOWNLOAD_WORKERS = 3  # Parallel yt-dlp downloads
+BATCH_MAX_ITEMS = 20  # Max links (including playlist entries) handled per message
+BATCH_MAX_CONCURRENT_PER_USER = 2  # Parallel downloads per user in batch mode
+BATCH_FLUSH_INTERVAL = 5  # seconds, finished files are sent together at most this often
+PROGRESS_UPDATE_INTERVAL = 5  # seconds between status message edits per chat
+UPLOADED_FILE_CACHE_SIZE = 500  # Recently uploaded Telegram file_ids reused for repeated links
+
+# Latency Lane Configuration
+# Updates run in three lanes with their own limits: interactive (commands,
+# menus, inline queries), recognition (voice notes, audio) and download
+# (links). Updates beyond a lane's waiting limit get a busy message
+LANE_CONCURRENCY = {'interactive': 16, 'recognition': 8, 'download': 32}
+LANE_MAX_WAITING = {'interactive': 64, 'recognition': 32, 'download': 64}
+RECOGNITION_WORKERS = 2  # Threads decoding, screening and matching clips
+RECOGNITION_WORKER_PROCESSES = 1  # Worker processes for Shazam with USE_WORKER_PROCESSES
+
+# Fair Scheduling Configuration
+# Downloads and recognitions wait in per-user queues and free slots go
+# round-robin over the users, weighted by their share
+RECOGNITION_CONCURRENCY = 4  # Clip recognitions running at once
+FAIR_MAX_CONCURRENT_PER_USER = 2  # Downloads or recognitions running at once per user
+FAIR_MAX_CONCURRENT_PER_CHAT = 2  # ... and per chat, so one group can't take every slot
+USER_HOURLY_QUOTA = 60  # Downloads and recognitions per user per hour, 0 = no limit
+ADMIN_WEIGHT = 4  # Share of ADMIN_USER_ID relative to other users (1), no quota
+USER_WEIGHTS = {}  # Other users with a different share, {user_id: weight}
+
+# Worker Process Configuration
+# With USE_WORKER_PROCESSES, downloads, transcodes and recognitions run in
+# separate worker processes instead of the download threads
+USE_WORKER_PROCESSES = False
+WORKER_PROCESSES = 0  # 0 = one per available CPU core
+WORKER_MEMORY_LIMIT = 512 * 1024 * 1024  # Address space limit of each worker, 0 = none
+WORKER_START_TIMEOUT = 30  # seconds for a worker process to connect
+
+# Download Retry Configuration
+RETRY_BASE_DELAY = 1  # seconds, backoff doubles per attempt with random jitter
+RETRY_MAX_DELAY = 30  # seconds
+RETRY_BUDGET_RATIO = 0.2  # retries allowed per platform as a share of requests
+CIRCUIT_BREAKER_THRESHOLD = 0.5  # error rate that stops calls to a platform
+CIRCUIT_BREAKER_MIN_REQUESTS = 5  # attempts needed before the breaker can open
+CIRCUIT_BREAKER_WINDOW = 60  # seconds of history for the error rate
+CIRCUIT_BREAKER_COOLDOWN = 30  # seconds before a trial request is let through
+
+# Search Cache Configuration
+# Shazam search results for inline queries, by normalized query
+SEARCH_CACHE_TTL = 6 * 3600
+SEARCH_CACHE_MAX_ENTRIES = 2000
+
+# Cache Warm-up Configuration
+# After startup the bot searches for the current chart tracks and fetches
+# the links most requested in the last WARMUP_HISTORY_DAYS, one request
+# every WARMUP_INTERVAL seconds while download slots are free, at most
+# WARMUP_BUDGET requests in total
+WARMUP_ENABLED = True
+WARMUP_DELAY = 30  # seconds after startup
+WARMUP_BUDGET = 30  # searches and links per warm-up
+WARMUP_INTERVAL = 5  # seconds between warm-up requests
+WARMUP_CHART_TRACKS = 20  # chart tracks searched, 0 = none
+WARMUP_CHART_COUNTRY = ""  # e.g. "IR" for a country chart, empty for the world chart
+WARMUP_TOP_LINKS = 10  # most requested links fetched, 0 = none
+WARMUP_HISTORY_DAYS = 7  # at most the job store's 7 day retention
+WARMUP_UPLOAD_CHAT_ID = 0  # chat (e.g. a private channel) popular links are uploaded to for a ready file_id, 0 = download only
+
+# Negative Cache Configuration
+# Unrecognizable clips and permanently failed links are answered from
+# memory for this many seconds instead of calling Shazam/yt-dlp again
+NEGATIVE_CACHE_TTL = 600
+NEGATIVE_CACHE_MAX_ENTRIES = 5000
+
+# Fingerprint Index Configuration
+# Tracks downloaded from links are fingerprinted with their recognized
+# metadata; clips are matched against this index before calling Shazam
+FINGERPRINT_INDEX_ENABLED = True
+FINGERPRINT_DB_PATH = "./downloads/fingerprints.sqlite3"
+FINGERPRINT_MIN_MATCHES = 12  # Aligned hashes needed for a local match
+FINGERPRINT_MAX_TRACKS = 2000  # Oldest tracks are dropped above this
+
+# Clip Screening Configuration
+# Voice notes are checked for music before recognition; silent, noisy and
+# spoken clips are rejected without calling Shazam
+VOICE_SCREENING_ENABLED = True
+SCREEN_MAX_SECONDS = 30  # Only the start of a clip is decoded and recognized
+SCREEN_SILENCE_DB = -50  # dBFS, quieter frames count as silence
+SCREEN_MIN_SECONDS = 1.0  # Less sound than this is rejected as silent
+SCREEN_MAX_FLATNESS = 0.5  # Median spectral flatness above this is noise
+SCREEN_PAUSE_DB = 20  # Frames this far below the loud level are pauses
+SCREEN_MAX_PAUSE_RATIO = 0.35  # More pauses than this is speech
+
+# Job Queue Configuration
+# Link and clip requests are stored in JOB_DB_PATH until delivered. On
+# SIGTERM running jobs get SHUTDOWN_DRAIN_TIMEOUT seconds to finish; the
+# rest are resumed on the next start, at most JOB_MAX_ATTEMPTS times
+SHUTDOWN_DRAIN_TIMEOUT = 25
+JOB_DB_PATH = "./downloads/jobs.sqlite3"
+JOB_MAX_ATTEMPTS = 3
+
+# Metrics Configuration
+# /metrics is served on this local address; 0 disables the server
+# (on PythonAnywhere the WSGI app serves /metrics instead)
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 9100
+
+# Logging Configuration
+# Log files rotate daily and when they reach LOG_MAX_BYTES
+LOG_DIR = "./logs"
+LOG_LEVEL = "INFO"
+LOG_MAX_BYTES = 5 * 1024 * 1024  # 5MB
+LOG_BACKUP_COUNT = 5
+LOG_ROTATE_WHEN = "midnight"
+LOG_TO_CONSOLE = None  # Also log to stdout: True, False, or None = only when stdout is a terminal
+
+# Tracing Configuration
+# Share of requests whose trace is written to traces.jsonl; slower or
+# failed requests are always written
+TRACE_SAMPLE_RATE = 0.1
+TRACE_SLOW_THRESHOLD = 30
+
+# Outbound Telegram API Limits
+SEND_GLOBAL_RATE = 30  # requests per second across all chats
+SEND_PRIVATE_CHAT_RATE = 1  # requests per second to one private chat
+SEND_GROUP_CHAT_RATE = 20  # requests per minute to one group
+SEND_MAX_RETRIES = 3  # retries after a 429 "Too Many Requests"
+
 # ShazamIO Configuration
 SHAZAM_TIMEOUT = 30  # seconds
 
@@ -62,12 +206,25 @@ BOT_MESSAGES = {
         'send_audio': "لطفاً یک فایل صوتی ارسال کنید تا آهنگ را تشخیص دهم:",
         'processing': "در حال پردازش... لطفاً صبر کنید",
         'song_not_found': "متأسفانه آهنگی پیدا نشد. لطفاً دوباره تلاش کنید.",
+        'file_too_large': "این فایل برای تشخیص بیش از حد بزرگ است (حداکثر {limit} مگابایت).",
+        'quota_exceeded': "⏳ سهمیه ساعتی شما تمام شده است. لطفاً {minutes} دقیقه دیگر دوباره امتحان کنید.",
+        'busy': "⏳ ربات در حال حاضر بسیار شلوغ است. لطفاً چند دقیقه دیگر دوباره امتحان کنید.",
+        'tune_usage': "⚙️ استفاده: /tune name=value ...\nتغییرات تا راه‌اندازی مجدد باقی می‌مانند. مقادیر فعلی:\n\n{}",
+        'tune_applied': "✅ اعمال شد:\n{}",
+        'tune_rejected': "❌ هیچ تغییری اعمال نشد: {}",
         'download_error': "خطا در دانلود فایل. لطفاً دوباره تلاش کنید.",
         'edit_info': "اطلاعات آهنگ را ویرایش کنید:",
         'send_link': "لطفاً لینک مورد نظر را ارسال کنید:",
         'invalid_link': "لینک نامعتبر است. لطفاً لینک معتبر ارسال کنید.",
         'success': "عملیات با موفقیت انجام شد!",
         'error': "خطایی رخ داد. لطفاً دوباره تلاش کنید.",
+        'batch_progress': "📥 در حال دانلود لینک‌ها: {done} از {total} (ناموفق: {failed})",
+        'batch_done': "✅ دانلود تمام شد: {sent} از {total} فایل ارسال شد",
+        'restarting': "🔄 ربات در حال راه‌اندازی مجدد است. درخواست شما ذخیره شد و پس از راه‌اندازی انجام می‌شود.",
+        'progress_downloading': "📥 در حال دانلود... {percent}٪",
+        'progress_converting': "🎛 در حال تبدیل فایل صوتی...",
+        'progress_recognizing': "🔍 در حال تشخیص آهنگ...",
+        'progress_uploading': "📤 در حال ارسال فایل...",
     },
     'en': {
         'start': """
@@ -92,12 +249,25 @@ For use in groups, you can use @{}
         'send_audio': "Please send an audio file to recognize the song:",
         'processing': "Processing... Please wait",
         'song_not_found': "Unfortunately, no song was found. Please try again.",
+        'file_too_large': "This file is too large to recognize (limit {limit} MB).",
+        'quota_exceeded': "⏳ You have used up your hourly quota. Please try again in {minutes} minutes.",
+        'busy': "⏳ The bot is very busy right now. Please try again in a few minutes.",
+        'tune_usage': "⚙️ Usage: /tune name=value ...\nChanges last until the next restart. Current values:\n\n{}",
+        'tune_applied': "✅ Applied:\n{}",
+        'tune_rejected': "❌ Nothing was changed: {}",
         'download_error': "Error downloading file. Please try again.",
         'edit_info': "Edit song information:",
         'send_link': "Please send the desired link:",
         'invalid_link': "Invalid link. Please send a valid link.",
         'success': "Operation completed successfully!",
         'error': "An error occurred. Please try again.",
+        'batch_progress': "📥 Downloading links: {done} of {total} (failed: {failed})",
+        'batch_done': "✅ Done: {sent} of {total} files sent",
+        'restarting': "🔄 The bot is restarting. Your request was saved and will be processed right after.",
+        'progress_downloading': "📥 Downloading... {percent}%",
+        'progress_converting': "🎛 Converting audio...",
+        'progress_recognizing': "🔍 Recognizing song...",
+        'progress_uploading': "📤 Uploading...",
     }
 }
 
@@ -8,6 +8,11 @@ PYTHONANYWHERE_USERNAME="your_username"  # Replace with your actual username
 PROJECT_DIR="/home/$PYTHONANYWHERE_USERNAME/telegram_music_bot"
 VENV_DIR="/home/$PYTHONANYWHERE_USERNAME/.virtualenvs/telegram_music_bot"
 LOG_DIR="/home/$PYTHONANYWHERE_USERNAME/logs"
+PID_FILE="$PROJECT_DIR/bot.pid"
+# Created by "stop" so the runner loop doesn't restart the bot
+STOP_FILE="$PROJECT_DIR/bot.stop"
+# Longer than SHUTDOWN_DRAIN_TIMEOUT in config/config.py
+STOP_TIMEOUT=40
 
 # Color codes for output
 RED='\033[0;31m'
@@ -151,7 +156,7 @@ health_check() {
     fi
     
     # Check if bot is running
-    if pgrep -f "python.*main.py" > /dev/null; then
+    if [[ -f "$PID_FILE" ]] && kill -0 "$(cat "$PID_FILE")" 2>/dev/null; then
         info "✅ Bot is running"
     else
         warning "⚠️ Bot is not running"
@@ -169,16 +174,42 @@ start_bot() {
     export PYTHONPATH="$PROJECT_DIR:$PYTHONPATH"
     export PYTHONUNBUFFERED=1
     
+    # Pass SIGTERM/SIGINT on to the bot so it can drain its jobs
+    rm -f "$STOP_FILE"
+    stopping=0
+    trap 'stopping=1; [[ -n "$bot_pid" ]] && kill -TERM "$bot_pid" 2>/dev/null' TERM INT
+    
     # Start the bot with error handling
     while true; do
         info "Starting bot process..."
         
+        # The bot writes its own rotated logs; this file only catches crash
+        # output and warnings printed before logging starts, with one backup
+        output_log="$LOG_DIR/bot_output.log"
+        if [[ -f "$output_log" && $(stat -c %s "$output_log") -gt $((5 * 1024 * 1024)) ]]; then
+            mv -f "$output_log" "$output_log.1"
+        fi
+        
         # Run the bot
-        python src/main.py >> "$LOG_DIR/telegram_music_bot.log" 2>&1
+        python src/main_optimized.py >> "$output_log" 2>&1 &
+        bot_pid=$!
+        echo "$bot_pid" > "$PID_FILE"
         
-        # Check exit code
+        # wait returns early when a trapped signal arrives
+        wait "$bot_pid"
         exit_code=$?
-        if [[ $exit_code -eq 0 ]]; then
+        while kill -0 "$bot_pid" 2>/dev/null; do
+            wait "$bot_pid"
+            exit_code=$?
+        done
+        rm -f "$PID_FILE"
+        
+        # Check exit code
+        if [[ -f "$STOP_FILE" ]]; then
+            stopping=1
+            rm -f "$STOP_FILE"
+        fi
+        if [[ $exit_code -eq 0 || $stopping -eq 1 ]]; then
             info "Bot exited normally"
             break
         else
@@ -196,9 +227,28 @@ start_bot() {
 stop_bot() {
     info "Stopping bot..."
     
-    # Find and kill bot processes
-    pkill -f "python.*main.py" || true
-    pkill -f "telegram.*bot" || true
+    if [[ ! -f "$PID_FILE" ]]; then
+        warning "Bot is not running (no PID file)"
+        return
+    fi
+    
+    bot_pid=$(cat "$PID_FILE")
+    if kill -0 "$bot_pid" 2>/dev/null; then
+        touch "$STOP_FILE"
+        
+        # SIGTERM lets the bot finish uploads and checkpoint queued jobs
+        kill -TERM "$bot_pid"
+        for ((i = 0; i < STOP_TIMEOUT; i++)); do
+            kill -0 "$bot_pid" 2>/dev/null || break
+            sleep 1
+        done
+        
+        if kill -0 "$bot_pid" 2>/dev/null; then
+            warning "Bot did not stop within ${STOP_TIMEOUT}s, killing it"
+            kill -KILL "$bot_pid"
+        fi
+    fi
+    rm -f "$PID_FILE"
     
     info "Bot stopped"
 }
@@ -0,0 +1,168 @@
+"""
+Admin console
+Backs the /stats and /tune commands of ADMIN_USER_ID. /stats shows live
+throughput, queue depths, cache hit rates and per-platform error rates;
+/tune changes worker counts, concurrency limits and cache sizes of the
+running bot, so a limit can be adjusted without a restart dropping the
+jobs in flight. Tuned values last until the next restart, config.py keeps
+the defaults.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Seconds between samples of the throughput counts
+SAMPLE_INTERVAL = 10
+
+# Longest reply, below Telegram's 4096 characters
+MAX_REPLY = 4000
+
+
+class TuneError(ValueError):
+    """A /tune request that was rejected; nothing was changed"""
+
+
+class Tunable(NamedTuple):
+    """A limit of the running bot"""
+
+    get: Callable[[], int]
+    set: Callable[[int], None]
+    minimum: int
+    description: str
+
+
+class ThroughputMeter:
+    """Per-minute rates of running totals over a sliding window
+
+    ``totals`` maps a name to a function returning an ever-growing count
+    (e.g. a Counter's total), sampled every ``interval`` seconds.
+    """
+
+    def __init__(self, totals: Dict[str, Callable[[], float]], window: float = 300, interval: float = SAMPLE_INTERVAL):
+        self.totals = totals
+        self.window = window
+        self.interval = interval
+        self._samples: Deque[Tuple[float, Dict[str, float]]] = deque()
+        self._task: Optional[asyncio.Future] = None
+
+    def sample(self):
+        now = time.monotonic()
+        self._samples.append((now, {name: total() for name, total in self.totals.items()}))
+        # Keep one sample at least a window old to measure from
+        while len(self._samples) > 2 and now - self._samples[1][0] >= self.window:
+            self._samples.popleft()
+
+    def start(self):
+        self._task = asyncio.ensure_future(self._run())
+
+    def stop(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+
+    async def _run(self):
+        while True:
+            self.sample()
+            await asyncio.sleep(self.interval)
+
+    def rates(self) -> Tuple[float, Dict[str, float]]:
+        """Seconds measured over and the per-minute rate of each total"""
+        self.sample()
+        (start, first), (end, last) = self._samples[0], self._samples[-1]
+        elapsed = end - start
+        # Rates over a few seconds would mostly be noise
+        if elapsed < self.interval:
+            return elapsed, {}
+        return elapsed, {name: (last[name] - first.get(name, 0)) * 60 / elapsed for name in last}
+
+
+def _format_value(value: Any) -> str:
+    return f"{value:g}" if isinstance(value, float) else str(value)
+
+
+class AdminConsole:
+    """Stats and tunable limits of the running bot"""
+
+    def __init__(self, meter: ThroughputMeter):
+        self.meter = meter
+        # (title, stats function, fields shown)
+        self._sections: List[Tuple[str, Callable[[], Dict[str, Dict[str, Any]]], Sequence[str]]] = []
+        self.tunables: Dict[str, Tunable] = {}
+
+    def add_stats(self, title: str, func: Callable[[], Dict[str, Dict[str, Any]]], fields: Sequence[str]):
+        """Show ``fields`` of a ``{label: {field: value}}`` stats function"""
+        self._sections.append((title, func, fields))
+
+    def add_tunable(self, name: str, get: Callable[[], int], set: Callable[[int], None], minimum: int = 0, description: str = ''):
+        self.tunables[name] = Tunable(get, set, minimum, description)
+
+    def stats_report(self) -> str:
+        """Plain-text report of the throughput and every stats section"""
+        elapsed, rates = self.meter.rates()
+        lines = [f"Throughput per minute, last {elapsed:.0f}s"]
+        lines.append('  ' + ', '.join(f"{name} {rate:.1f}" for name, rate in rates.items()) if rates else '  (no samples yet)')
+
+        for title, func, fields in self._sections:
+            try:
+                stats = func()
+            except Exception as e:
+                logger.error(f"Error collecting {title} stats: {e}")
+                continue
+            if not stats:
+                continue
+            lines.append('')
+            lines.append(title)
+            for label, values in sorted(stats.items()):
+                shown = ' '.join(f"{field}={_format_value(values[field])}" for field in fields if field in values)
+                lines.append(f"  {label}: {shown}")
+        return '\n'.join(lines)[:MAX_REPLY]
+
+    def tunables_report(self) -> str:
+        """Current value of every tunable limit"""
+        return '\n'.join(
+            f"{name}={tunable.get()}  {tunable.description}" for name, tunable in self.tunables.items()
+        )[:MAX_REPLY]
+
+    def tune(self, assignments: Sequence[str]) -> List[Tuple[str, int, int]]:
+        """Apply ``name=value`` assignments together
+
+        Every assignment is checked before any is applied, and all of them
+        are applied in one step on the event loop, so no update ever sees
+        half of a change. Returns (name, old, new) for each limit.
+        """
+        values: Dict[str, int] = {}
+        for assignment in assignments:
+            name, _, value = assignment.partition('=')
+            name = name.strip().lower()
+            tunable = self.tunables.get(name)
+            if tunable is None:
+                raise TuneError(f"unknown setting {name!r}")
+            try:
+                number = int(value)
+            except ValueError:
+                raise TuneError(f"{name} needs a whole number, got {value!r}") from None
+            if number < tunable.minimum:
+                raise TuneError(f"{name} must be at least {tunable.minimum}")
+            values[name] = number
+
+        applied: List[Tuple[str, int, int]] = []
+        try:
+            for name, number in values.items():
+                tunable = self.tunables[name]
+                old = tunable.get()
+                tunable.set(number)
+                applied.append((name, old, number))
+        except Exception as e:
+            failed = name
+            # Put back what was already changed
+            for name, old, _ in reversed(applied):
+                self.tunables[name].set(old)
+            raise TuneError(f"could not set {failed}: {e}") from e
+
+        for name, old, number in applied:
+            logger.info("Tuned %s: %s -> %s", name, old, number)
+        return applied
@@ -0,0 +1,99 @@
+"""
+Clip screening before recognition
+Voice notes are decoded once to low-rate PCM and measured frame by frame
+(energy and spectral flatness, all frames at once with NumPy). Leading
+silence is trimmed and clips that are silent, noise or speech are rejected
+before Shazam is called; what is left goes to recognition as WAV bytes.
+"""
+
+import io
+import wave
+from typing import Dict, Tuple
+
+import numpy as np
+
+# 40 ms frames at the fingerprint sample rate
+FRAME_SECONDS = 0.04
+
+SILENT = 'silent'
+NOISE = 'noise'
+SPEECH = 'speech'
+MUSIC = 'music'
+
+
+def frame_features(samples: np.ndarray, sample_rate: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Energy in dBFS and spectral flatness (0 tonal .. 1 noise) of every frame"""
+    frame_size = int(sample_rate * FRAME_SECONDS)
+    count = len(samples) // frame_size
+    if not count:
+        return np.empty(0, dtype=np.float32), np.empty(0, dtype=np.float32)
+    frames = samples[:count * frame_size].reshape(count, frame_size)
+
+    energy_db = 10 * np.log10(np.mean(frames ** 2, axis=1) + 1e-10)
+    power = np.abs(np.fft.rfft(frames * np.hanning(frame_size), axis=1)) ** 2 + 1e-10
+    # Geometric over arithmetic mean of the power spectrum
+    flatness = np.exp(np.mean(np.log(power), axis=1)) / np.mean(power, axis=1)
+    return energy_db, flatness
+
+
+class AudioGate:
+    """Classifies clips as silent, noise, speech or music
+
+    Music plays on without gaps; speech drops far below its loudest level
+    between words and sentences, so a clip with many such dips (above
+    ``max_pause_ratio`` of its frames) is taken for speech. Thresholds are
+    deliberately lenient: a rejected song costs more than a wasted call.
+    """
+
+    def __init__(
+        self,
+        silence_db: float = -50,
+        min_seconds: float = 1.0,
+        max_flatness: float = 0.5,
+        pause_db: float = 20,
+        max_pause_ratio: float = 0.35,
+    ):
+        self.silence_db = silence_db
+        self.min_seconds = min_seconds
+        self.max_flatness = max_flatness
+        self.pause_db = pause_db
+        self.max_pause_ratio = max_pause_ratio
+        self.counters = {SILENT: 0, NOISE: 0, SPEECH: 0, MUSIC: 0}
+
+    def screen(self, samples: np.ndarray, sample_rate: int) -> Tuple[str, np.ndarray]:
+        """Return the verdict and the clip without its leading silence"""
+        verdict, start = self._classify(*frame_features(samples, sample_rate), sample_rate)
+        self.counters[verdict] += 1
+        return verdict, samples[start * int(sample_rate * FRAME_SECONDS):]
+
+    def _classify(self, energy_db: np.ndarray, flatness: np.ndarray, sample_rate: int) -> Tuple[str, int]:
+        sounding = np.flatnonzero(energy_db > self.silence_db)
+        if len(sounding) * FRAME_SECONDS < self.min_seconds:
+            return SILENT, 0
+        start = int(sounding[0])
+        energy_db, flatness = energy_db[start:], flatness[start:]
+
+        if np.median(flatness[energy_db > self.silence_db]) > self.max_flatness:
+            return NOISE, start
+
+        # Share of frames far below the clip's loud level
+        loud = np.percentile(energy_db, 90)
+        pauses = np.mean(energy_db < loud - self.pause_db)
+        if pauses > self.max_pause_ratio:
+            return SPEECH, start
+        return MUSIC, start
+
+    def stats(self) -> Dict[str, int]:
+        """Clips per verdict"""
+        return dict(self.counters)
+
+
+def to_wav(samples: np.ndarray, sample_rate: int) -> bytes:
+    """Encode mono float PCM as 16-bit WAV"""
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes((np.clip(samples, -1, 1) * 32767).astype('<i2').tobytes())
+    return buffer.getvalue()
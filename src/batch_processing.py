@@ -0,0 +1,231 @@
+"""
+Batch link processing
+Downloads every supported link of a message (expanding playlists lazily)
+through the download pool, with a per-user concurrency cap, and streams the
+finished files back as Telegram media groups.
+"""
+
+import asyncio
+import logging
+import time
+import weakref
+from contextlib import ExitStack
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from telegram import InputMediaAudio, Message
+
+from config.config import (
+    BATCH_FLUSH_INTERVAL,
+    BATCH_MAX_CONCURRENT_PER_USER,
+    BATCH_MAX_ITEMS,
+)
+from src.fair_scheduler import QuotaExceeded
+from src.metrics import stage
+from src.telegram_files import upload_source
+from src.url_parser import ParsedURL
+
+logger = logging.getLogger(__name__)
+
+# Telegram accepts 2-10 items per media group
+MEDIA_GROUP_SIZE = 10
+
+
+def open_playlist(url: str):
+    """List playlist entries without resolving them (blocking)"""
+    import yt_dlp
+
+    ydl_opts = {
+        'quiet': True,
+        'no_warnings': True,
+        'extract_flat': 'in_playlist',
+        'lazy_playlist': True,
+    }
+    info = yt_dlp.YoutubeDL(ydl_opts).extract_info(url, download=False, process=False)
+    return iter(info.get('entries') or [])
+
+
+def entry_url(entry: Dict[str, Any]) -> Optional[str]:
+    """Pick a downloadable URL from a flat playlist entry"""
+    url = entry.get('webpage_url') or entry.get('url')
+    if url and not url.startswith('http'):
+        # Some extractors return bare IDs for flat entries
+        return None
+    return url
+
+
+def entry_names(entry: Dict[str, Any]) -> Dict[str, str]:
+    """Title and performer of a flat playlist entry, where it has them"""
+    names = {'title': entry.get('title'), 'performer': entry.get('uploader') or entry.get('channel')}
+    return {name: value for name, value in names.items() if value}
+
+
+class BatchProcessor:
+    """Runs the links of one message as parallel download jobs"""
+
+    def __init__(self, bot):
+        self.bot = bot
+        # Dropped once no download of the user holds or waits for it
+        self._user_slots: "weakref.WeakValueDictionary[int, asyncio.Semaphore]" = weakref.WeakValueDictionary()
+
+    def _slots(self, user_id: int) -> asyncio.Semaphore:
+        """Per-user download slots shared by all batches of that user"""
+        slots = self._user_slots.get(user_id)
+        if slots is None:
+            slots = self._user_slots[user_id] = asyncio.Semaphore(BATCH_MAX_CONCURRENT_PER_USER)
+        return slots
+
+    async def iter_items(self, parsed_urls: List[ParsedURL]) -> AsyncIterator[Tuple[str, Dict[str, str]]]:
+        """Yield item URLs with the names a playlist lists for them, pulling
+        playlist entries one at a time"""
+        count = 0
+        for parsed in parsed_urls:
+            if count >= BATCH_MAX_ITEMS:
+                return
+
+            if not parsed.is_playlist:
+                count += 1
+                yield parsed.url, {}
+                continue
+
+            try:
+                entries = await self.bot.run_in_download_pool(open_playlist, parsed.url)
+                while count < BATCH_MAX_ITEMS:
+                    # Each next() may fetch another playlist page
+                    entry = await self.bot.run_in_download_pool(next, entries, None)
+                    if entry is None:
+                        break
+                    url = entry_url(entry)
+                    if url:
+                        count += 1
+                        yield url, entry_names(entry)
+            except Exception as e:
+                logger.error(f"Error expanding playlist {parsed.url}: {e}")
+
+    async def _download(self, user_id: int, chat_id: int, url: str, names: Dict[str, str], results: asyncio.Queue):
+        """Download and recognize one item within the user's slots and report
+        the file with its title and performer"""
+        file_path = None
+        try:
+            async with self._slots(user_id):
+                resolved = await self.bot.resolve_media_key(url)
+                file_path = await self.bot.download_audio(url, user_id, chat_id, resolved=resolved)
+                # Recognized names beat the playlist's, and the track joins
+                # the fingerprint index
+                track = await self.bot.recognize_download(file_path, resolved) if file_path else None
+                if track:
+                    names = {'title': track.title, 'performer': track.artist}
+        except asyncio.CancelledError:
+            # Never reported, so never sent or released by run()
+            self.bot.media_cache.release(file_path)
+            raise
+        except QuotaExceeded:
+            logger.info("Batch item %s skipped, user %s is over quota", url, user_id)
+        except Exception as e:
+            logger.error(f"Error downloading batch item {url}: {e}")
+        await results.put((file_path, names) if file_path else None)
+
+    async def run(self, message: Message, user_id: int, parsed_urls: List[ParsedURL]) -> int:
+        """Process all links of a message, send the results as they finish and
+        return how many files were sent"""
+        progress_msg = await message.reply_text(self.bot.get_message(user_id, 'processing'))
+        results: asyncio.Queue = asyncio.Queue()
+        state = {'total': 0, 'scheduled': False}
+        tasks = []
+
+        async def schedule():
+            try:
+                async for url, names in self.iter_items(parsed_urls):
+                    state['total'] += 1
+                    tasks.append(asyncio.create_task(self._download(user_id, message.chat_id, url, names, results)))
+            finally:
+                state['scheduled'] = True
+                # Wake the collector so it can notice the final total
+                await results.put(False)
+
+        scheduler = asyncio.create_task(schedule())
+        done = failed = sent = 0
+        # (file path, title and performer) waiting for the next flush
+        pending_files: List[Tuple[str, Dict[str, str]]] = []
+        last_flush = time.monotonic()
+
+        try:
+            while not state['scheduled'] or done < state['total']:
+                try:
+                    result = await asyncio.wait_for(results.get(), timeout=BATCH_FLUSH_INTERVAL)
+                except asyncio.TimeoutError:
+                    result = False
+
+                if result is not False:
+                    done += 1
+                    if result:
+                        pending_files.append(result)
+                    else:
+                        failed += 1
+                    self._update_progress(progress_msg, user_id, done, state['total'], failed)
+
+                flush_due = time.monotonic() - last_flush >= BATCH_FLUSH_INTERVAL
+                if pending_files and (flush_due or len(pending_files) >= MEDIA_GROUP_SIZE):
+                    files, pending_files = pending_files, []
+                    sent += await self._send_files(message, files)
+                    last_flush = time.monotonic()
+
+            if pending_files:
+                files, pending_files = pending_files, []
+                sent += await self._send_files(message, files)
+
+            self.bot.progress_reporter.forget(progress_msg)
+            await progress_msg.edit_text(
+                self.bot.get_message(user_id, 'batch_done').format(sent=sent, total=state['total'])
+            )
+
+        except Exception as e:
+            logger.error(f"Error processing batch: {e}")
+            self.bot.progress_reporter.forget(progress_msg)
+            await progress_msg.edit_text(self.bot.get_message(user_id, 'error'))
+
+        finally:
+            # Also when the batch is cancelled
+            self.bot.progress_reporter.forget(progress_msg)
+            scheduler.cancel()
+            for task in tasks:
+                task.cancel()
+            # Files that will never be sent
+            while not results.empty():
+                result = results.get_nowait()
+                if result:
+                    pending_files.append(result)
+            for path, _ in pending_files:
+                self.bot.media_cache.release(path)
+
+        return sent
+
+    def _update_progress(self, progress_msg: Message, user_id: int, done: int, total: int, failed: int):
+        """Edit the single progress message in place, throttled per chat"""
+        self.bot.progress_reporter.update(
+            progress_msg,
+            self.bot.get_message(user_id, 'batch_progress').format(done=done, total=total, failed=failed)
+        )
+
+    async def _send_files(self, message: Message, items: List[Tuple[str, Dict[str, str]]]) -> int:
+        """Send finished files with their names, grouped into media groups
+        where possible, and release them"""
+        sent = 0
+        try:
+            for start in range(0, len(items), MEDIA_GROUP_SIZE):
+                chunk = items[start:start + MEDIA_GROUP_SIZE]
+                try:
+                    with ExitStack() as stack:
+                        files = [(stack.enter_context(upload_source(path)), names) for path, names in chunk]
+                        stack.enter_context(stage('upload', 'batch'))
+                        if len(files) == 1:
+                            audio, names = files[0]
+                            await message.reply_audio(audio=audio, **names)
+                        else:
+                            await message.reply_media_group([InputMediaAudio(media=f, **names) for f, names in files])
+                    sent += len(chunk)
+                except Exception as e:
+                    logger.error(f"Error sending batch files: {e}")
+        finally:
+            for path, _ in items:
+                self.bot.media_cache.release(path)
+        return sent
@@ -0,0 +1,228 @@
+"""
+Fair scheduling of downloads and recognitions
+Every user has their own queue in front of the download and recognition
+capacity. Free slots go round-robin over the users with queued requests,
+weighted by a per-user share (deficit round-robin), so someone who sends a
+hundred links waits behind their own requests instead of everyone else
+waiting behind them. Per-user and per-chat concurrency limits and an hourly
+quota bound what a single user or group can take.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict, Iterable, Optional, Tuple
+
+from src.metrics import SCHEDULER_WAIT
+
+logger = logging.getLogger(__name__)
+
+QUOTA_WINDOW = 3600
+
+
+class QuotaExceeded(Exception):
+    """The user has used up their hourly quota"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Hourly quota exceeded, retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class FairScheduler:
+    """Hands out ``capacity`` slots fairly between users
+
+    Each request costs one slot. A user's turn adds ``weight`` to their
+    deficit and every request served takes one off it, so a user with
+    weight 4 gets four slots for every one of a user with weight 1 while
+    both have requests queued. Users at their concurrency limit, or in a
+    chat at its limit, are skipped without losing their deficit.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        capacity: int,
+        per_user: int = 2,
+        per_chat: int = 2,
+        hourly_quota: int = 0,
+        weights: Optional[Dict[int, float]] = None,
+        exempt: Iterable[int] = (),
+    ):
+        self.name = name
+        self.capacity = capacity
+        self.per_user = per_user
+        self.per_chat = per_chat
+        self.hourly_quota = hourly_quota
+        self.weights = dict(weights or {})
+        self.exempt = set(exempt)
+
+        # user_id -> queued (future, chat_id), oldest first
+        self._queues: Dict[int, Deque[Tuple[asyncio.Future, int]]] = {}
+        # Users with queued requests in round-robin order, the head is next
+        self._active: Deque[int] = deque()
+        self._deficit: Dict[int, float] = {}
+        self._running_users: Dict[int, int] = {}
+        self._running_chats: Dict[int, int] = {}
+        self._admitted: Dict[int, Deque[float]] = {}
+        self.running = 0
+        self.granted = 0
+        self.quota_rejected = 0
+
+    def _weight(self, user_id: int) -> float:
+        return max(self.weights.get(user_id, 1.0), 0.01)
+
+    def _eligible(self, user_id: int, chat_id: int) -> bool:
+        return (
+            self._running_users.get(user_id, 0) < self.per_user
+            and self._running_chats.get(chat_id, 0) < self.per_chat
+        )
+
+    def _charge(self, user_id: int) -> Optional[float]:
+        """Count a request against the user's hourly quota, returning its time"""
+        if not self.hourly_quota or user_id in self.exempt:
+            return None
+        now = time.monotonic()
+        admitted = self._admitted.setdefault(user_id, deque())
+        while admitted and now - admitted[0] >= QUOTA_WINDOW:
+            admitted.popleft()
+        if len(admitted) >= self.hourly_quota:
+            self.quota_rejected += 1
+            raise QuotaExceeded(QUOTA_WINDOW - (now - admitted[0]))
+        admitted.append(now)
+        return now
+
+    def _refund(self, user_id: int, charged: Optional[float]):
+        """Take back the charge of a request that never got a slot"""
+        admitted = self._admitted.get(user_id)
+        if charged is not None and admitted and charged in admitted:
+            admitted.remove(charged)
+
+    def _start(self, user_id: int, chat_id: int):
+        self.running += 1
+        self.granted += 1
+        self._running_users[user_id] = self._running_users.get(user_id, 0) + 1
+        self._running_chats[chat_id] = self._running_chats.get(chat_id, 0) + 1
+
+    def release(self, user_id: int, chat_id: Optional[int] = None):
+        """Free a slot taken by acquire() and hand it to the next in turn"""
+        chat_id = user_id if chat_id is None else chat_id
+        self.running -= 1
+        for counts, key in ((self._running_users, user_id), (self._running_chats, chat_id)):
+            counts[key] -= 1
+            if not counts[key]:
+                del counts[key]
+        self._dispatch()
+
+    def _drop_flow(self, user_id: int):
+        del self._queues[user_id]
+        self._active.remove(user_id)
+        # An idle user doesn't save up turns
+        self._deficit.pop(user_id, None)
+
+    def _next(self) -> Optional[Tuple[asyncio.Future, int, int]]:
+        """Dequeue the request whose turn it is, None if nobody can run"""
+        while True:
+            # Requests cancelled while queued
+            for user_id in list(self._active):
+                queue = self._queues[user_id]
+                while queue and queue[0][0].done():
+                    queue.popleft()
+                if not queue:
+                    self._drop_flow(user_id)
+
+            if not any(self._eligible(user_id, self._queues[user_id][0][1]) for user_id in self._active):
+                return None
+
+            # Terminates: an eligible user gains deficit on every pass
+            while True:
+                user_id = self._active[0]
+                queue = self._queues[user_id]
+                waiter, chat_id = queue[0]
+                if waiter.done():
+                    break
+                if self._eligible(user_id, chat_id):
+                    if self._deficit.get(user_id, 0.0) >= 1:
+                        queue.popleft()
+                        self._deficit[user_id] -= 1
+                        if not queue:
+                            self._drop_flow(user_id)
+                        return waiter, user_id, chat_id
+                    self._deficit[user_id] = self._deficit.get(user_id, 0.0) + self._weight(user_id)
+                self._active.rotate(-1)
+
+    def _dispatch(self):
+        """Fill free slots with queued requests"""
+        while self.running < self.capacity:
+            turn = self._next()
+            if turn is None:
+                return
+            waiter, user_id, chat_id = turn
+            self._start(user_id, chat_id)
+            waiter.set_result(None)
+
+    async def acquire(self, user_id: int, chat_id: Optional[int] = None):
+        """Wait for a slot; raises QuotaExceeded if the user is over quota"""
+        chat_id = user_id if chat_id is None else chat_id
+        charged = self._charge(user_id)
+        start = time.monotonic()
+
+        # Queued requests that could run would already be running, so a
+        # free slot goes straight to anyone within their limits
+        if self.running < self.capacity and user_id not in self._queues and self._eligible(user_id, chat_id):
+            self._start(user_id, chat_id)
+        else:
+            waiter = asyncio.get_running_loop().create_future()
+            if user_id not in self._queues:
+                self._queues[user_id] = deque()
+                self._active.append(user_id)
+            self._queues[user_id].append((waiter, chat_id))
+            self._dispatch()
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    # Granted just as the request was cancelled
+                    self.release(user_id, chat_id)
+                else:
+                    # Cancelled in the queue: it never used the quota
+                    self._refund(user_id, charged)
+                    self._dispatch()
+                raise
+
+        SCHEDULER_WAIT.observe(time.monotonic() - start, scheduler=self.name)
+
+    def configure(self, **limits: int):
+        """Change capacity, per_user, per_chat or hourly_quota while running
+
+        Running requests keep their slots; queued ones get any slots freed
+        by a raised limit at once.
+        """
+        for name, value in limits.items():
+            if name not in ('capacity', 'per_user', 'per_chat', 'hourly_quota'):
+                raise ValueError(f"Unknown scheduler limit: {name}")
+            setattr(self, name, value)
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, user_id: int, chat_id: Optional[int] = None) -> AsyncIterator[None]:
+        """Hold a slot for the duration of a with-block"""
+        await self.acquire(user_id, chat_id)
+        try:
+            yield
+        finally:
+            self.release(user_id, chat_id)
+
+    def stats(self) -> Dict[str, int]:
+        """Return queue depth and slot counters"""
+        depths = [len(queue) for queue in self._queues.values()]
+        return {
+            'capacity': self.capacity,
+            'running': self.running,
+            'queued': sum(depths),
+            'waiting_users': len(depths),
+            'longest_user_queue': max(depths, default=0),
+            'granted': self.granted,
+            'quota_rejected': self.quota_rejected,
+        }
@@ -0,0 +1,286 @@
+"""
+Local audio fingerprint index
+Landmark fingerprints in the style of Shazam's original paper: spectrogram
+peaks are paired into (f1, f2, dt) hashes, stored in an inverted index in
+SQLite together with each track's recognized metadata. A clip is recognized
+locally when enough of its hashes line up at one time offset in one track,
+so tracks the bot has already seen don't need a call to Shazam.
+"""
+
+import json
+import logging
+import sqlite3
+import subprocess
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple, Union
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 11025
+FFT_SIZE = 1024
+HOP_SIZE = 512
+
+# Peak picking: a peak is the maximum of its neighbourhood (bins x frames)
+NEIGHBORHOOD_BINS = 15
+NEIGHBORHOOD_FRAMES = 5
+PEAKS_PER_FRAME = 2
+# Peaks must be this many dB above the spectrogram's median
+PEAK_MIN_DB = 10
+
+# Each peak is paired with the next FAN_OUT peaks at most MAX_DT frames later
+FAN_OUT = 5
+MAX_DT = 63
+# Hash layout: 9 bits per frequency bin, 6 bits for dt
+FREQ_BINS = 512
+HASH_FREQ_BITS = 9
+HASH_DT_BITS = 6
+
+# SQLite limits the number of bound parameters per statement
+QUERY_CHUNK = 900
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tracks (
+    id INTEGER PRIMARY KEY,
+    media_key TEXT NOT NULL UNIQUE,
+    track TEXT NOT NULL,
+    hashes INTEGER NOT NULL,
+    added_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS hashes (
+    hash INTEGER NOT NULL,
+    track_id INTEGER NOT NULL,
+    offset INTEGER NOT NULL,
+    PRIMARY KEY (hash, track_id, offset)
+) WITHOUT ROWID;
+"""
+
+
+def decode_pcm(source: Union[str, bytes], max_seconds: Optional[float] = None) -> np.ndarray:
+    """Decode any audio FFmpeg can read, a path or the file's contents, to mono float32 PCM at SAMPLE_RATE"""
+    in_memory = isinstance(source, bytes)
+    # A plain pipe can't be seeked, so MP4/M4A clips with their index
+    # (moov atom) at the end, like most phone recordings, would decode to
+    # nothing; the cache protocol makes what was read seekable
+    command = ['ffmpeg', '-v', 'error', '-i', 'cache:pipe:0' if in_memory else source]
+    if not in_memory:
+        command.insert(1, '-nostdin')
+    if max_seconds:
+        command += ['-t', str(max_seconds)]
+    command += ['-ac', '1', '-ar', str(SAMPLE_RATE), '-f', 's16le', '-']
+    result = subprocess.run(command, input=source if in_memory else None, capture_output=True, check=True)
+    return np.frombuffer(result.stdout, dtype=np.int16).astype(np.float32) / 32768
+
+
+def spectrogram(samples: np.ndarray) -> np.ndarray:
+    """Log-magnitude spectrogram in dB, frames x FREQ_BINS"""
+    if len(samples) < FFT_SIZE:
+        return np.empty((0, FREQ_BINS), dtype=np.float32)
+    frames = np.lib.stride_tricks.sliding_window_view(samples, FFT_SIZE)[::HOP_SIZE]
+    magnitude = np.abs(np.fft.rfft(frames * np.hanning(FFT_SIZE).astype(np.float32), axis=1))
+    # The top bin (Nyquist) doesn't fit the hash layout and carries nothing useful
+    return 20 * np.log10(magnitude[:, :FREQ_BINS] + 1e-6).astype(np.float32)
+
+
+def _max_filter(values: np.ndarray, size: int, axis: int) -> np.ndarray:
+    """Maximum over a centered window along one axis"""
+    pad = [(0, 0), (0, 0)]
+    pad[axis] = (size // 2, size // 2)
+    padded = np.pad(values, pad, constant_values=-np.inf)
+    return np.lib.stride_tricks.sliding_window_view(padded, size, axis=axis).max(axis=-1)
+
+
+def find_peaks(spec: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Return (frame, bin) arrays of the spectrogram's constellation points"""
+    if not len(spec):
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    local_max = _max_filter(_max_filter(spec, NEIGHBORHOOD_BINS, 1), NEIGHBORHOOD_FRAMES, 0)
+    candidates = np.where((spec == local_max) & (spec > np.median(spec) + PEAK_MIN_DB), spec, -np.inf)
+
+    # The strongest PEAKS_PER_FRAME of each frame
+    k = min(PEAKS_PER_FRAME, spec.shape[1])
+    bins = np.argpartition(candidates, -k, axis=1)[:, -k:]
+    frames = np.repeat(np.arange(len(spec)), k)
+    bins = bins.ravel()
+    keep = np.isfinite(candidates[frames, bins])
+    return frames[keep], bins[keep]
+
+
+def landmark_hashes(frames: np.ndarray, bins: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Pair peaks into hashes; returns (hashes, anchor frames)"""
+    order = np.lexsort((bins, frames))
+    frames, bins = frames[order], bins[order]
+
+    hashes, offsets = [], []
+    for step in range(1, FAN_OUT + 1):
+        anchor_frames, target_frames = frames[:-step], frames[step:]
+        dt = target_frames - anchor_frames
+        keep = (dt > 0) & (dt <= MAX_DT)
+        pair_hashes = (
+            (bins[:-step][keep] << (HASH_FREQ_BITS + HASH_DT_BITS))
+            | (bins[step:][keep] << HASH_DT_BITS)
+            | dt[keep]
+        )
+        hashes.append(pair_hashes)
+        offsets.append(anchor_frames[keep])
+    if not hashes:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return np.concatenate(hashes).astype(np.int64), np.concatenate(offsets).astype(np.int64)
+
+
+def fingerprint(samples: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Hashes and their time offsets (in frames) for mono PCM at SAMPLE_RATE"""
+    return landmark_hashes(*find_peaks(spectrogram(samples)))
+
+
+class FingerprintIndex:
+    """Inverted index from landmark hashes to (track, offset), in SQLite
+
+    Holds at most ``max_tracks`` tracks; the oldest are dropped first.
+    """
+
+    def __init__(self, path: str, min_matches: int = 12, max_tracks: int = 2000):
+        self.path = Path(path)
+        self.min_matches = min_matches
+        self.max_tracks = max_tracks
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self.counters = {'lookups': 0, 'matches': 0, 'added': 0}
+
+    def __contains__(self, media_key: str) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM tracks WHERE media_key = ?", (media_key,)).fetchone() is not None
+
+    def add(self, media_key: str, track: Dict[str, Any], hashes: np.ndarray, offsets: np.ndarray):
+        """Index a recognized track"""
+        # Repeated (hash, offset) pairs add nothing to a match
+        pairs = np.unique(np.stack([hashes, offsets], axis=1), axis=0)
+        with self._lock:
+            self._conn.execute('BEGIN')
+            try:
+                cursor = self._conn.execute(
+                    "INSERT OR IGNORE INTO tracks (media_key, track, hashes, added_at) VALUES (?, ?, ?, ?)",
+                    (media_key, json.dumps(track, ensure_ascii=False), len(pairs), time.time()),
+                )
+                if cursor.rowcount:
+                    track_id = cursor.lastrowid
+                    self._conn.executemany(
+                        "INSERT OR IGNORE INTO hashes (hash, track_id, offset) VALUES (?, ?, ?)",
+                        ((int(h), track_id, int(o)) for h, o in pairs),
+                    )
+                    self._evict()
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+        if cursor.rowcount:
+            self.counters['added'] += 1
+
+    def _evict(self):
+        """Drop the oldest tracks once above max_tracks (lock held, in a transaction)
+
+        Hashes are keyed by hash, so deleting a track's hashes scans the
+        table; a tenth of the tracks goes at once to make that rare.
+        """
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM tracks").fetchone()
+        if count <= self.max_tracks:
+            return
+        track_ids = [row[0] for row in self._conn.execute(
+            "SELECT id FROM tracks ORDER BY added_at LIMIT ?", (max(1, self.max_tracks // 10),)
+        )]
+        placeholders = ','.join('?' * len(track_ids))
+        self._conn.execute(f"DELETE FROM hashes WHERE track_id IN ({placeholders})", track_ids)
+        self._conn.execute(f"DELETE FROM tracks WHERE id IN ({placeholders})", track_ids)
+        logger.info("Dropped %d oldest tracks from the fingerprint index", len(track_ids))
+
+    def _lookup(self, hashes: np.ndarray) -> np.ndarray:
+        """Return (hash, track_id, offset) rows for the given hashes"""
+        unique = np.unique(hashes).tolist()
+        rows = []
+        with self._lock:
+            for start in range(0, len(unique), QUERY_CHUNK):
+                chunk = unique[start:start + QUERY_CHUNK]
+                rows.extend(self._conn.execute(
+                    f"SELECT hash, track_id, offset FROM hashes WHERE hash IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                ).fetchall())
+        return np.array(rows, dtype=np.int64).reshape(-1, 3)
+
+    def match(self, hashes: np.ndarray, offsets: np.ndarray) -> Optional[Tuple[Dict[str, Any], int]]:
+        """Best matching track and its number of aligned hashes, if above min_matches"""
+        self.counters['lookups'] += 1
+        if not len(hashes):
+            return None
+        rows = self._lookup(hashes)
+        if not len(rows):
+            return None
+
+        # Join every stored (hash, offset) with every query offset of that hash
+        order = np.argsort(hashes, kind='stable')
+        sorted_hashes, sorted_offsets = hashes[order], offsets[order]
+        lo = np.searchsorted(sorted_hashes, rows[:, 0], side='left')
+        hi = np.searchsorted(sorted_hashes, rows[:, 0], side='right')
+        counts = hi - lo
+        row_index = np.repeat(np.arange(len(rows)), counts)
+        query_index = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(lo, counts)
+
+        # A true match has many hashes at the same track offset minus query offset
+        track_ids = rows[row_index, 1]
+        deltas = rows[row_index, 2] - sorted_offsets[query_index]
+        votes, score = np.unique(np.stack([track_ids, deltas], axis=1), axis=0, return_counts=True)
+        best = int(np.argmax(score))
+        if score[best] < self.min_matches:
+            return None
+
+        with self._lock:
+            row = self._conn.execute("SELECT track FROM tracks WHERE id = ?", (int(votes[best, 0]),)).fetchone()
+        if row is None:
+            return None
+        self.counters['matches'] += 1
+        return json.loads(row[0]), int(score[best])
+
+    def add_file(self, media_key: str, file_path: str, track: Dict[str, Any]):
+        """Fingerprint a downloaded track and index it (blocking)"""
+        if media_key in self:
+            return
+        hashes, offsets = fingerprint(decode_pcm(file_path))
+        self.add(media_key, track, hashes, offsets)
+        logger.info("Indexed %s with %d hashes", media_key, len(hashes))
+
+    def match_file(self, source: Union[str, bytes], max_seconds: float = 30) -> Optional[Dict[str, Any]]:
+        """Recognize a clip, a path or the file's contents, from the index (blocking)"""
+        return self.match_samples(decode_pcm(source, max_seconds))
+
+    def match_samples(self, samples: np.ndarray) -> Optional[Dict[str, Any]]:
+        """Recognize decoded PCM at SAMPLE_RATE from the index (blocking)"""
+        match = self.match(*fingerprint(samples))
+        if match:
+            track, score = match
+            logger.info("Local fingerprint match: %s (%d aligned hashes)", track.get('title', 'Unknown'), score)
+            return track
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        """Return index size and lookup counters"""
+        with self._lock:
+            tracks, hashes = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(hashes), 0) FROM tracks").fetchone()
+        lookups = self.counters['lookups']
+        return {
+            'tracks': tracks,
+            'hashes': hashes,
+            **self.counters,
+            'hit_rate': round(self.counters['matches'] / lookups, 3) if lookups else 0.0,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
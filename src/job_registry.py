@@ -0,0 +1,136 @@
+"""
+In-flight job registry
+Concurrent requests for the same canonical media await one shared job
+instead of each running their own download, transcode and upload.
+"""
+
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class Job:
+    """A running job and the requests waiting on it"""
+
+    __slots__ = ('key', 'task', 'progress', 'waiters')
+
+    def __init__(self, key: str, task: asyncio.Future, progress=None):
+        self.key = key
+        self.task = task
+        self.progress = progress
+        self.waiters = 1
+
+
+class JobRegistry:
+    """Runs at most one job per key and shares its result with every caller
+
+    Successful results are kept in a small LRU so requests arriving shortly
+    after a job finished reuse it too (e.g. a Telegram file_id).
+    """
+
+    def __init__(self, name: str, result_cache_size: int = 0):
+        self.name = name
+        self.result_cache_size = result_cache_size
+        self._jobs: Dict[str, Job] = {}
+        self._results: "OrderedDict[str, Any]" = OrderedDict()
+        self.started = 0
+        self.shared = 0
+        self.stopping = False
+
+    async def run(self, key: str, factory: Callable[[], Awaitable[Any]], progress=None) -> Tuple[Any, bool]:
+        """Run or join the job for a key
+
+        Returns the job result and whether this caller ran the job itself.
+        """
+        if key in self._results:
+            self._results.move_to_end(key)
+            self.shared += 1
+            return self._results[key], False
+
+        job = self._jobs.get(key)
+        if job is not None:
+            job.waiters += 1
+            self.shared += 1
+            logger.info("Joined in-flight %s job %s (%d waiting)", self.name, key, job.waiters)
+            if job.progress:
+                job.progress.merge(progress)
+            try:
+                return await self._wait(job), False
+            finally:
+                if job.progress:
+                    job.progress.detach(progress)
+
+        job = Job(key, asyncio.ensure_future(factory()), progress)
+        self._jobs[key] = job
+        self.started += 1
+        job.task.add_done_callback(lambda task: self._finish(job, task))
+        return await self._wait(job), True
+
+    async def _wait(self, job: Job) -> Any:
+        """Wait for a shared job; a cancelled caller leaves it running
+
+        Once the registry is stopping, the job is cancelled with its last
+        waiter instead, and waited for, so it can't finish (e.g. upload)
+        after its requests were returned to the queue.
+        """
+        try:
+            return await asyncio.shield(job.task)
+        except asyncio.CancelledError:
+            task = job.task
+            if not self.stopping:
+                raise
+            if task.done() and not task.cancelled() and task.exception() is None:
+                # Finished just as the caller was cancelled: it did its work
+                return task.result()
+            if job.waiters == 1:
+                task.cancel()
+                await asyncio.wait([task])
+            raise
+        finally:
+            job.waiters -= 1
+
+    def stop(self):
+        """Cancel jobs whose waiters are all cancelled, from now on"""
+        self.stopping = True
+
+    def _finish(self, job: Job, task: asyncio.Future):
+        """Unregister a finished job and remember a successful result"""
+        if self._jobs.get(job.key) is job:
+            del self._jobs[job.key]
+
+        if task.cancelled() or task.exception() is not None:
+            return
+
+        result = task.result()
+        if result and self.result_cache_size:
+            self._results[job.key] = result
+            while len(self._results) > self.result_cache_size:
+                self._results.popitem(last=False)
+
+    def resize(self, result_cache_size: int):
+        """Change how many results are remembered, dropping the oldest"""
+        self.result_cache_size = result_cache_size
+        while len(self._results) > self.result_cache_size:
+            self._results.popitem(last=False)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._jobs
+
+    def __len__(self) -> int:
+        return len(self._jobs)
+
+    def get_result(self, key: str) -> Optional[Any]:
+        """Return a remembered result without running anything"""
+        return self._results.get(key)
+
+    def stats(self) -> Dict[str, int]:
+        """Return job counters"""
+        return {
+            'in_flight': len(self._jobs),
+            'started': self.started,
+            'shared': self.shared,
+            'remembered': len(self._results),
+        }
@@ -0,0 +1,142 @@
+"""
+Persistent job queue
+Every link request and every voice or audio clip sent for recognition is
+written to SQLite when it arrives, keyed by its Telegram update_id, and
+moves through queued -> running -> uploaded or failed. Jobs that were queued or running when the process stopped are
+picked up again on the next start; a redelivered update is recognised by
+its update_id and not processed twice.
+"""
+
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+UPLOADED = 'uploaded'
+FAILED = 'failed'
+
+# Job kinds: a message's links, whose text is the message text, and clips
+# to recognize, whose text is the Telegram Audio or Voice as JSON
+LINK = 'link'
+AUDIO = 'audio'
+VOICE = 'voice'
+
+# Columns that make up a job record
+RECORD_FIELDS = ('update_id', 'chat_id', 'chat_type', 'message_id', 'user_id', 'kind', 'text', 'received_at')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    update_id INTEGER PRIMARY KEY,
+    chat_id INTEGER NOT NULL,
+    chat_type TEXT NOT NULL,
+    message_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    kind TEXT NOT NULL DEFAULT 'link',
+    text TEXT NOT NULL,
+    received_at REAL NOT NULL,
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state);
+"""
+
+
+class JobStore:
+    """SQLite-backed record of link and clip jobs"""
+
+    def __init__(self, path: str, max_attempts: int = 3, retention: float = 7 * 24 * 3600):
+        self.path = Path(path)
+        self.max_attempts = max_attempts
+        self.retention = retention
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Writes are a few small statements; WAL keeps them cheap enough for
+        # the event loop thread
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SCHEMA)
+        # Databases from before clip jobs hold only link jobs
+        columns = [row['name'] for row in self._conn.execute("PRAGMA table_info(jobs)")]
+        if 'kind' not in columns:
+            self._conn.execute(f"ALTER TABLE jobs ADD COLUMN kind TEXT NOT NULL DEFAULT '{LINK}'")
+        self._lock = threading.Lock()
+
+    def add(self, record: Dict[str, Any]) -> bool:
+        """Queue a new job; False if this update_id was seen before"""
+        with self._lock:
+            cursor = self._conn.execute(
+                f"INSERT OR IGNORE INTO jobs ({', '.join(RECORD_FIELDS)}, state, updated_at) "
+                f"VALUES ({', '.join('?' * len(RECORD_FIELDS))}, ?, ?)",
+                [record[field] for field in RECORD_FIELDS] + [QUEUED, time.time()],
+            )
+            return cursor.rowcount == 1
+
+    def set_state(self, update_id: int, state: str, error: Optional[str] = None):
+        """Move a job to a new state; starting it counts as an attempt"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET state = ?, error = ?, updated_at = ?, "
+                "attempts = attempts + (CASE WHEN ? = ? THEN 1 ELSE 0 END) WHERE update_id = ?",
+                (state, error, time.time(), state, RUNNING, update_id),
+            )
+
+    def pending(self, max_age: float) -> List[Dict[str, Any]]:
+        """Jobs to resume: queued or interrupted while running, oldest first
+
+        Jobs that already used every attempt (e.g. one that crashes the
+        process) or are older than max_age are marked failed instead.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET state = ?, error = ?, updated_at = ? "
+                "WHERE state IN (?, ?) AND (attempts >= ? OR received_at < ?)",
+                (FAILED, 'not resumed', now, QUEUED, RUNNING, self.max_attempts, now - max_age),
+            )
+            rows = self._conn.execute(
+                f"SELECT {', '.join(RECORD_FIELDS)} FROM jobs WHERE state IN (?, ?) ORDER BY received_at",
+                (QUEUED, RUNNING),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def popular(self, since: float, limit: int) -> List[Tuple[str, int]]:
+        """Texts of delivered link requests since a time, most requested first"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT text, COUNT(*) AS requests FROM jobs WHERE kind = ? AND state = ? AND received_at >= ? "
+                "GROUP BY text ORDER BY requests DESC LIMIT ?",
+                (LINK, UPLOADED, since, limit),
+            ).fetchall()
+        return [(row['text'], row['requests']) for row in rows]
+
+    def prune(self):
+        """Delete finished jobs past the retention period"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM jobs WHERE state IN (?, ?) AND updated_at < ?",
+                (UPLOADED, FAILED, time.time() - self.retention),
+            )
+        if cursor.rowcount:
+            logger.info("Pruned %d finished jobs", cursor.rowcount)
+
+    def stats(self) -> Dict[str, int]:
+        """Number of jobs in each state"""
+        with self._lock:
+            rows = self._conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall()
+        counts = {state: 0 for state in (QUEUED, RUNNING, UPLOADED, FAILED)}
+        counts.update({state: count for state, count in rows})
+        return counts
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
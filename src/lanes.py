@@ -0,0 +1,163 @@
+"""
+Latency lanes
+Updates are sorted into lanes by what they will do: commands, menu buttons
+and inline queries (interactive), voice notes and audio (recognition), and
+links (download). Each lane has its own concurrency and waiting limits, so
+a lane full of long downloads never delays a button press or a quick
+recognition; the blocking work of the recognition and download lanes runs
+in separate thread pools as well.
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+from src.metrics import LANE_UPDATES, LANE_WAIT
+from src.url_parser import ParsedURL, extract_urls
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = 'interactive'
+RECOGNITION = 'recognition'
+DOWNLOAD = 'download'
+LANES = (INTERACTIVE, RECOGNITION, DOWNLOAD)
+
+UNLIMITED = 2 ** 31 - 1
+
+# URLs found while choosing the lane of a text update, by update_id, until
+# its handler takes them; updates turned away never do
+FOUND_URLS_SIZE = 1024
+_found_urls: "OrderedDict[int, List[ParsedURL]]" = OrderedDict()
+
+
+def update_lane(update: object) -> str:
+    """The lane an update is handled in"""
+    message = update.message if isinstance(update, Update) else None
+    if message:
+        if message.voice or message.audio:
+            return RECOGNITION
+        text = message.text
+        if text and not text.startswith('/'):
+            urls = _found_urls[update.update_id] = extract_urls(text)
+            while len(_found_urls) > FOUND_URLS_SIZE:
+                _found_urls.popitem(last=False)
+            if urls:
+                return DOWNLOAD
+    return INTERACTIVE
+
+
+def update_urls(update: Update) -> List[ParsedURL]:
+    """Supported URLs of a text update, as update_lane() found them"""
+    urls = _found_urls.pop(update.update_id, None)
+    return extract_urls(update.message.text) if urls is None else urls
+
+
+class LaneUpdateProcessor(BaseUpdateProcessor):
+    """Runs updates with a concurrency limit per lane
+
+    Up to ``concurrency[lane]`` updates of a lane run at once and up to
+    ``max_waiting[lane]`` more wait for their turn; further updates are
+    turned away through ``on_full`` instead of piling up.
+    """
+
+    def __init__(
+        self,
+        concurrency: Dict[str, int],
+        max_waiting: Dict[str, int],
+        on_full: Optional[Callable[[object, str], Awaitable[Any]]] = None,
+    ):
+        # The lanes do the limiting, the base class semaphore never blocks
+        # (their limits can be raised at runtime, its bound can't)
+        super().__init__(UNLIMITED)
+        self.concurrency = dict(concurrency)
+        self.max_waiting = dict(max_waiting)
+        self.on_full = on_full
+        self._running = {lane: 0 for lane in self.concurrency}
+        # Updates waiting for a slot of each lane, oldest first
+        self._waiting: Dict[str, Deque[asyncio.Future]] = {lane: deque() for lane in self.concurrency}
+
+    def _wake(self, lane: str):
+        """Hand free slots of a lane to waiting updates"""
+        waiting = self._waiting[lane]
+        while waiting and self._running[lane] < self.concurrency[lane]:
+            waiter = waiting.popleft()
+            if not waiter.done():
+                self._running[lane] += 1
+                waiter.set_result(None)
+
+    def configure(self, lane: str, concurrency: Optional[int] = None, max_waiting: Optional[int] = None):
+        """Change the limits of a lane while updates run in it
+
+        Running updates finish as they are; a raised limit lets waiting
+        updates in at once.
+        """
+        if lane not in self.concurrency:
+            raise ValueError(f"Unknown lane: {lane}")
+        if concurrency is not None:
+            self.concurrency[lane] = concurrency
+        if max_waiting is not None:
+            self.max_waiting[lane] = max_waiting
+        self._wake(lane)
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        lane = update_lane(update)
+        waiting = self._waiting[lane]
+        full = self._running[lane] >= self.concurrency[lane]
+        if full and len(waiting) >= self.max_waiting[lane]:
+            coroutine.close()
+            LANE_UPDATES.inc(lane=lane, outcome='full')
+            logger.warning("%s lane full, turning away update %s", lane, getattr(update, 'update_id', None))
+            if self.on_full:
+                try:
+                    await self.on_full(update, lane)
+                except Exception as e:
+                    logger.error(f"Error answering update turned away: {e}")
+            return
+
+        start = time.monotonic()
+        if full or waiting:
+            waiter = asyncio.get_running_loop().create_future()
+            waiting.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    # Granted just as the update was cancelled
+                    self._running[lane] -= 1
+                    self._wake(lane)
+                elif waiter in waiting:
+                    waiting.remove(waiter)
+                raise
+        else:
+            self._running[lane] += 1
+        LANE_WAIT.observe(time.monotonic() - start, lane=lane)
+
+        try:
+            await coroutine
+        finally:
+            self._running[lane] -= 1
+            self._wake(lane)
+            LANE_UPDATES.inc(lane=lane, outcome='handled')
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Limits, running and waiting updates per lane"""
+        return {
+            lane: {
+                'concurrency': self.concurrency[lane],
+                'max_waiting': self.max_waiting[lane],
+                'running': self._running[lane],
+                'waiting': len(self._waiting[lane]),
+            }
+            for lane in self.concurrency
+        }
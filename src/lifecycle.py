@@ -0,0 +1,131 @@
+"""
+Bot lifecycle
+Link and clip requests are recorded in the job store as they arrive. On SIGTERM or
+SIGINT the bot stops taking new requests, gives running jobs a deadline to
+finish (so uploads in progress complete), and returns the rest to the queue.
+Queued jobs are resumed on the next start.
+"""
+
+import asyncio
+import logging
+import signal
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from src.job_store import FAILED, QUEUED, RUNNING, UPLOADED, JobStore
+
+logger = logging.getLogger(__name__)
+
+# Requests older than this are not resumed
+RESUME_MAX_AGE = 24 * 3600
+
+
+class Lifecycle:
+    """Runs jobs through the job store and drains them on shutdown
+
+    A job is described by a record (update, chat, message, user, the kind
+    of job and the request text) from which it can be started again after
+    a restart.
+    """
+
+    def __init__(self, store: JobStore, drain_timeout: float):
+        self.store = store
+        self.drain_timeout = drain_timeout
+        self.accepting = True
+        self._jobs: Dict[asyncio.Future, Dict[str, Any]] = {}
+        self.deferred = 0
+        self.duplicates = 0
+
+    async def submit(self, record: Dict[str, Any], job: Callable[[], Awaitable[bool]]) -> Optional[bool]:
+        """Record a new request and run it
+
+        Returns None for an update that was already recorded, False if the
+        job was queued for the next start because the bot is shutting down.
+        """
+        if not self.store.add(record):
+            self.duplicates += 1
+            logger.info("Skipping update %s, already recorded", record['update_id'])
+            return None
+
+        if not self.accepting:
+            self.deferred += 1
+            return False
+
+        await self.run(record, job)
+        return True
+
+    async def run(self, record: Dict[str, Any], job: Callable[[], Awaitable[bool]]):
+        """Run a recorded job; it returns whether the audio was delivered"""
+        update_id = record['update_id']
+        self.store.set_state(update_id, RUNNING)
+
+        # Its own task, so cancelling it at the deadline leaves the caller running
+        task = asyncio.ensure_future(job())
+        self._jobs[task] = record
+        try:
+            delivered = await task
+        except asyncio.CancelledError:
+            if not task.cancelled() or self.accepting:
+                raise
+            # Cut off by the shutdown deadline, resumed on the next start
+            self.store.set_state(update_id, QUEUED)
+            logger.info("Returned unfinished job %s to the queue", update_id)
+        except Exception as e:
+            self.store.set_state(update_id, FAILED, repr(e))
+            raise
+        else:
+            self.store.set_state(update_id, UPLOADED if delivered else FAILED)
+        finally:
+            self._jobs.pop(task, None)
+
+    def pending(self) -> List[Dict[str, Any]]:
+        """Jobs left over from the previous run"""
+        self.store.prune()
+        return self.store.pending(RESUME_MAX_AGE)
+
+    def install_signal_handlers(self, on_stopped: Callable[[], None], on_deadline: Optional[Callable[[], None]] = None):
+        """Drain on SIGTERM/SIGINT, then call on_stopped"""
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            try:
+                loop.add_signal_handler(sig, lambda: asyncio.ensure_future(self.shutdown(on_stopped, on_deadline)))
+            except (NotImplementedError, RuntimeError, ValueError):
+                # Not the main thread (e.g. the WSGI bot thread) or no signal support
+                logger.warning(f"Cannot handle {sig.name} here, shutdown will not drain jobs")
+                return
+
+    async def shutdown(self, on_stopped: Callable[[], None], on_deadline: Optional[Callable[[], None]] = None):
+        """Stop intake, wait for running jobs until the deadline, requeue the rest
+
+        ``on_deadline`` runs before the remaining jobs are cancelled, e.g. so
+        work they share is cancelled with them instead of finishing later.
+        """
+        if not self.accepting:
+            return
+        self.accepting = False
+
+        pending = set(self._jobs)
+        logger.info(f"Shutting down, draining {len(pending)} running jobs for up to {self.drain_timeout}s")
+        if pending:
+            _, pending = await asyncio.wait(pending, timeout=self.drain_timeout)
+
+        if pending and on_deadline:
+            on_deadline()
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+            # Jobs that finished anyway were recorded as such by run()
+            unfinished = sum(1 for task in pending if task.cancelled())
+            logger.info(f"{unfinished} unfinished jobs will resume on the next start")
+
+        on_stopped()
+
+    def stats(self) -> Dict[str, int]:
+        """Return job counters"""
+        return {
+            'running': len(self._jobs),
+            'deferred': self.deferred,
+            'duplicates': self.duplicates,
+            'accepting': int(self.accepting),
+            **{f'stored_{state}': count for state, count in self.store.stats().items()},
+        }
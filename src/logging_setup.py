@@ -0,0 +1,166 @@
+"""
+Non-blocking logging
+Loggers only put records on a queue; a listener thread formats them and
+writes JSON lines to size- and time-rotated files, so logging on the event
+loop never waits for the disk.
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
+from pathlib import Path
+from typing import Optional
+
+from src.tracing import current_request_id
+
+# Loggers whose records are JSON documents written to their own file
+TRACE_LOGGER = 'traces'
+
+_listener: Optional[QueueListener] = None
+
+
+class LazyQueueHandler(QueueHandler):
+    """Enqueue records without formatting them
+
+    QueueHandler.prepare() merges the message and arguments on the calling
+    thread; here that is left to the listener. Only the request ID, which
+    lives in the caller's context, is captured up front.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.request_id = current_request_id()
+        return record
+
+
+class SizedTimedRotatingFileHandler(TimedRotatingFileHandler):
+    """Rotates at the given interval and whenever the file exceeds max_bytes"""
+
+    def __init__(self, filename: str, max_bytes: int, when: str = 'midnight', backup_count: int = 7):
+        super().__init__(filename, when=when, backupCount=backup_count, encoding='utf-8', delay=True)
+        self.max_bytes = max_bytes
+        # Every rollover in an interval gets a .000, .001, ... suffix
+        self.namer = self._unique_name
+
+    def shouldRollover(self, record: logging.LogRecord) -> bool:
+        if super().shouldRollover(record):
+            return True
+        if self.max_bytes > 0:
+            if self.stream is None:
+                self.stream = self._open()
+            return self.stream.tell() >= self.max_bytes
+        return False
+
+    @staticmethod
+    def _unique_name(default_name: str) -> str:
+        # Zero-padded and increasing, so sorting by name keeps rotation
+        # order; getFilesToDelete() removes the first names in that order.
+        # A bare name would sort before its numbered siblings.
+        prefix = os.path.basename(default_name) + '.'
+        taken = [
+            int(name[len(prefix):])
+            for name in os.listdir(os.path.dirname(default_name) or '.')
+            if name.startswith(prefix) and name[len(prefix):].isdigit()
+        ]
+        return f"{default_name}.{max(taken, default=-1) + 1:03d}"
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        # Trace records carry a ready-made document
+        if isinstance(record.msg, dict):
+            return json.dumps(record.msg, ensure_ascii=False, default=str)
+
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        request_id = getattr(record, 'request_id', None)
+        if request_id:
+            entry['request_id'] = request_id
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class ExcludeFilter(logging.Filter):
+    """Drop records of one logger hierarchy"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return not super().filter(record)
+
+
+def setup_logging(
+    log_dir: str = 'logs',
+    level: str = 'INFO',
+    max_bytes: int = 5 * 1024 * 1024,
+    backup_count: int = 5,
+    when: str = 'midnight',
+    filename: str = 'bot.log',
+    console: Optional[bool] = None,
+) -> logging.Logger:
+    """Route all logging through a queue to rotated JSON files
+
+    Records also go to stdout if ``console`` is set, by default only when
+    stdout is a terminal: a runner appending stdout to a file would keep an
+    unrotated copy of every log line.
+    """
+    global _listener
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    if _listener is not None:
+        return root
+
+    log_path = Path(log_dir)
+    log_path.mkdir(parents=True, exist_ok=True)
+
+    file_handler = SizedTimedRotatingFileHandler(str(log_path / filename), max_bytes, when, backup_count)
+    file_handler.setFormatter(JsonFormatter())
+    file_handler.addFilter(ExcludeFilter(TRACE_LOGGER))
+
+    trace_handler = SizedTimedRotatingFileHandler(str(log_path / 'traces.jsonl'), max_bytes, when, backup_count)
+    trace_handler.setFormatter(JsonFormatter())
+    trace_handler.addFilter(logging.Filter(TRACE_LOGGER))
+
+    handlers = [file_handler, trace_handler]
+    if sys.stdout.isatty() if console is None else console:
+        console_handler = logging.StreamHandler(sys.stdout)
+        console_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+        console_handler.addFilter(ExcludeFilter(TRACE_LOGGER))
+        handlers.append(console_handler)
+
+    log_queue: queue.Queue = queue.Queue()
+    queue_handler = LazyQueueHandler(log_queue)
+
+    # Replace handlers installed by basicConfig() or an earlier setup
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+
+    trace_logger = logging.getLogger(TRACE_LOGGER)
+    trace_logger.setLevel(logging.INFO)
+    trace_logger.propagate = False
+    trace_logger.addHandler(queue_handler)
+
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    # Flush what is still queued on exit
+    atexit.register(stop_logging)
+
+    return root
+
+
+def stop_logging():
+    """Stop the listener after it has written every queued record"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
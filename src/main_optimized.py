@@ -4,24 +4,29 @@ This version includes specific optimizations for PythonAnywhere environment
 """
 
 import asyncio
+import contextvars
+import functools
+import importlib
+import json
 import logging
 import os
 import re
 import shutil
 import sys
 import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from datetime import datetime
 from pathlib import Path
-from typing import Dict, Optional, List, Any
+from typing import Dict, Optional, List, Any, Tuple, Union
 
-import psutil
-import requests
-from bs4 import BeautifulSoup
-from shazamio import Shazam
-from spotipy.oauth2 import SpotifyClientCredentials
-import spotipy
-import yt_dlp
+# yt_dlp, shazamio, spotipy and psutil are imported where they are first
+# used; together they cost more than the rest of startup
 
 from telegram import (
+    Audio,
+    Chat,
     Update,
     InlineKeyboardButton,
     InlineKeyboardMarkup,
@@ -31,6 +36,7 @@ from telegram import (
     InlineQueryResultAudio,
     InlineQueryResultArticle,
     InputTextMessageContent,
+    Voice,
 )
 from telegram.ext import (
     Application,
@@ -47,6 +53,39 @@ from telegram.error import TelegramError
 
 # Import configuration
 from config.config import *
+from src.admin import AdminConsole, ThroughputMeter, TuneError
+from src.batch_processing import BatchProcessor
+from src.fair_scheduler import FairScheduler, QuotaExceeded
+from src.job_registry import JobRegistry
+from src.job_store import AUDIO, LINK, VOICE, JobStore
+from src.lanes import DOWNLOAD, LANES, RECOGNITION, LaneUpdateProcessor, update_urls
+from src.lifecycle import Lifecycle
+from src.logging_setup import setup_logging
+from src.media_cache import MediaCache, media_key
+from src.metrics import (
+    CLIP_SCREENING,
+    DOWNLOADS,
+    HANDLER_REQUESTS,
+    LANE_UPDATES,
+    REGISTRY,
+    STAGE_ERRORS,
+    STAGE_SECONDS,
+    StatsCollector,
+    stage,
+    start_metrics_server,
+    track_handler,
+)
+from src.negative_cache import NegativeCache
+from src.progress import JobProgress, ProgressReporter
+from src.retry_policy import PERMANENT, CircuitOpenError, ClassifiedError, RetryPolicy, classify_error
+from src.search_cache import SearchCache
+from src.send_queue import PriorityRateLimiter
+from src.telegram_files import DOWNLOAD_LIMIT, FileTooLarge, close_http_client, downloaded_clip, too_large, upload_source
+from src.track import Track
+from src.tracing import record_span, traced
+from src.url_parser import ParsedURL, extract_urls, parse_url, starts_with_url
+from src.warmup import WARMUP_USER_ID, WarmUp
+from src.workers import WorkerPool, run_ytdlp, worker_count
 
 # PythonAnywhere specific imports and optimizations
 try:
@@ -60,34 +99,9 @@ except ImportError:
     PYTHONANYWHERE_OPTIMIZED = False
     print("Warning: PythonAnywhere optimizations not available")
 
-# Set up logging optimized for PythonAnywhere
-def setup_logging():
-    """Setup logging with PythonAnywhere optimizations"""
-    log_dir = Path('logs')
-    log_dir.mkdir(exist_ok=True)
-    
-    # Create formatters
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    )
-    
-    # File handler
-    file_handler = logging.FileHandler(log_dir / 'bot.log')
-    file_handler.setFormatter(formatter)
-    
-    # Console handler
-    console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setFormatter(formatter)
-    
-    # Configure root logger
-    logger = logging.getLogger()
-    logger.setLevel(logging.INFO)
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
-    
-    return logger
-
-logger = setup_logging()
+# Logging goes through a queue so handlers never block the event loop
+setup_logging(LOG_DIR, LOG_LEVEL, LOG_MAX_BYTES, LOG_BACKUP_COUNT, LOG_ROTATE_WHEN, console=LOG_TO_CONSOLE)
+logger = logging.getLogger(__name__)
 
 # Ensure directories exist
 Path(DOWNLOAD_PATH).mkdir(exist_ok=True)
@@ -100,28 +114,233 @@ DOWNLOAD_LINK = range(1)
 # User language storage
 user_languages: Dict[int, str] = {}
 
+# Results per inline query, also what the cache warm-up searches with
+INLINE_RESULTS = 10
+
+# Imported in the background once the bot is up, so the first request
+# doesn't pay for them either
+PRELOAD_MODULES = ('yt_dlp', 'yt_dlp.extractor', 'shazamio')
+
+def preload_modules():
+    """Import the heavy modules deferred at startup (blocking)"""
+    start = time.monotonic()
+    for name in PRELOAD_MODULES:
+        try:
+            importlib.import_module(name)
+        except Exception as e:
+            logger.error(f"Error preloading {name}: {e}")
+    logger.info("Preloaded %s in %.2fs", ', '.join(PRELOAD_MODULES), time.monotonic() - start)
+
+# yt-dlp extractors used to canonicalize URLs of each platform
+PLATFORM_EXTRACTORS = {
+    'youtube': ['Youtube'],
+    'instagram': ['Instagram'],
+    'tiktok': ['TikTok'],
+    'pinterest': ['Pinterest'],
+    'soundcloud': ['Soundcloud'],
+}
+
+# URLs whose canonical media ID came from the extractors, remembered
+CANONICAL_ID_CACHE_SIZE = 1024
+
+def extractor_media_id(url: str, platform: str) -> Optional[str]:
+    """Canonical media ID of a URL from yt-dlp's extractors (blocking)"""
+    from yt_dlp.extractor import get_info_extractor
+    
+    for ie_key in PLATFORM_EXTRACTORS.get(platform, []):
+        try:
+            extractor = get_info_extractor(ie_key)
+            if extractor.suitable(url):
+                media_id = extractor.get_temp_id(url)
+                if media_id:
+                    return media_id
+        except Exception as e:
+            logger.error(f"Error canonicalizing URL with {ie_key}: {e}")
+    return None
+
 class OptimizedMusicBot:
     """Optimized Music Bot for PythonAnywhere"""
     
     def __init__(self):
-        self.shazam = Shazam()
-        self.spotify = None
+        # Clients are created on first use, see the properties below
+        self._shazam = None
+        self._spotify = None
+        self._spotify_failed = False
+        self._fingerprints = None
+        self._fingerprints_failed = not FINGERPRINT_INDEX_ENABLED
+        self._audio_gate = None
+        self._audio_gate_failed = not VOICE_SCREENING_ENABLED
         self.download_settings = optimize_download_settings() if PYTHONANYWHERE_OPTIMIZED else {}
+        self.media_cache = MediaCache(MEDIA_CACHE_PATH, MEDIA_CACHE_MAX_SIZE)
+        # Recent failures keyed by clip:<file_unique_id> and url:<media key>
+        self.negative_cache = NegativeCache(NEGATIVE_CACHE_TTL, NEGATIVE_CACHE_MAX_ENTRIES)
+        self.search_cache = SearchCache(SEARCH_CACHE_TTL, SEARCH_CACHE_MAX_ENTRIES)
+        self._canonical_ids: "OrderedDict[str, Optional[str]]" = OrderedDict()
+        # yt-dlp and FFmpeg block, so they run off the event loop; clip
+        # recognition has its own threads so it never queues behind downloads
+        self.pool_sizes = {DOWNLOAD: DOWNLOAD_WORKERS, RECOGNITION: RECOGNITION_WORKERS}
+        self.pools = {
+            lane: ThreadPoolExecutor(max_workers=size, thread_name_prefix=lane)
+            for lane, size in self.pool_sizes.items()
+        }
+        # Or, optionally, in separate worker processes with their own memory limit
+        self.worker_pool = (
+            WorkerPool(worker_count(WORKER_PROCESSES), WORKER_MEMORY_LIMIT, WORKER_START_TIMEOUT)
+            if USE_WORKER_PROCESSES else None
+        )
+        self.recognition_workers = (
+            WorkerPool(RECOGNITION_WORKER_PROCESSES, WORKER_MEMORY_LIMIT, WORKER_START_TIMEOUT)
+            if USE_WORKER_PROCESSES else None
+        )
+        # Downloads and recognitions wait their turn in per-user queues
+        fairness = dict(
+            per_user=FAIR_MAX_CONCURRENT_PER_USER,
+            per_chat=FAIR_MAX_CONCURRENT_PER_CHAT,
+            hourly_quota=USER_HOURLY_QUOTA,
+            # The cache warm-up only gets what users leave over
+            weights={**USER_WEIGHTS, ADMIN_USER_ID: ADMIN_WEIGHT, WARMUP_USER_ID: 0.1},
+            exempt=(ADMIN_USER_ID, WARMUP_USER_ID),
+        )
+        download_slots = self.worker_pool.size if self.worker_pool else DOWNLOAD_WORKERS
+        self.download_scheduler = FairScheduler('download', download_slots, **fairness)
+        self.recognition_scheduler = FairScheduler('recognition', RECOGNITION_CONCURRENCY, **fairness)
+        self.progress_reporter = ProgressReporter(PROGRESS_UPDATE_INTERVAL)
+        # One download per media key, one download/recognize/upload run per link
+        self.download_jobs = JobRegistry('download')
+        self.link_jobs = JobRegistry('link', result_cache_size=UPLOADED_FILE_CACHE_SIZE)
+        self.retry_policy = RetryPolicy(
+            max_attempts=self.download_settings.get('retries', 3),
+            base_delay=RETRY_BASE_DELAY,
+            max_delay=RETRY_MAX_DELAY,
+            budget_ratio=RETRY_BUDGET_RATIO,
+            breaker_threshold=CIRCUIT_BREAKER_THRESHOLD,
+            breaker_min_requests=CIRCUIT_BREAKER_MIN_REQUESTS,
+            breaker_window=CIRCUIT_BREAKER_WINDOW,
+            breaker_cooldown=CIRCUIT_BREAKER_COOLDOWN,
+        )
         self.last_cleanup = time.time()
         
-        # Initialize Spotify if credentials are available
-        if SPOTIFY_CLIENT_ID and SPOTIFY_CLIENT_SECRET:
+        logger.info("OptimizedMusicBot initialized")
+
+    @property
+    def shazam(self):
+        """Shazam client, created on first recognition or search"""
+        if self._shazam is None:
+            from shazamio import Shazam
+            self._shazam = Shazam()
+        return self._shazam
+
+    @property
+    def spotify(self):
+        """Spotify client if credentials are available, created on first use"""
+        if self._spotify is None and not self._spotify_failed and SPOTIFY_CLIENT_ID and SPOTIFY_CLIENT_SECRET:
             try:
+                import spotipy
+                from spotipy.oauth2 import SpotifyClientCredentials
+                
                 auth_manager = SpotifyClientCredentials(
                     client_id=SPOTIFY_CLIENT_ID,
                     client_secret=SPOTIFY_CLIENT_SECRET
                 )
-                self.spotify = spotipy.Spotify(auth_manager=auth_manager)
+                self._spotify = spotipy.Spotify(auth_manager=auth_manager)
                 logger.info("Spotify initialized successfully")
             except Exception as e:
+                self._spotify_failed = True
                 logger.error(f"Failed to initialize Spotify: {e}")
+        return self._spotify
+
+    @property
+    def fingerprints(self):
+        """Local fingerprint index if enabled and NumPy is available, opened on first use"""
+        if self._fingerprints is None and not self._fingerprints_failed:
+            try:
+                from src.fingerprint import FingerprintIndex
+                
+                self._fingerprints = FingerprintIndex(FINGERPRINT_DB_PATH, FINGERPRINT_MIN_MATCHES, FINGERPRINT_MAX_TRACKS)
+            except Exception as e:
+                self._fingerprints_failed = True
+                logger.error(f"Fingerprint index not available: {e}")
+        return self._fingerprints
+
+    @property
+    def audio_gate(self):
+        """Clip screening if enabled and NumPy is available, created on first use"""
+        if self._audio_gate is None and not self._audio_gate_failed:
+            try:
+                from src.audio_gate import AudioGate
+                
+                self._audio_gate = AudioGate(
+                    silence_db=SCREEN_SILENCE_DB,
+                    min_seconds=SCREEN_MIN_SECONDS,
+                    max_flatness=SCREEN_MAX_FLATNESS,
+                    pause_db=SCREEN_PAUSE_DB,
+                    max_pause_ratio=SCREEN_MAX_PAUSE_RATIO,
+                )
+            except Exception as e:
+                self._audio_gate_failed = True
+                logger.error(f"Clip screening not available: {e}")
+        return self._audio_gate
+
+    async def screen_clip(self, audio: Union[str, bytes], platform: str, lane: str = RECOGNITION) -> Optional[Tuple[str, Any]]:
+        """Decode a clip and classify it, returning the verdict and trimmed PCM"""
+        if not self.audio_gate:
+            return None
+        from src.fingerprint import SAMPLE_RATE, decode_pcm
         
-        logger.info("OptimizedMusicBot initialized")
+        try:
+            with stage('clip_decode', platform):
+                samples = await self.run_in_pool(lane, decode_pcm, audio, SCREEN_MAX_SECONDS)
+            with stage('clip_screen', platform):
+                verdict, samples = await self.run_in_pool(lane, self.audio_gate.screen, samples, SAMPLE_RATE)
+        except Exception as e:
+            logger.error(f"Error screening clip: {e}")
+            return None
+        CLIP_SCREENING.inc(verdict=verdict)
+        return verdict, samples
+
+    async def match_fingerprint(self, audio: Union[str, bytes], platform: str, samples: Any = None, lane: str = RECOGNITION) -> Optional[Track]:
+        """Recognize a clip (file path, file contents or decoded PCM) from the local fingerprint index"""
+        if not self.fingerprints:
+            return None
+        try:
+            with stage('fingerprint_match', platform):
+                if samples is not None:
+                    match = await self.run_in_pool(lane, self.fingerprints.match_samples, samples)
+                else:
+                    match = await self.run_in_pool(lane, self.fingerprints.match_file, audio)
+            return Track.from_shazam(match)
+        except Exception as e:
+            logger.error(f"Error matching fingerprint: {e}")
+            return None
+
+    async def index_track(self, media_key: str, file_path: str, track: Track):
+        """Add a downloaded, recognized track to the fingerprint index and
+        unpin its cached file"""
+        try:
+            if not self.fingerprints:
+                return
+            with stage('fingerprint_index'):
+                await self.run_in_download_pool(self.fingerprints.add_file, media_key, file_path, track.to_dict())
+        except Exception as e:
+            logger.error(f"Error indexing {media_key}: {e}")
+        finally:
+            self.media_cache.unpin(media_key)
+
+    async def recognize_download(self, file_path: str, resolved: Tuple[str, str]) -> Optional[Track]:
+        """Recognize a track from download_audio and add it to the fingerprint index
+
+        Indexing runs in the background; the cached file stays pinned until
+        it is done. A file too large to recognize gets no track.
+        """
+        platform, key = resolved
+        try:
+            track = await self.recognize_song(file_path, platform=platform, lane=DOWNLOAD)
+        except FileTooLarge:
+            return None
+        if track and self.media_cache.contains(file_path):
+            self.media_cache.pin(key)
+            asyncio.ensure_future(self.index_track(key, file_path, track))
+        return track
 
     def get_user_language(self, user_id: int) -> str:
         """Get user's preferred language"""
@@ -132,30 +351,83 @@ class OptimizedMusicBot:
         lang = self.get_user_language(user_id)
         return BOT_MESSAGES[lang].get(key, key)
 
+    def quota_message(self, user_id: int, error: QuotaExceeded) -> str:
+        """Tell the user when their quota frees up again"""
+        return self.get_message(user_id, 'quota_exceeded').format(minutes=max(1, round(error.retry_after / 60)))
+
+    def too_large_message(self, user_id: int, limit: int) -> str:
+        """Tell the user the largest file the bot takes"""
+        return self.get_message(user_id, 'file_too_large').format(limit=limit // (1024 * 1024))
+    
     def get_button_text(self, user_id: int, key: str) -> str:
         """Get localized button text"""
         lang = self.get_user_language(user_id)
         return BUTTON_TEXTS[lang].get(key, key)
 
-    async def recognize_song(self, file_path: str) -> Optional[Dict[str, Any]]:
-        """Recognize song using ShazamIO with error handling"""
+    @traced()
+    async def recognize_song(self, audio: Union[str, bytes], negative_key: Optional[str] = None, platform: str = 'telegram', screen: bool = False, lane: str = RECOGNITION) -> Optional[Track]:
+        """Recognize song using ShazamIO with error handling
+
+        ``audio`` is a file path or, for small clips, the file's contents. With ``screen`` the clip is first checked for music and trimmed of
+        leading silence. A clip Shazam answered without a match, or one
+        screening rejected, is remembered under ``negative_key``; timeouts
+        and errors are not, they may succeed later. Blocking steps run in
+        the pool of ``lane``; downloaded tracks are recognized in the
+        download lane, so they don't slow down clips. Raises FileTooLarge
+        for a file over the size limit, which is never remembered.
+        """
         try:
-            # Check file size
-            file_size = os.path.getsize(file_path)
-            if file_size > self.download_settings.get('max_file_size', 50 * 1024 * 1024):
+            # Anything the Bot API let the bot download, up to 2 GB from a
+            # local server, is not too large to recognize
+            limit = max(self.download_settings.get('max_file_size', 50 * 1024 * 1024), DOWNLOAD_LIMIT)
+            file_size = len(audio) if isinstance(audio, bytes) else os.path.getsize(audio)
+            if file_size > limit:
                 logger.warning(f"File too large for recognition: {file_size} bytes")
-                return None
+                raise FileTooLarge(file_size, limit)
+            
+
+            # Spoken, silent and noisy clips never reach Shazam
+            samples = None
+            screened = await self.screen_clip(audio, platform, lane) if screen else None
+            if screened:
+                verdict, samples = screened
+                if verdict != 'music':
+                    logger.info("Clip rejected before recognition: %s", verdict)
+                    if negative_key:
+                        self.negative_cache.add(negative_key, verdict)
+                    return None
+            
+            # Tracks seen before are recognized locally
+            track = await self.match_fingerprint(audio, platform, samples, lane)
+            if track:
+                return track
+            
+            # The trimmed clip is sent instead of the original
+            if samples is not None:
+                from src.audio_gate import to_wav
+                from src.fingerprint import SAMPLE_RATE
+                
+                audio = to_wav(samples, SAMPLE_RATE)
             
             # Recognize song with timeout
-            result = await asyncio.wait_for(
-                self.shazam.recognize(file_path),
-                timeout=self.download_settings.get('timeout', 300)
-            )
+            timeout = self.download_settings.get('timeout', 300)
+            workers = self.recognition_workers if lane == RECOGNITION else self.worker_pool
+            with stage('shazam_recognize', platform):
+                if workers:
+                    result = await workers.run('recognize', audio, timeout)
+                else:
+                    result = await asyncio.wait_for(self.shazam.recognize(audio), timeout=timeout)
             
-            if result and result.get('track'):
-                logger.info(f"Song recognized: {result['track'].get('title', 'Unknown')}")
-                return result['track']
+            track = Track.from_shazam(result.get('track')) if result else None
+            if track:
+                logger.info("Song recognized: %s", track.title)
+                return track
             
+            if negative_key:
+                self.negative_cache.add(negative_key, 'no_match')
+            
+        except FileTooLarge:
+            raise
         except asyncio.TimeoutError:
             logger.error("Song recognition timed out")
         except Exception as e:
@@ -167,162 +439,288 @@ class OptimizedMusicBot:
 
     def detect_platform(self, url: str) -> Optional[str]:
         """Detect which platform the URL belongs to"""
-        for platform, domains in SUPPORTED_PLATFORMS.items():
-            for domain in domains:
-                if domain in url:
-                    return platform
+        parsed = parse_url(url)
+        return parsed.platform if parsed else None
+
+    async def run_in_download_pool(self, func, *args):
+        """Run a blocking download step in the download thread pool"""
+        return await self.run_in_pool(DOWNLOAD, func, *args)
+
+    async def run_in_pool(self, lane: str, func, *args):
+        """Run a blocking step in the thread pool of a lane"""
+        loop = asyncio.get_running_loop()
+        # Carry the request's trace into the worker thread
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(self.pools[lane], functools.partial(context.run, func, *args))
+
+    def workers(self, lane: str) -> int:
+        """Threads, or worker processes, running the blocking steps of a lane"""
+        processes = self.worker_pool if lane == DOWNLOAD else self.recognition_workers
+        return processes.size if processes else self.pool_sizes[lane]
+
+    def resize_workers(self, lane: str, workers: int):
+        """Change the threads or worker processes of a lane while jobs run
+
+        Steps already running finish where they are, new ones use the new
+        size. The download slots follow the download workers.
+        """
+        processes = self.worker_pool if lane == DOWNLOAD else self.recognition_workers
+        if processes:
+            processes.resize(workers)
+        else:
+            pool = self.pools[lane]
+            self.pools[lane] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=lane)
+            self.pool_sizes[lane] = workers
+            pool.shutdown(wait=False)
+        if lane == DOWNLOAD:
+            self.download_scheduler.configure(capacity=workers)
+
+    async def canonicalize_url(self, url: str, platform: str) -> Optional[str]:
+        """Extract the canonical media ID of a URL through yt-dlp's extractors"""
+        if url in self._canonical_ids:
+            self._canonical_ids.move_to_end(url)
+            return self._canonical_ids[url]
+
+        # Importing and scanning the extractors blocks; the default executor
+        # keeps the lookup from queueing behind downloads
+        loop = asyncio.get_running_loop()
+        media_id = await loop.run_in_executor(None, extractor_media_id, url, platform)
+        self._canonical_ids[url] = media_id
+        while len(self._canonical_ids) > CANONICAL_ID_CACHE_SIZE:
+            self._canonical_ids.popitem(last=False)
+        return media_id
+
+    async def download_with_retry(self, platform: str, download_func, url: str, file_id: str, progress: Optional[JobProgress] = None) -> Optional[str]:
+        """Download with retries for transient errors only"""
+        try:
+            return await self.retry_policy.call(platform, download_func, url, file_id, progress)
+        except CircuitOpenError as e:
+            logger.warning(f"Skipping download: {e}")
+        except Exception as e:
+            kind = classify_error(e)
+            logger.error(f"Download from {platform} failed ({kind}): {e}")
+            # Removed, private or geo-blocked media fails the same way next time
+            if kind == PERMANENT:
+                self.negative_cache.add(f'url:{file_id}', str(e))
         return None
 
-    async def download_with_retry(self, download_func, *args, **kwargs) -> Optional[str]:
-        """Download with retry logic"""
-        retries = self.download_settings.get('retries', 3)
-        
-        for attempt in range(retries):
-            try:
-                result = await download_func(*args, **kwargs)
-                if result:
-                    return result
-            except Exception as e:
-                logger.error(f"Download attempt {attempt + 1} failed: {e}")
-                if attempt < retries - 1:
-                    await asyncio.sleep(2 ** attempt)  # Exponential backoff
+    def ydl_options(self, output_id: str) -> Dict[str, Any]:
+        """Build yt-dlp options for a download into the media cache"""
+        ydl_opts = YOUTUBE_DL_OPTIONS.copy()
+        ydl_opts['outtmpl'] = f'{self.media_cache.tmp_dir}/{output_id}.%(ext)s'
+        ydl_opts['socket_timeout'] = 30
+        # A watch?v=...&list=... link is one video here; playlists are only
+        # expanded by batch_processing.open_playlist
+        ydl_opts['noplaylist'] = True
+        return ydl_opts
+
+    async def ytdlp_download(self, ydl_opts: Dict[str, Any], url: str, platform: str, progress: Optional[JobProgress] = None) -> str:
+        """Run a yt-dlp download in the download pool or a worker process
+
+        Extraction and download are timed as ytdlp_extract, everything from
+        the first postprocessor on as ffmpeg_transcode.
+        """
+        try:
+            if self.worker_pool:
+                hooks = {'download': progress.ytdlp_hook, 'postprocess': progress.postprocessor_hook} if progress else None
+                result = await self.worker_pool.run('ytdlp', ydl_opts, url, hooks=hooks)
+            else:
+                result = await self.run_in_download_pool(
+                    run_ytdlp,
+                    ydl_opts,
+                    url,
+                    progress.ytdlp_hook if progress else None,
+                    progress.postprocessor_hook if progress else None,
+                )
+        except ClassifiedError as e:
+            STAGE_ERRORS.inc(stage=e.stage or 'ytdlp_extract', platform=platform)
+            raise
         
-        return None
+        transcode_start = result['transcode_started'] or result['finished']
+        STAGE_SECONDS.observe(transcode_start - result['started'], stage='ytdlp_extract', platform=platform)
+        record_span('ytdlp_extract', result['started'], transcode_start, platform=platform)
+        if result['transcode_started']:
+            STAGE_SECONDS.observe(result['finished'] - transcode_start, stage='ffmpeg_transcode', platform=platform)
+            record_span('ffmpeg_transcode', transcode_start, result['finished'], platform=platform)
+        return result['filename']
 
-    async def download_from_youtube(self, url: str, video_id: str) -> Optional[str]:
+    async def download_from_youtube(self, url: str, video_id: str, progress: Optional[JobProgress] = None) -> Optional[str]:
         """Download audio from YouTube with optimizations"""
         try:
-            ydl_opts = YOUTUBE_DL_OPTIONS.copy()
-            ydl_opts['outtmpl'] = f'{DOWNLOAD_PATH}/{video_id}.%(ext)s'
-            ydl_opts['socket_timeout'] = 30
+            ydl_opts = self.ydl_options(video_id)
             ydl_opts['retries'] = 3
             
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=True)
-                filename = ydl.prepare_filename(info)
-                
-                # Convert to mp3 if needed
-                if filename.endswith(('.webm', '.m4a')):
-                    mp3_filename = filename.rsplit('.', 1)[0] + '.mp3'
-                    if os.path.exists(mp3_filename):
-                        return mp3_filename
-                
-                return filename
+            filename = await self.ytdlp_download(ydl_opts, url, 'youtube', progress)
+            
+            # Convert to mp3 if needed
+            if filename.endswith(('.webm', '.m4a')):
+                mp3_filename = filename.rsplit('.', 1)[0] + '.mp3'
+                if os.path.exists(mp3_filename):
+                    return mp3_filename
+            
+            return filename
         except Exception as e:
             logger.error(f"Error downloading from YouTube: {e}")
             if PYTHONANYWHERE_OPTIMIZED:
                 PythonAnywhereErrorHandler.handle_network_error()
-        return None
+            raise
 
-    async def download_from_soundcloud(self, url: str, track_id: str) -> Optional[str]:
+    async def download_from_soundcloud(self, url: str, track_id: str, progress: Optional[JobProgress] = None) -> Optional[str]:
         """Download audio from SoundCloud"""
         try:
-            ydl_opts = YOUTUBE_DL_OPTIONS.copy()
-            ydl_opts['outtmpl'] = f'{DOWNLOAD_PATH}/{track_id}.%(ext)s'
-            ydl_opts['socket_timeout'] = 30
-            
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=True)
-                filename = ydl.prepare_filename(info)
-                return filename
+            ydl_opts = self.ydl_options(track_id)
+            return await self.ytdlp_download(ydl_opts, url, 'soundcloud', progress)
         except Exception as e:
             logger.error(f"Error downloading from SoundCloud: {e}")
-        return None
+            raise
 
-    async def download_from_instagram(self, url: str, media_id: str) -> Optional[str]:
+    async def download_from_instagram(self, url: str, media_id: str, progress: Optional[JobProgress] = None) -> Optional[str]:
         """Download audio from Instagram"""
         try:
-            ydl_opts = YOUTUBE_DL_OPTIONS.copy()
-            ydl_opts['outtmpl'] = f'{DOWNLOAD_PATH}/{media_id}.%(ext)s'
-            ydl_opts['socket_timeout'] = 30
-            
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=True)
-                filename = ydl.prepare_filename(info)
-                return filename
+            ydl_opts = self.ydl_options(media_id)
+            return await self.ytdlp_download(ydl_opts, url, 'instagram', progress)
         except Exception as e:
             logger.error(f"Error downloading from Instagram: {e}")
-        return None
+            raise
 
-    async def download_from_tiktok(self, url: str, video_id: str) -> Optional[str]:
+    async def download_from_tiktok(self, url: str, video_id: str, progress: Optional[JobProgress] = None) -> Optional[str]:
         """Download audio from TikTok"""
         try:
-            ydl_opts = YOUTUBE_DL_OPTIONS.copy()
-            ydl_opts['outtmpl'] = f'{DOWNLOAD_PATH}/{video_id}.%(ext)s'
-            ydl_opts['socket_timeout'] = 30
-            
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=True)
-                filename = ydl.prepare_filename(info)
-                return filename
+            ydl_opts = self.ydl_options(video_id)
+            return await self.ytdlp_download(ydl_opts, url, 'tiktok', progress)
         except Exception as e:
             logger.error(f"Error downloading from TikTok: {e}")
-        return None
+            raise
 
-    async def download_from_pinterest(self, url: str, pin_id: str) -> Optional[str]:
+    async def download_from_pinterest(self, url: str, pin_id: str, progress: Optional[JobProgress] = None) -> Optional[str]:
         """Download audio from Pinterest"""
         try:
-            ydl_opts = YOUTUBE_DL_OPTIONS.copy()
-            ydl_opts['outtmpl'] = f'{DOWNLOAD_PATH}/{pin_id}.%(ext)s'
-            ydl_opts['socket_timeout'] = 30
-            
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=True)
-                filename = ydl.prepare_filename(info)
-                return filename
+            ydl_opts = self.ydl_options(pin_id)
+            return await self.ytdlp_download(ydl_opts, url, 'pinterest', progress)
         except Exception as e:
             logger.error(f"Error downloading from Pinterest: {e}")
-        return None
+            raise
 
-    async def download_audio(self, url: str) -> Optional[str]:
-        """Download audio from various platforms with optimizations"""
-        platform = self.detect_platform(url)
-        if not platform:
+    async def resolve_media_key(self, url: str) -> Optional[Tuple[str, str]]:
+        """Resolve a URL to its platform and media cache key"""
+        parsed = parse_url(url)
+        if not parsed:
+            return None
+        
+        # Same media reached through different URLs shares one cache key,
+        # yt-dlp's extractors cover URL shapes the parser doesn't know
+        media_id = parsed.media_id or await self.canonicalize_url(url, parsed.platform) or url
+        return parsed.platform, media_key(parsed.platform, media_id)
+
+    @traced()
+    async def download_audio(self, url: str, user_id: int, chat_id: Optional[int] = None, progress: Optional[JobProgress] = None, resolved: Optional[Tuple[str, str]] = None) -> Optional[str]:
+        """Download audio from various platforms with optimizations
+
+        A download that has to run waits for a download_scheduler slot of
+        ``user_id`` in ``chat_id`` and may raise QuotaExceeded; cache hits
+        return at once. ``resolved`` is the URL's (platform, media key) if
+        the caller has it. The caller hands the file to media_cache.release()
+        when done; until then eviction leaves a cached file in place.
+        """
+        resolved = resolved or await self.resolve_media_key(url)
+        if not resolved:
             logger.warning(f"Unsupported platform for URL: {url}")
             return None
+        platform, file_id = resolved
+        
+        self.media_cache.pin(file_id)
+        file_path = None
+        try:
+            file_path = await self._fetch_audio(url, platform, file_id, user_id, chat_id, progress)
+            return file_path
+        finally:
+            if not (file_path and self.media_cache.contains(file_path)):
+                self.media_cache.unpin(file_id)
 
-        # Generate a unique ID for the file
-        file_id = re.sub(r'[^\w\-_\.]', '_', url)[:50]
+    async def _fetch_audio(self, url: str, platform: str, file_id: str, user_id: int, chat_id: Optional[int], progress: Optional[JobProgress]) -> Optional[str]:
+        """The cached file of a media key, or a new download of it"""
+        cached_path = self.media_cache.get(file_id)
+        if cached_path:
+            logger.info("Media cache hit for %s", url)
+            DOWNLOADS.inc(platform=platform, outcome='cached')
+            return cached_path
+        
+        failure = self.negative_cache.get(f'url:{file_id}')
+        if failure:
+            logger.info("Negative cache hit for %s: %s", url, failure)
+            DOWNLOADS.inc(platform=platform, outcome='known_failure')
+            return None
         
         # Check memory usage before download
         if PYTHONANYWHERE_OPTIMIZED:
+            import psutil
             memory = psutil.virtual_memory()
             if memory.percent > 80:
                 logger.warning(f"High memory usage: {memory.percent}%, skipping download")
+                DOWNLOADS.inc(platform=platform, outcome='skipped')
                 return None
         
+        # A resubmitted link attaches to the download already in flight;
+        # only a new download waits its turn with other users' downloads
+        progress = progress or self.progress_reporter.job(self.get_message)
+        in_flight = file_id in self.download_jobs
+        async with nullcontext() if in_flight else self.download_scheduler.slot(user_id, chat_id):
+            file_path, ran_it = await self.download_jobs.run(
+                file_id,
+                lambda: self._download_media(url, platform, file_id, progress),
+                progress
+            )
+        if not ran_it:
+            DOWNLOADS.inc(platform=platform, outcome='shared')
+        else:
+            DOWNLOADS.inc(platform=platform, outcome='downloaded' if file_path else 'failed')
+        return file_path
+
+    @traced('download_media')
+    async def _download_media(self, url: str, platform: str, file_id: str, progress: JobProgress) -> Optional[str]:
+        """Download a media item and move it into the media cache"""
         # Download based on platform
+        file_path = None
         if platform == 'youtube':
-            return await self.download_with_retry(self.download_from_youtube, url, file_id)
+            file_path = await self.download_with_retry(platform, self.download_from_youtube, url, file_id, progress)
         elif platform == 'soundcloud':
-            return await self.download_with_retry(self.download_from_soundcloud, url, file_id)
+            file_path = await self.download_with_retry(platform, self.download_from_soundcloud, url, file_id, progress)
         elif platform == 'instagram':
-            return await self.download_with_retry(self.download_from_instagram, url, file_id)
+            file_path = await self.download_with_retry(platform, self.download_from_instagram, url, file_id, progress)
         elif platform == 'tiktok':
-            return await self.download_with_retry(self.download_from_tiktok, url, file_id)
+            file_path = await self.download_with_retry(platform, self.download_from_tiktok, url, file_id, progress)
         elif platform == 'pinterest':
-            return await self.download_with_retry(self.download_from_pinterest, url, file_id)
+            file_path = await self.download_with_retry(platform, self.download_from_pinterest, url, file_id, progress)
         
-        return None
+        if not file_path:
+            return None
+        
+        # prepare_filename() reports the pre-conversion name
+        if not os.path.exists(file_path):
+            mp3_filename = file_path.rsplit('.', 1)[0] + '.mp3'
+            if not os.path.exists(mp3_filename):
+                return None
+            file_path = mp3_filename
+        
+        # Hashing and linking a file of up to 50MB would block the event loop
+        return await self.run_in_download_pool(self.media_cache.put, file_id, file_path)
 
-    async def search_song(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
+    async def search_song(self, query: str, limit: int = 5) -> List[Track]:
         """Search for songs using Shazam"""
+        cached = self.search_cache.get(query, limit)
+        if cached is not None:
+            return cached
         try:
-            results = await self.shazam.search_track(query=query, limit=limit)
-            if results and results.get('tracks', {}).get('hits'):
-                return results['tracks']['hits']
+            with stage('shazam_search'):
+                results = await self.shazam.search_track(query=query, limit=limit)
+            hits = (results or {}).get('tracks', {}).get('hits') or []
+            tracks = [track for track in (Track.from_shazam(hit.get('track')) for hit in hits) if track]
+            self.search_cache.put(query, limit, tracks)
+            return tracks
         except Exception as e:
             logger.error(f"Error searching songs: {e}")
         return []
 
-    def format_song_info(self, track: Dict[str, Any]) -> str:
-        """Format song information for display"""
-        title = track.get('title', 'Unknown')
-        artist = track.get('subtitle', 'Unknown Artist')
-        album = track.get('sections', [{}])[0].get('metadata', [{}])[0].get('text', 'Unknown Album')
-        
-        return f"🎵 {title}\n👤 {artist}\n💿 {album}"
-
     def cleanup_old_files(self):
         """Clean old downloaded files with optimizations"""
         current_time = time.time()
@@ -333,17 +731,45 @@ class OptimizedMusicBot:
         
         try:
             for file in Path(DOWNLOAD_PATH).glob('*'):
-                if file.is_file():
+                # The job and fingerprint databases live here too
+                if file.is_file() and '.sqlite3' not in file.name:
                     # Remove files older than 1 hour
                     if current_time - file.stat().st_mtime > 3600:
                         file.unlink()
-                        logger.info(f"Cleaned up old file: {file}")
+                        logger.debug("Cleaned up old file: %s", file)
             
             self.last_cleanup = current_time
             
         except Exception as e:
             logger.error(f"Error cleaning old files: {e}")
 
+    def cache_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Hit rates of the positive caches and the negative cache, reported apart"""
+        return {
+            'media_cache': self.media_cache.stats(),
+            'uploaded_files': self.link_jobs.stats(),
+            'negative_cache': self.negative_cache.stats(),
+            'search_cache': self.search_cache.stats(),
+            **({'fingerprints': self.fingerprints.stats()} if self._fingerprints else {}),
+        }
+
+    def scheduler_stats(self) -> Dict[str, Dict[str, int]]:
+        """Slots and queues of the download and recognition schedulers"""
+        return {
+            scheduler.name: scheduler.stats() for scheduler in (self.download_scheduler, self.recognition_scheduler)
+        }
+
+    def worker_stats(self) -> Dict[str, Dict[str, int]]:
+        """Worker process pools, empty without USE_WORKER_PROCESSES"""
+        if not self.worker_pool:
+            return {}
+        return {'media': self.worker_pool.stats(), 'recognition': self.recognition_workers.stats()}
+
+    def configure_schedulers(self, limit: str, value: int):
+        """Set per_user, per_chat or hourly_quota of both schedulers"""
+        for scheduler in (self.download_scheduler, self.recognition_scheduler):
+            scheduler.configure(**{limit: value})
+
     def perform_health_check(self):
         """Perform health check"""
         if PYTHONANYWHERE_OPTIMIZED:
@@ -352,8 +778,32 @@ class OptimizedMusicBot:
 
 # Create bot instance
 bot = OptimizedMusicBot()
+batch_processor = BatchProcessor(bot)
+lifecycle = Lifecycle(JobStore(JOB_DB_PATH, JOB_MAX_ATTEMPTS), SHUTDOWN_DRAIN_TIMEOUT)
+warmup = WarmUp(
+    bot,
+    lifecycle.store,
+    budget=WARMUP_BUDGET,
+    interval=WARMUP_INTERVAL,
+    chart_tracks=WARMUP_CHART_TRACKS,
+    chart_country=WARMUP_CHART_COUNTRY,
+    top_links=WARMUP_TOP_LINKS,
+    history_days=WARMUP_HISTORY_DAYS,
+    upload_chat_id=WARMUP_UPLOAD_CHAT_ID,
+    search_limit=INLINE_RESULTS,
+) if WARMUP_ENABLED else None
+# /stats and /tune of ADMIN_USER_ID, main() adds the sections and limits
+admin = AdminConsole(ThroughputMeter({
+    'updates': lambda: LANE_UPDATES.total(outcome='handled'),
+    'turned_away': lambda: LANE_UPDATES.total(outcome='full'),
+    'clips': lambda: HANDLER_REQUESTS.total(handler='handle_audio') + HANDLER_REQUESTS.total(handler='handle_voice'),
+    'downloads': lambda: DOWNLOADS.total(outcome='downloaded'),
+    'cached_links': lambda: DOWNLOADS.total(outcome='cached') + DOWNLOADS.total(outcome='shared'),
+    'failed_links': lambda: DOWNLOADS.total(outcome='failed'),
+}, window=ADMIN_STATS_WINDOW))
 
 # Command handlers
+@track_handler
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /start command"""
     user_id = update.effective_user.id
@@ -362,6 +812,7 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # Perform health check
     health = bot.perform_health_check()
     logger.info(f"Health check for user {user_id}: {health}")
+    logger.info(f"Cache stats: {bot.cache_stats()}")
     
     welcome_text = bot.get_message(user_id, 'start').format(BOT_USERNAME)
     
@@ -383,12 +834,14 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         parse_mode='Markdown'
     )
 
+@track_handler
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /help command"""
     user_id = update.effective_user.id
     help_text = bot.get_message(user_id, 'start').format(BOT_USERNAME)
     await update.message.reply_text(help_text, parse_mode='Markdown')
 
+@track_handler
 async def language_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /language command"""
     user_id = update.effective_user.id
@@ -406,34 +859,90 @@ async def language_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         reply_markup=reply_markup
     )
 
+# Admin commands, registered for ADMIN_USER_ID only
+@track_handler
+async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /stats: throughput, queues, cache hit rates and platform errors"""
+    await update.message.reply_text(admin.stats_report())
+
+@track_handler
+async def tune_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /tune name=value ...: change limits of the running bot"""
+    user_id = update.effective_user.id
+    if not context.args:
+        await update.message.reply_text(bot.get_message(user_id, 'tune_usage').format(admin.tunables_report()))
+        return
+    
+    try:
+        changes = admin.tune(context.args)
+    except TuneError as e:
+        await update.message.reply_text(bot.get_message(user_id, 'tune_rejected').format(e))
+        return
+    
+    applied = '\n'.join(f"{name}: {old} → {new}" for name, old, new in changes)
+    await update.message.reply_text(bot.get_message(user_id, 'tune_applied').format(applied))
+
 # Message handlers
+def job_record(update: Update, kind: str, text: str) -> Dict[str, Any]:
+    """Job store record of a request; the update_id makes a redelivered update a no-op"""
+    message = update.message
+    return {
+        'update_id': update.update_id,
+        'chat_id': message.chat_id,
+        'chat_type': message.chat.type,
+        'message_id': message.message_id,
+        'user_id': update.effective_user.id,
+        'kind': kind,
+        'text': text,
+        'received_at': time.time(),
+    }
+
+async def submit_clip(update: Update, kind: str, media: Union[Audio, Voice]):
+    """Recognize a clip as a job that survives restarts"""
+    message = update.message
+    user_id = update.effective_user.id
+    record = job_record(update, kind, json.dumps(media.to_dict()))
+    submitted = await lifecycle.submit(record, lambda: recognize_clip(message, user_id, kind, media))
+    if submitted is False:
+        await message.reply_text(bot.get_message(user_id, 'restarting'))
+
+@track_handler
 async def handle_audio(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle audio messages with optimizations"""
-    user_id = update.effective_user.id
-    
+    await submit_clip(update, AUDIO, update.message.audio)
+
+@track_handler
+async def handle_voice(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle voice messages"""
+    await submit_clip(update, VOICE, update.message.voice)
+
+async def recognize_clip(message: Message, user_id: int, kind: str, media: Union[Audio, Voice]) -> bool:
+    """Recognize an audio file or voice note, returning whether a song was found"""
     # Send processing message
-    processing_msg = await update.message.reply_text(bot.get_message(user_id, 'processing'))
+    processing_msg = await message.reply_text(bot.get_message(user_id, 'processing'))
     
-    file_path = None
     try:
-        # Download audio file
-        audio_file = await update.message.audio.get_file()
-        file_path = f"{DOWNLOAD_PATH}/temp_audio_{user_id}.mp3"
-        await audio_file.download_to_drive(file_path)
+        # A clip that recently failed recognition fails again
+        negative_key = f'clip:{media.file_unique_id}'
+        if bot.negative_cache.get(negative_key):
+            await processing_msg.edit_text(bot.get_message(user_id, 'song_not_found'))
+            return False
+        
+        # Refused before downloading anything
+        if too_large(media):
+            await processing_msg.edit_text(bot.too_large_message(user_id, DOWNLOAD_LIMIT))
+            return False
         
         # Cleanup old files
         bot.cleanup_old_files()
         
-        # Recognize song
-        track = await bot.recognize_song(file_path)
+        # Download and recognize song, most voice notes are speech
+        async with bot.recognition_scheduler.slot(user_id, message.chat_id), \
+                downloaded_clip(media, '.ogg' if kind == VOICE else '.mp3') as clip:
+            track = await bot.recognize_song(clip, negative_key, screen=kind == VOICE)
         
         if track:
-            # Format song info
-            title = track.get('title', 'Unknown')
-            artist = track.get('subtitle', 'Unknown Artist')
-            album = track.get('sections', [{}])[0].get('metadata', [{}])[0].get('text', 'Unknown Album')
-            
-            info_text = f"🎵 **{title}**\n👤 **{artist}**\n💿 **{album}**\n\n✅ {bot.get_message(user_id, 'success')}"
+            info_text = track.caption(bot.get_message(user_id, 'success'))
             
             keyboard = [
                 [
@@ -444,134 +953,136 @@ async def handle_audio(update: Update, context: ContextTypes.DEFAULT_TYPE):
             reply_markup = InlineKeyboardMarkup(keyboard)
             
             await processing_msg.edit_text(info_text, reply_markup=reply_markup, parse_mode='Markdown')
-        else:
-            await processing_msg.edit_text(bot.get_message(user_id, 'song_not_found'))
+            return True
+        
+        await processing_msg.edit_text(bot.get_message(user_id, 'song_not_found'))
+        return False
     
+    except asyncio.CancelledError:
+        # Requeued at shutdown, resumed with a new status message
+        await processing_msg.edit_text(bot.get_message(user_id, 'restarting'))
+        raise
+    except QuotaExceeded as e:
+        await processing_msg.edit_text(bot.quota_message(user_id, e))
+    except FileTooLarge as e:
+        await processing_msg.edit_text(bot.too_large_message(user_id, e.limit))
     except Exception as e:
-        logger.error(f"Error handling audio: {e}")
+        logger.error(f"Error handling {kind}: {e}")
         await processing_msg.edit_text(bot.get_message(user_id, 'error'))
+    return False
+
+def build_audio_caption(user_id: int, track: Optional[Track]) -> Dict[str, Any]:
+    """Build reply_audio arguments for a link result in the user's language"""
+    if not track:
+        return {'caption': f"✅ {bot.get_message(user_id, 'success')}"}
+    
+    return {
+        'title': track.title,
+        'performer': track.artist,
+        'caption': track.caption(bot.get_message(user_id, 'success')),
+        'parse_mode': 'Markdown',
+    }
+
+@traced()
+async def process_link(message: Message, user_id: int, url: str, resolved: Tuple[str, str], progress: JobProgress) -> Optional[Dict[str, Any]]:
+    """Download, recognize and upload a link, returning the uploaded file_id and track"""
+    platform = resolved[0]
+    file_path = None
+    try:
+        # Download audio, in turn with other users' downloads
+        file_path = await bot.download_audio(url, user_id, message.chat_id, progress, resolved)
+        if not file_path or not os.path.exists(file_path):
+            return None
+        
+        # Try to recognize the song; without a match it is sent without
+        # title and artist
+        progress.set_stage('progress_recognizing')
+        track = await bot.recognize_download(file_path, resolved)
+        
+        # Send audio file
+        progress.set_stage('progress_uploading')
+        with upload_source(file_path) as audio_file, stage('upload', platform):
+            sent = await message.reply_audio(audio=audio_file, **build_audio_caption(user_id, track))
+        
+        return {'file_id': sent.audio.file_id, 'track': track}
     
     finally:
-        # Clean up
-        if file_path and os.path.exists(file_path):
-            try:
-                os.remove(file_path)
-            except Exception as e:
-                logger.error(f"Error removing temp file: {e}")
+        # Cached files are kept for the next request of the same media
+        bot.media_cache.release(file_path)
 
-async def handle_voice(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle voice messages"""
+@track_handler
+async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle text messages (URLs)"""
     user_id = update.effective_user.id
+    message = update.message
+    text = message.text
+    
+    # Check if it contains a supported URL
+    urls = update_urls(update)
+    if not urls:
+        if starts_with_url(text):
+            await message.reply_text(bot.get_message(user_id, 'invalid_link'))
+        return
     
+    # Recorded so the job survives restarts
+    record = job_record(update, LINK, text)
+    submitted = await lifecycle.submit(record, lambda: handle_links(message, user_id, urls))
+    if submitted is False:
+        await message.reply_text(bot.get_message(user_id, 'restarting'))
+
+async def handle_links(message: Message, user_id: int, urls: List[ParsedURL]) -> bool:
+    """Download and send the links of one message, returning whether anything was sent"""
+    # Several links or a playlist are handled as one batch
+    if len(urls) > 1 or urls[0].is_playlist:
+        return await batch_processor.run(message, user_id, urls) > 0
+    
+    url = urls[0].url
     # Send processing message
-    processing_msg = await update.message.reply_text(bot.get_message(user_id, 'processing'))
+    processing_msg = await message.reply_text(bot.get_message(user_id, 'processing'))
+    progress = bot.progress_reporter.job(bot.get_message)
+    progress.attach(processing_msg, user_id)
     
-    file_path = None
     try:
-        # Download voice file
-        voice_file = await update.message.voice.get_file()
-        file_path = f"{DOWNLOAD_PATH}/temp_voice_{user_id}.ogg"
-        await voice_file.download_to_drive(file_path)
+        # Requests for the same media share one download and upload,
+        # everyone but the first requester gets the uploaded file_id
+        # Resolved once here, the download and the fingerprint index reuse it
+        resolved = await bot.resolve_media_key(url)
+        result, uploaded = await bot.link_jobs.run(
+            resolved[1],
+            lambda: process_link(message, user_id, url, resolved, progress),
+            progress
+        )
+        progress.close()
         
-        # Recognize song
-        track = await bot.recognize_song(file_path)
+        if result:
+            if not uploaded:
+                await message.reply_audio(
+                    audio=result['file_id'],
+                    **build_audio_caption(user_id, result['track'])
+                )
+            await processing_msg.delete()
+            return True
         
-        if track:
-            # Format song info
-            title = track.get('title', 'Unknown')
-            artist = track.get('subtitle', 'Unknown Artist')
-            album = track.get('sections', [{}])[0].get('metadata', [{}])[0].get('text', 'Unknown Album')
-            
-            info_text = f"🎵 **{title}**\n👤 **{artist}**\n💿 **{album}**\n\n✅ {bot.get_message(user_id, 'success')}"
-            
-            keyboard = [
-                [
-                    InlineKeyboardButton(bot.get_button_text(user_id, 'edit_info'), callback_data='edit_info'),
-                    InlineKeyboardButton(bot.get_button_text(user_id, 'download_from_link'), callback_data='download_link'),
-                ]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
-            await processing_msg.edit_text(info_text, reply_markup=reply_markup, parse_mode='Markdown')
-        else:
-            await processing_msg.edit_text(bot.get_message(user_id, 'song_not_found'))
+        await processing_msg.edit_text(bot.get_message(user_id, 'download_error'))
+        return False
     
+    except asyncio.CancelledError:
+        # Requeued at shutdown, resumed with a new status message
+        progress.close()
+        await processing_msg.edit_text(bot.get_message(user_id, 'restarting'))
+        raise
+    except QuotaExceeded as e:
+        progress.close()
+        await processing_msg.edit_text(bot.quota_message(user_id, e))
+        return False
     except Exception as e:
-        logger.error(f"Error handling voice: {e}")
+        logger.error(f"Error handling URL: {e}")
+        progress.close()
         await processing_msg.edit_text(bot.get_message(user_id, 'error'))
-    
-    finally:
-        # Clean up
-        if file_path and os.path.exists(file_path):
-            try:
-                os.remove(file_path)
-            except Exception as e:
-                logger.error(f"Error removing temp file: {e}")
-
-async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle text messages (URLs)"""
-    user_id = update.effective_user.id
-    text = update.message.text
-    
-    # Check if it's a URL
-    if re.match(r'https?://', text):
-        platform = bot.detect_platform(text)
-        if platform:
-            # Send processing message
-            processing_msg = await update.message.reply_text(bot.get_message(user_id, 'processing'))
-            
-            file_path = None
-            try:
-                # Download audio
-                file_path = await bot.download_audio(text)
-                
-                if file_path and os.path.exists(file_path):
-                    # Try to recognize the song
-                    track = await bot.recognize_song(file_path)
-                    
-                    if track:
-                        title = track.get('title', 'Unknown')
-                        artist = track.get('subtitle', 'Unknown Artist')
-                        album = track.get('sections', [{}])[0].get('metadata', [{}])[0].get('text', 'Unknown Album')
-                        
-                        info_text = f"🎵 **{title}**\n👤 **{artist}**\n💿 **{album}**\n\n✅ {bot.get_message(user_id, 'success')}"
-                        
-                        # Send audio file
-                        with open(file_path, 'rb') as audio_file:
-                            await update.message.reply_audio(
-                                audio=audio_file,
-                                title=title,
-                                performer=artist,
-                                caption=info_text,
-                                parse_mode='Markdown'
-                            )
-                    else:
-                        # Just send the downloaded audio
-                        with open(file_path, 'rb') as audio_file:
-                            await update.message.reply_audio(
-                                audio=audio_file,
-                                caption=f"✅ {bot.get_message(user_id, 'success')}"
-                            )
-                    
-                    await processing_msg.delete()
-                else:
-                    await processing_msg.edit_text(bot.get_message(user_id, 'download_error'))
-            
-            except Exception as e:
-                logger.error(f"Error handling URL: {e}")
-                await processing_msg.edit_text(bot.get_message(user_id, 'error'))
-            
-            finally:
-                # Clean up
-                if file_path and os.path.exists(file_path):
-                    try:
-                        os.remove(file_path)
-                    except Exception as e:
-                        logger.error(f"Error removing downloaded file: {e}")
-        else:
-            await update.message.reply_text(bot.get_message(user_id, 'invalid_link'))
+        return False
 
 # Callback query handlers
+@track_handler
 async def handle_callback_query(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle inline keyboard callbacks"""
     query = update.callback_query
@@ -643,6 +1154,7 @@ async def handle_callback_query(update: Update, context: ContextTypes.DEFAULT_TY
         )
 
 # Inline query handler
+@track_handler
 async def inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle inline queries"""
     query = update.inline_query.query
@@ -653,28 +1165,22 @@ async def inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     try:
         # Search for songs
-        results = await bot.search_song(query, limit=10)
+        results = await bot.search_song(query, limit=INLINE_RESULTS)
         
         inline_results = []
-        for i, hit in enumerate(results[:10]):
-            track = hit.get('track', {})
-            if track:
-                title = track.get('title', 'Unknown')
-                artist = track.get('subtitle', 'Unknown Artist')
-                track_id = track.get('key', str(i))
-                
-                # Create inline result
-                result = InlineQueryResultArticle(
-                    id=track_id,
-                    title=f"{title} - {artist}",
-                    description=bot.format_song_info(track),
-                    input_message_content=InputTextMessageContent(
-                        message_text=bot.format_song_info(track),
-                        parse_mode='Markdown'
-                    ),
-                    thumb_url=track.get('images', {}).get('coverart', '')
-                )
-                inline_results.append(result)
+        for i, track in enumerate(results[:INLINE_RESULTS]):
+            # Create inline result
+            result = InlineQueryResultArticle(
+                id=track.key or str(i),
+                title=f"{track.title} - {track.artist}",
+                description=track.summary,
+                input_message_content=InputTextMessageContent(
+                    message_text=track.summary,
+                    parse_mode='Markdown'
+                ),
+                thumbnail_url=track.cover_url or None
+            )
+            inline_results.append(result)
         
         await update.inline_query.answer(inline_results, cache_time=60)
     
@@ -684,7 +1190,10 @@ async def inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE):
 # Error handler
 async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle errors with PythonAnywhere optimizations"""
-    logger.error(f"Update {update} caused error {context.error}")
+    # The full Update repeats message text and user data; its ID is enough
+    # to find the request in the traces
+    update_id = getattr(update, 'update_id', None)
+    logger.error("Update %s caused error: %s", update_id, context.error, exc_info=context.error)
     
     if PYTHONANYWHERE_OPTIMIZED:
         # Handle specific errors
@@ -695,6 +1204,136 @@ async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         elif "network" in str(context.error).lower():
             PythonAnywhereErrorHandler.handle_network_error()
 
+async def lane_full(update: object, lane: str):
+    """Tell the user an update was turned away because its lane is full"""
+    if isinstance(update, Update) and update.message and update.effective_user:
+        await update.message.reply_text(bot.get_message(update.effective_user.id, 'busy'))
+
+def stop_shared_jobs():
+    """At the drain deadline: shared downloads and uploads stop with their requests"""
+    bot.link_jobs.stop()
+    bot.download_jobs.stop()
+    if warmup:
+        warmup.stop()
+
+def stop_application(application: Application):
+    """Make run_polling() return once jobs are drained"""
+    if warmup:
+        warmup.stop()
+    admin.meter.stop()
+    for workers in (bot.worker_pool, bot.recognition_workers):
+        if workers:
+            workers.close()
+    if hasattr(application, 'stop_running'):
+        application.stop_running()
+    else:
+        # python-telegram-bot < 20.5: run_polling() stops with the loop
+        asyncio.get_running_loop().stop()
+
+async def resume_jobs(application: Application):
+    """Restart link and clip requests left queued or running by the previous run"""
+    records = lifecycle.pending()
+    if records:
+        logger.info(f"Resuming {len(records)} jobs")
+    
+    for record in records:
+        kind = record['kind']
+        # Enough of the original message to reply to it
+        message = Message(
+            message_id=record['message_id'],
+            date=datetime.fromtimestamp(record['received_at']),
+            chat=Chat(id=record['chat_id'], type=record['chat_type']),
+            text=record['text'] if kind == LINK else None,
+        )
+        message.set_bot(application.bot)
+        if kind == LINK:
+            job = functools.partial(handle_links, message, record['user_id'], extract_urls(record['text']))
+        else:
+            media = (Voice if kind == VOICE else Audio).de_json(json.loads(record['text']), application.bot)
+            job = functools.partial(recognize_clip, message, record['user_id'], kind, media)
+        asyncio.ensure_future(lifecycle.run(record, job))
+
+async def on_startup(application: Application):
+    """Install shutdown handling, resume saved jobs and load deferred modules"""
+    lifecycle.install_signal_handlers(lambda: stop_application(application), on_deadline=stop_shared_jobs)
+    await resume_jobs(application)
+    if bot.worker_pool:
+        # The worker processes import yt-dlp and shazamio themselves
+        asyncio.ensure_future(bot.worker_pool.start())
+        asyncio.ensure_future(bot.recognition_workers.start())
+    else:
+        asyncio.get_running_loop().run_in_executor(bot.pools[DOWNLOAD], preload_modules)
+    if warmup:
+        warmup.start(application.bot, WARMUP_DELAY)
+    admin.meter.start()
+
+async def on_shutdown(application: Application):
+    """Close connections opened for the bot's own requests"""
+    await close_http_client()
+
+def setup_admin(lanes: LaneUpdateProcessor, rate_limiter: PriorityRateLimiter):
+    """Give /stats its sections and /tune the limits it can change"""
+    admin.add_stats('Lanes', lanes.stats, ('running', 'waiting', 'concurrency'))
+    admin.add_stats('Schedulers', bot.scheduler_stats, ('running', 'queued', 'waiting_users', 'capacity', 'quota_rejected'))
+    admin.add_stats('Worker processes', bot.worker_stats, ('size', 'alive', 'idle', 'failures', 'restarts'))
+    admin.add_stats('Send queue', lambda: {'telegram': rate_limiter.stats()}, ('queued', 'sent', 'rate_limited'))
+    admin.add_stats('Jobs', lambda: {'links': lifecycle.stats()}, ('running', 'deferred', 'stored_queued'))
+    admin.add_stats('Caches', bot.cache_stats, ('hit_rate', 'entries', 'remembered'))
+    admin.add_stats('Platforms', bot.retry_policy.stats, ('error_rate', 'requests', 'retries', 'circuit'))
+    
+    for lane in (DOWNLOAD, RECOGNITION):
+        admin.add_tunable(
+            f'{lane}_workers',
+            functools.partial(bot.workers, lane),
+            functools.partial(bot.resize_workers, lane),
+            1,
+            f'Threads (or worker processes) for {lane} steps',
+        )
+    admin.add_tunable(
+        'recognition_concurrency',
+        lambda: bot.recognition_scheduler.capacity,
+        lambda value: bot.recognition_scheduler.configure(capacity=value),
+        1,
+        'Clip recognitions running at once',
+    )
+    for limit, minimum, description in (
+        ('per_user', 1, 'Downloads or recognitions running at once per user'),
+        ('per_chat', 1, '... and per chat'),
+        ('hourly_quota', 0, 'Downloads and recognitions per user per hour, 0 = no limit'),
+    ):
+        admin.add_tunable(
+            limit,
+            functools.partial(getattr, bot.download_scheduler, limit),
+            functools.partial(bot.configure_schedulers, limit),
+            minimum,
+            description,
+        )
+    for lane in LANES:
+        admin.add_tunable(
+            f'{lane}_lane',
+            functools.partial(lanes.concurrency.get, lane),
+            functools.partial(lanes.configure, lane),
+            1,
+            f'{lane.capitalize()} updates handled at once',
+        )
+        admin.add_tunable(
+            f'{lane}_lane_waiting',
+            functools.partial(lanes.max_waiting.get, lane),
+            lambda value, lane=lane: lanes.configure(lane, max_waiting=value),
+            0,
+            f'{lane.capitalize()} updates waiting before new ones are turned away',
+        )
+    admin.add_tunable(
+        'media_cache_mb',
+        lambda: bot.media_cache.max_bytes // (1024 * 1024),
+        lambda value: bot.media_cache.resize(value * 1024 * 1024),
+        1,
+        'Media cache size, least recently used files are evicted',
+    )
+    admin.add_tunable('search_cache_entries', lambda: bot.search_cache.max_entries, bot.search_cache.resize, 0, 'Cached searches')
+    admin.add_tunable('negative_cache_entries', lambda: bot.negative_cache.max_entries, bot.negative_cache.resize, 0, 'Remembered failures')
+    admin.add_tunable('uploaded_file_cache', lambda: bot.link_jobs.result_cache_size, bot.link_jobs.resize, 0, 'Remembered Telegram file_ids')
+
 # Main function with PythonAnywhere optimizations
 def main():
     """Start the bot with optimizations"""
@@ -705,13 +1344,58 @@ def main():
     logger.info(f"Initial health check: {health}")
     
     try:
-        # Create application with optimizations
-        application = Application.builder().token(BOT_TOKEN).build()
+        # Create application with optimizations, every Bot API call goes
+        # through the rate limiter so bursts don't end in 429 errors
+        rate_limiter = PriorityRateLimiter(
+            global_rate=SEND_GLOBAL_RATE,
+            private_chat_rate=SEND_PRIVATE_CHAT_RATE,
+            group_chat_rate_per_minute=SEND_GROUP_CHAT_RATE,
+            max_retries=SEND_MAX_RETRIES,
+        )
+        lanes = LaneUpdateProcessor(LANE_CONCURRENCY, LANE_MAX_WAITING, on_full=lane_full)
+        builder = (
+            Application.builder()
+            .token(BOT_TOKEN)
+            .rate_limiter(rate_limiter)
+            .post_init(on_startup)
+            .post_shutdown(on_shutdown)
+            # Long jobs don't hold up other users' updates; each lane has
+            # its own limits and the schedulers decide whose download or
+            # recognition runs next
+            .concurrent_updates(lanes)
+        )
+        if LOCAL_BOT_API_URL:
+            # Self-hosted Bot API server, see telegram_files for --local mode
+            builder.base_url(LOCAL_BOT_API_URL).local_mode(LOCAL_BOT_API_LOCAL_MODE)
+            if LOCAL_BOT_API_FILE_URL:
+                builder.base_file_url(LOCAL_BOT_API_FILE_URL)
+            logger.info(f"Using Bot API server at {LOCAL_BOT_API_URL}")
+        application = builder.build()
+        
+        # Expose cache, retry and send queue statistics next to the stage metrics
+        REGISTRY.register(StatsCollector('musicbot_cache', 'cache', bot.cache_stats))
+        REGISTRY.register(StatsCollector('musicbot_platform', 'platform', bot.retry_policy.stats))
+        REGISTRY.register(StatsCollector('musicbot_send_queue', 'queue', lambda: {'telegram': rate_limiter.stats()}))
+        REGISTRY.register(StatsCollector('musicbot_jobs', 'component', lambda: {
+            'lifecycle': lifecycle.stats(),
+            **({'warmup': warmup.stats()} if warmup else {}),
+        }))
+        REGISTRY.register(StatsCollector('musicbot_scheduler', 'scheduler', bot.scheduler_stats))
+        REGISTRY.register(StatsCollector('musicbot_lane', 'lane', lanes.stats))
+        if bot.worker_pool:
+            REGISTRY.register(StatsCollector('musicbot_workers', 'pool', bot.worker_stats))
+        setup_admin(lanes, rate_limiter)
+        if METRICS_PORT:
+            start_metrics_server(METRICS_HOST, METRICS_PORT)
         
         # Add command handlers
         application.add_handler(CommandHandler("start", start_command))
         application.add_handler(CommandHandler("help", help_command))
         application.add_handler(CommandHandler("language", language_command))
+        # Not in the command menu, other users' /stats and /tune are ignored
+        admin_only = filters.User(user_id=ADMIN_USER_ID)
+        application.add_handler(CommandHandler("stats", stats_command, filters=admin_only))
+        application.add_handler(CommandHandler("tune", tune_command, filters=admin_only))
         
         # Add message handlers
         application.add_handler(MessageHandler(filters.AUDIO, handle_audio))
@@ -738,7 +1422,10 @@ def main():
         logger.info("✅ Bot started successfully")
         
         # Start the bot
-        application.run_polling(drop_pending_updates=True)
+        # Signals are handled by the lifecycle, which drains jobs first.
+        # Updates sent while the bot was down are still processed; the job
+        # store skips the ones it has already seen
+        application.run_polling(drop_pending_updates=False, stop_signals=None)
         
     except Exception as e:
         logger.error(f"Failed to start bot: {e}")
@@ -0,0 +1,314 @@
+"""
+Content-addressed media cache
+Downloaded audio is stored once per content hash and looked up by its
+canonical (platform, media_id) pair, so the same track reached through
+different URLs is only fetched and transcoded once.
+"""
+
+import hashlib
+import logging
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# yt-dlp's partial download files, kept across restarts for this long
+PARTIAL_SUFFIXES = ('.part', '.ytdl')
+PARTIAL_MAX_AGE = 24 * 3600
+
+
+def media_key(platform: str, media_id: str) -> str:
+    """Build the cache key for a canonical (platform, media_id) pair"""
+    return hashlib.sha1(f"{platform}:{media_id}".encode('utf-8')).hexdigest()
+
+
+def file_digest(path: Path) -> str:
+    """Hash file contents in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class MediaCache:
+    """Size-bounded LRU cache of media files
+
+    Layout under ``root``:
+        blobs/ab/<sha256>.<ext>  - one file per unique content
+        keys/<media_key>.<ext>   - hardlink to the blob for a media key
+        tmp/                     - staging area for in-progress downloads
+
+    The index is rebuilt from inode numbers, so a filesystem without
+    hardlinks turns the cache off. Keys pinned by pin() are not evicted.
+    """
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = Path(root)
+        self.blobs_dir = self.root / 'blobs'
+        self.keys_dir = self.root / 'keys'
+        self.tmp_dir = self.root / 'tmp'
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        # media key -> (link path, blob path), least recently used first
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        # blob path -> size in bytes
+        self._blob_sizes: Dict[Path, int] = {}
+        # media key -> files of that key still in use
+        self._pins: Dict[str, int] = {}
+
+        for directory in (self.blobs_dir, self.keys_dir, self.tmp_dir):
+            directory.mkdir(parents=True, exist_ok=True)
+
+        self.enabled = self._hardlinks_work()
+        if self.enabled:
+            self._load()
+
+    def _hardlinks_work(self) -> bool:
+        """Whether blobs and keys can share inodes"""
+        probe = self.tmp_dir / 'hardlink-probe'
+        link = self.keys_dir / 'hardlink-probe'
+        try:
+            probe.touch()
+            os.link(probe, link)
+            return True
+        except OSError as e:
+            logger.warning(f"Media cache turned off, {self.root} has no hardlinks: {e}")
+            return False
+        finally:
+            for path in (probe, link):
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+
+    def _load(self):
+        """Rebuild the index from disk"""
+        blobs_by_inode = {}
+        for blob in self.blobs_dir.glob('*/*'):
+            stat = blob.stat()
+            blobs_by_inode[(stat.st_dev, stat.st_ino)] = blob
+            self._blob_sizes[blob] = stat.st_size
+            self.total_bytes += stat.st_size
+
+        links = []
+        for link in self.keys_dir.iterdir():
+            stat = link.stat()
+            blob = blobs_by_inode.get((stat.st_dev, stat.st_ino))
+            if blob is None:
+                link.unlink()
+                continue
+            links.append((stat.st_mtime, link.stem, link, blob))
+
+        for _, key, link, blob in sorted(links):
+            self._entries[key] = (link, blob)
+
+        # Drop blobs no key points at any more
+        for blob in list(self._blob_sizes):
+            if blob.stat().st_nlink <= 1:
+                self._remove_blob(blob)
+
+        # Leftovers from downloads interrupted by a restart; recent partial
+        # downloads stay so yt-dlp continues them when the job resumes
+        now = time.time()
+        for leftover in self.tmp_dir.iterdir():
+            if not leftover.is_file():
+                continue
+            resumable = leftover.suffix in PARTIAL_SUFFIXES
+            if not resumable or now - leftover.stat().st_mtime > PARTIAL_MAX_AGE:
+                leftover.unlink()
+
+        logger.info(
+            f"Media cache loaded: {len(self._entries)} entries, "
+            f"{self.total_bytes // (1024 * 1024)}MB"
+        )
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached file for a media key, if any"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            link, _ = entry
+            if not link.exists():
+                self._entries.pop(key)
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._entries.move_to_end(key)
+            now = time.time()
+            os.utime(link, (now, now))
+            return str(link)
+
+    def put(self, key: str, file_path: str) -> str:
+        """Move a downloaded file into the cache and return its cached path
+
+        If the content is already stored under another key, the new file is
+        dropped and the key is hardlinked to the existing blob. On failure, or
+        with the cache turned off, a path outside the cache is returned so the
+        caller can still use the file.
+        """
+        if not self.enabled:
+            return file_path
+        src = Path(file_path)
+        try:
+            digest = file_digest(src)
+            blob = self.blobs_dir / digest[:2] / f"{digest}{src.suffix}"
+            link = self.keys_dir / f"{key}{src.suffix}"
+
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry[1] == blob and entry[0].exists():
+                    # The same content under the same key again
+                    src.unlink()
+                    self._entries.move_to_end(key)
+                    return str(entry[0])
+
+                # Drop the key's old link first: if it was the only link to
+                # its blob the blob goes too, and must not be reused below
+                self._unlink_key(key)
+                if blob in self._blob_sizes:
+                    src.unlink()
+                    logger.info("Deduplicated %s against existing blob %s", key, digest[:12])
+                else:
+                    blob.parent.mkdir(exist_ok=True)
+                    shutil.move(str(src), str(blob))
+                    size = blob.stat().st_size
+                    self._blob_sizes[blob] = size
+                    self.total_bytes += size
+
+                try:
+                    os.link(blob, link)
+                except OSError as e:
+                    # A copy would be dropped by _load() and not counted in
+                    # total_bytes; hand the file back instead
+                    logger.error(f"Media cache turned off, could not link {key}: {e}")
+                    self.enabled = False
+                    shutil.copy2(blob, src)
+                    if blob.stat().st_nlink <= 1:
+                        self._remove_blob(blob)
+                    return str(src)
+
+                self._entries[key] = (link, blob)
+                self._evict()
+
+            return str(link)
+
+        except Exception as e:
+            logger.error(f"Error adding {file_path} to media cache: {e}")
+            return file_path
+
+    def resize(self, max_bytes: int):
+        """Change the size budget, evicting files beyond a lowered one"""
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def __contains__(self, key: str) -> bool:
+        """Whether a media key is cached, without counting a lookup"""
+        with self._lock:
+            return key in self._entries
+
+    def contains(self, file_path: str) -> bool:
+        """Check whether a path is a cached file (staging files are not)"""
+        try:
+            path = str(Path(file_path).resolve())
+            return any(
+                os.path.commonpath([directory, path]) == directory
+                for directory in (str(self.keys_dir.resolve()), str(self.blobs_dir.resolve()))
+            )
+        except (OSError, ValueError):
+            return False
+
+    def pin(self, key: str):
+        """Keep a key's file from eviction until unpin()"""
+        with self._lock:
+            self._pins[key] = self._pins.get(key, 0) + 1
+
+    def unpin(self, key: str):
+        with self._lock:
+            count = self._pins.get(key, 0) - 1
+            if count > 0:
+                self._pins[key] = count
+            else:
+                self._pins.pop(key, None)
+
+    def release(self, file_path: Optional[str]):
+        """Done with a file: unpin it if cached, else remove it"""
+        if not file_path:
+            return
+        if self.contains(file_path):
+            self.unpin(Path(file_path).stem)
+            return
+        if not os.path.exists(file_path):
+            return
+        try:
+            os.remove(file_path)
+        except Exception as e:
+            logger.error(f"Error removing downloaded file: {e}")
+
+    def _unlink_key(self, key: str):
+        """Remove a key and its blob if nothing else references it"""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+
+        link, blob = entry
+        try:
+            link.unlink()
+        except FileNotFoundError:
+            pass
+
+        if blob in self._blob_sizes and blob.stat().st_nlink <= 1:
+            self._remove_blob(blob)
+
+    def _remove_blob(self, blob: Path):
+        """Delete a blob and update the size accounting"""
+        self.total_bytes -= self._blob_sizes.pop(blob, 0)
+        try:
+            blob.unlink()
+        except FileNotFoundError:
+            pass
+
+    def _evict(self):
+        """Evict least recently used keys until the cache fits its budget"""
+        # Always keep the newest entry, even if it alone exceeds the budget,
+        # and files in use
+        evictable = [key for key in list(self._entries)[:-1] if key not in self._pins]
+        for key in evictable:
+            if self.total_bytes <= self.max_bytes:
+                break
+            self._unlink_key(key)
+            logger.info("Evicted %s from media cache", key)
+
+    def stats(self) -> Dict[str, int]:
+        """Return cache size and hit rate statistics"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': int(self.enabled),
+                'entries': len(self._entries),
+                'pinned': len(self._pins),
+                'blobs': len(self._blob_sizes),
+                'bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            }
@@ -0,0 +1,319 @@
+"""
+Metrics in the Prometheus text format
+Counters and latency histograms for each pipeline stage and handler, plus
+collectors that expose the bot's cache, retry and send-queue statistics.
+Served from a small local HTTP server or from the WSGI app on PythonAnywhere.
+"""
+
+import functools
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from wsgiref.simple_server import WSGIRequestHandler, make_server
+
+from src.tracing import span, start_trace
+
+logger = logging.getLogger(__name__)
+
+# Seconds; downloads and uploads of long tracks take minutes
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value: str) -> str:
+    """Escape a label value"""
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    """Render {name="value",...}"""
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric(ABC):
+    """Base class for labelled metrics"""
+
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        return lines + self._samples()
+
+    @abstractmethod
+    def _samples(self) -> List[str]:
+        """Sample lines, rendered after the HELP and TYPE lines"""
+
+
+class Counter(Metric):
+    """Monotonically increasing count"""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def total(self, **labels) -> float:
+        """Sum over every label combination that matches the given labels"""
+        wanted = [(i, str(labels[name])) for i, name in enumerate(self.labelnames) if name in labels]
+        with self._lock:
+            return sum(
+                value for key, value in self._values.items()
+                if all(key[i] == label for i, label in wanted)
+            )
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [
+            f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}'
+            for key, value in items
+        ]
+
+
+class Histogram(Metric):
+    """Bucketed distribution of observed values"""
+
+    kind = 'histogram'
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        # label values -> [per-bucket counts, sum, count]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of a with-block"""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - start, **labels)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, [list(entry[0]), entry[1], entry[2]]) for key, entry in self._values.items())
+
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}')
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+class StatsCollector:
+    """Exposes a component's stats() dict as gauges at scrape time
+
+    ``func`` returns ``{label value: {field: number}}``; every numeric field
+    becomes the gauge ``<prefix>_<field>`` labelled with ``label``.
+    """
+
+    def __init__(self, prefix: str, label: str, func: Callable[[], Dict[str, Dict[str, Any]]]):
+        self.prefix = prefix
+        self.label = label
+        self.func = func
+
+    def render(self) -> List[str]:
+        try:
+            stats = self.func()
+        except Exception as e:
+            logger.error(f"Error collecting {self.prefix} metrics: {e}")
+            return []
+
+        samples: Dict[str, List[str]] = {}
+        for label_value, fields in sorted(stats.items()):
+            for field, value in fields.items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                name = f'{self.prefix}_{field}'
+                labels = _format_labels((self.label,), (label_value,))
+                samples.setdefault(name, []).append(f'{name}{labels} {_format_value(value)}')
+
+        lines = []
+        for name, values in samples.items():
+            lines.append(f'# TYPE {name} gauge')
+            lines.extend(values)
+        return lines
+
+
+class Registry:
+    """Collection of metrics rendered together"""
+
+    def __init__(self):
+        self._collectors: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def register(self, collector):
+        """Add a metric or collector, replacing one with the same name"""
+        name = getattr(collector, 'name', None) or getattr(collector, 'prefix')
+        with self._lock:
+            self._collectors[name] = collector
+        return collector
+
+    def render(self) -> str:
+        with self._lock:
+            collectors = list(self._collectors.values())
+        lines: List[str] = []
+        for collector in collectors:
+            lines.extend(collector.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+# Pipeline stages: telegram_download, clip_decode, clip_screen,
+# fingerprint_match, fingerprint_index, shazam_recognize, shazam_search,
+# ytdlp_extract, ffmpeg_transcode, upload
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    'musicbot_stage_seconds', 'Duration of pipeline stages', ('stage', 'platform')
+))
+STAGE_ERRORS = REGISTRY.register(Counter(
+    'musicbot_stage_errors_total', 'Failed pipeline stages', ('stage', 'platform')
+))
+HANDLER_SECONDS = REGISTRY.register(Histogram(
+    'musicbot_handler_seconds', 'Duration of update handlers', ('handler',)
+))
+HANDLER_REQUESTS = REGISTRY.register(Counter(
+    'musicbot_handler_requests_total', 'Handled updates by outcome', ('handler', 'outcome')
+))
+DOWNLOADS = REGISTRY.register(Counter(
+    'musicbot_downloads_total', 'Link downloads by platform and outcome', ('platform', 'outcome')
+))
+CLIP_SCREENING = REGISTRY.register(Counter(
+    'musicbot_clip_screening_total', 'Screened clips by verdict (music, speech, noise, silent)', ('verdict',)
+))
+LANE_WAIT = REGISTRY.register(Histogram(
+    'musicbot_lane_wait_seconds', 'Time updates waited for their lane (interactive, recognition, download)', ('lane',)
+))
+LANE_UPDATES = REGISTRY.register(Counter(
+    'musicbot_lane_updates_total', 'Updates by lane and outcome (handled, full)', ('lane', 'outcome')
+))
+SCHEDULER_WAIT = REGISTRY.register(Histogram(
+    'musicbot_scheduler_wait_seconds', 'Time requests waited for a download or recognition slot', ('scheduler',)
+))
+
+
+@contextmanager
+def stage(name: str, platform: str = ''):
+    """Time a pipeline stage, as a metric and as a span of the current trace"""
+    start = time.monotonic()
+    try:
+        with span(name, platform=platform):
+            yield
+    except BaseException:
+        STAGE_ERRORS.inc(stage=name, platform=platform)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.monotonic() - start, stage=name, platform=platform)
+
+
+def track_handler(func):
+    """Count and time an async update handler, tracing it as one request"""
+    name = func.__name__
+
+    @functools.wraps(func)
+    async def wrapper(update, *args, **kwargs):
+        start = time.monotonic()
+        outcome = 'ok'
+        user = getattr(update, 'effective_user', None)
+        try:
+            with start_trace(name, update_id=getattr(update, 'update_id', None), user_id=getattr(user, 'id', None)):
+                return await func(update, *args, **kwargs)
+        except BaseException:
+            outcome = 'error'
+            raise
+        finally:
+            HANDLER_SECONDS.observe(time.monotonic() - start, handler=name)
+            HANDLER_REQUESTS.inc(handler=name, outcome=outcome)
+
+    return wrapper
+
+
+def metrics_app(environ, start_response) -> Iterable[bytes]:
+    """WSGI app serving /metrics"""
+    if environ.get('PATH_INFO', '/') != '/metrics':
+        start_response('404 Not Found', [('Content-Type', 'text/plain')])
+        return [b'Not Found']
+
+    body = REGISTRY.render().encode('utf-8')
+    start_response('200 OK', [('Content-Type', CONTENT_TYPE), ('Content-Length', str(len(body)))])
+    return [body]
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    """Keep scrapes out of stderr"""
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(host: str, port: int) -> Optional[threading.Thread]:
+    """Serve /metrics from a daemon thread"""
+    try:
+        server = make_server(host, port, metrics_app, handler_class=QuietRequestHandler)
+    except OSError as e:
+        logger.error(f"Could not start metrics server on {host}:{port}: {e}")
+        return None
+
+    thread = threading.Thread(target=server.serve_forever, name='metrics', daemon=True)
+    thread.start()
+    logger.info(f"Metrics available at http://{host}:{port}/metrics")
+    return thread
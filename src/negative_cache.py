@@ -0,0 +1,64 @@
+"""
+Negative cache for known failures
+Remembers clips Shazam could not recognize and links that failed with a
+permanent error for a short time, so retries of the same input are
+answered immediately instead of repeating the upstream call.
+"""
+
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+
+class NegativeCache:
+    """Size-bounded cache of recent failures with a fixed TTL"""
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # key -> (expires_at, reason), oldest first
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the failure reason if the key failed recently"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, reason = entry
+            if expires_at > time.monotonic():
+                self.hits += 1
+                return reason
+            del self._entries[key]
+
+        self.misses += 1
+        return None
+
+    def add(self, key: str, reason: str):
+        """Remember a failure"""
+        self._entries.pop(key, None)
+        self._entries[key] = (time.monotonic() + self.ttl, reason)
+
+        # Entries share one TTL, so the oldest entry also expires first
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def resize(self, max_entries: int):
+        """Change the size bound, dropping the oldest entries"""
+        self.max_entries = max_entries
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def discard(self, key: str):
+        """Forget a failure, e.g. after the input succeeded elsewhere"""
+        self._entries.pop(key, None)
+
+    def stats(self) -> Dict[str, float]:
+        """Return size and hit rate"""
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+        }
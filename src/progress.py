@@ -0,0 +1,170 @@
+"""
+Throttled progress reporting
+Status messages are edited at most once per interval per chat; updates
+arriving in between are coalesced so only the latest text is sent.
+"""
+
+import asyncio
+import functools
+import logging
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from telegram import Message
+from telegram.error import RetryAfter, TelegramError
+
+from src.send_queue import retry_after_seconds
+
+logger = logging.getLogger(__name__)
+
+# yt-dlp calls its progress hook for every chunk; forward at most this often
+HOOK_INTERVAL = 1.0
+
+
+class ProgressReporter:
+    """Coalesces status message edits and rate-limits them per chat"""
+
+    def __init__(self, min_interval: float):
+        self.min_interval = min_interval
+        # chat_id -> message_id -> (message, latest text), oldest first
+        self._pending: Dict[int, Dict[int, Tuple[Message, str]]] = {}
+        # Text last sent to each status message, from its first update until
+        # forget(); None before the first edit
+        self._last_text: Dict[Tuple[int, int], Optional[str]] = {}
+        self._next_edit: Dict[int, float] = {}
+        self._scheduled = set()
+
+    def update(self, message: Message, text: str):
+        """Queue the latest text for a status message"""
+        chat_id = message.chat_id
+        key = (chat_id, message.message_id)
+        if key in self._last_text and self._last_text[key] == text:
+            return
+
+        self._last_text[key] = self._last_text.get(key)
+        self._pending.setdefault(chat_id, {})[message.message_id] = (message, text)
+        self._schedule(chat_id)
+
+    def forget(self, message: Message):
+        """Drop pending edits for a message that is being replaced or deleted"""
+        chat_id = message.chat_id
+        self._pending.get(chat_id, {}).pop(message.message_id, None)
+        self._last_text.pop((chat_id, message.message_id), None)
+
+    def _schedule(self, chat_id: int):
+        """Schedule the next edit for a chat once its interval has passed"""
+        if chat_id in self._scheduled:
+            return
+        self._scheduled.add(chat_id)
+        delay = max(0.0, self._next_edit.get(chat_id, 0.0) - time.monotonic())
+        loop = asyncio.get_running_loop()
+        loop.call_later(delay, lambda: asyncio.ensure_future(self._flush(chat_id)))
+
+    async def _flush(self, chat_id: int):
+        """Send one pending edit for a chat"""
+        interval = self.min_interval
+        try:
+            pending = self._pending.get(chat_id)
+            if not pending:
+                return
+
+            message_id = next(iter(pending))
+            message, text = pending.pop(message_id)
+            try:
+                await message.edit_text(text)
+                # Unless the message was forgotten during the edit
+                if (chat_id, message_id) in self._last_text:
+                    self._last_text[(chat_id, message_id)] = text
+            except RetryAfter as e:
+                # Back off for as long as Telegram asks and retry the same text
+                interval = max(interval, retry_after_seconds(e))
+                pending.setdefault(message_id, (message, text))
+            except TelegramError as e:
+                logger.warning(f"Error updating status message: {e}")
+
+        finally:
+            self._next_edit[chat_id] = time.monotonic() + interval
+            self._scheduled.discard(chat_id)
+            if self._pending.get(chat_id):
+                self._schedule(chat_id)
+            else:
+                self._pending.pop(chat_id, None)
+
+    def job(self, get_message: Callable[[int, str], str]) -> 'JobProgress':
+        """Create progress tracking for a new job"""
+        return JobProgress(self, get_message)
+
+
+class JobProgress:
+    """Progress of one job, mirrored to every status message attached to it"""
+
+    def __init__(self, reporter: ProgressReporter, get_message: Callable[[int, str], str]):
+        self.reporter = reporter
+        self.get_message = get_message
+        self.subscribers: List[Tuple[Message, int]] = []
+        self.stage = 'processing'
+        self.params: Dict[str, str] = {}
+        self._loop = asyncio.get_running_loop()
+        self._last_hook = 0.0
+
+    def attach(self, message: Message, user_id: int):
+        """Mirror this job's progress to another status message"""
+        self.subscribers.append((message, user_id))
+        if self.stage != 'processing':
+            self.reporter.update(message, self._render(user_id))
+
+    def merge(self, other: Optional['JobProgress']):
+        """Mirror progress to the status messages of a duplicate job"""
+        if other is None or other is self:
+            return
+        for message, user_id in other.subscribers:
+            self.attach(message, user_id)
+
+    def detach(self, other: Optional['JobProgress']):
+        """Stop mirroring to the status messages of a duplicate job"""
+        if other is None or other is self:
+            return
+        self.subscribers = [s for s in self.subscribers if s not in other.subscribers]
+
+    def set_stage(self, stage: str, **params):
+        """Move to a new stage and update every status message"""
+        self.stage = stage
+        self.params = params
+        for message, user_id in self.subscribers:
+            self.reporter.update(message, self._render(user_id))
+
+    def close(self):
+        """Stop updating the status messages"""
+        for message, _ in self.subscribers:
+            self.reporter.forget(message)
+
+    def _render(self, user_id: int) -> str:
+        """Format the current stage in the user's language"""
+        return self.get_message(user_id, self.stage).format(**self.params)
+
+    def _set_stage_threadsafe(self, stage: str, **params):
+        """Forward a stage change from a download pool thread"""
+        self._loop.call_soon_threadsafe(functools.partial(self.set_stage, stage, **params))
+
+    def ytdlp_hook(self, status: Dict):
+        """yt-dlp progress hook (runs in the download thread)"""
+        if status.get('status') == 'finished':
+            self._set_stage_threadsafe('progress_converting')
+            return
+        if status.get('status') != 'downloading':
+            return
+
+        now = time.monotonic()
+        if now - self._last_hook < HOOK_INTERVAL:
+            return
+        self._last_hook = now
+
+        total = status.get('total_bytes') or status.get('total_bytes_estimate')
+        downloaded = status.get('downloaded_bytes') or 0
+        percent = int(downloaded * 100 / total) if total else 0
+        self._set_stage_threadsafe('progress_downloading', percent=min(percent, 100))
+
+    def postprocessor_hook(self, status: Dict):
+        """yt-dlp postprocessor hook, reports the FFmpeg conversion stage"""
+        if status.get('status') == 'started':
+            self._set_stage_threadsafe('progress_converting')
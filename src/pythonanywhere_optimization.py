@@ -16,16 +16,15 @@ PYTHONANYWHERE_USERNAME = "your_username"  # Replace with your actual username
 # Set up logging for PythonAnywhere
 def setup_pythonanywhere_logging():
     """Setup logging optimized for PythonAnywhere"""
+    from config.config import LOG_BACKUP_COUNT, LOG_LEVEL, LOG_MAX_BYTES, LOG_ROTATE_WHEN, LOG_TO_CONSOLE
+    from src.logging_setup import setup_logging
+    
     log_dir = Path("/home") / PYTHONANYWHERE_USERNAME / "logs"
-    log_dir.mkdir(exist_ok=True)
-    
-    logging.basicConfig(
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        level=logging.INFO,
-        handlers=[
-            logging.FileHandler(log_dir / "telegram_music_bot.log"),
-            logging.StreamHandler(sys.stdout)
-        ]
+    
+    # Rotated so logs stay within the disk quota
+    setup_logging(
+        str(log_dir), LOG_LEVEL, LOG_MAX_BYTES, LOG_BACKUP_COUNT, LOG_ROTATE_WHEN,
+        filename="telegram_music_bot.log", console=LOG_TO_CONSOLE
     )
     
     return logging.getLogger(__name__)
@@ -0,0 +1,294 @@
+"""
+Retry policy for platform downloads
+Classifies yt-dlp and network errors as transient or permanent, retries
+transient ones with jittered backoff within a per-platform retry budget,
+and opens a circuit breaker while a platform keeps failing.
+"""
+
+import asyncio
+import logging
+import random
+import socket
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+TRANSIENT = 'transient'
+PERMANENT = 'permanent'
+
+# Lower-cased message fragments, checked in order
+PERMANENT_MESSAGES = (
+    'private video',
+    'video unavailable',
+    'this video is not available',
+    'has been removed',
+    'account has been terminated',
+    'not available in your country',
+    'geo restriction',
+    'sign in to confirm your age',
+    'members-only',
+    'unsupported url',
+    'no video formats found',
+    'requested format is not available',
+    'http error 404',
+    'http error 410',
+)
+TRANSIENT_MESSAGES = (
+    'http error 429',
+    'too many requests',
+    'rate-limit',
+    'timed out',
+    'timeout',
+    'connection reset',
+    'connection refused',
+    'temporary failure in name resolution',
+    'remote end closed connection',
+    'http error 5',
+    'incomplete read',
+)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a platform whose circuit breaker is open"""
+
+
+class ClassifiedError(Exception):
+    """An error classified where it was raised, e.g. in a worker process
+
+    Holds only strings, so it can be sent back to the bot process.
+    """
+
+    def __init__(self, message: str, kind: str, stage: str = ''):
+        super().__init__(message)
+        self.kind = kind
+        self.stage = stage
+
+    def __reduce__(self):
+        return type(self), (str(self), self.kind, self.stage)
+
+
+def classify_error(error: BaseException) -> str:
+    """Decide whether retrying an error can help"""
+    if isinstance(error, ClassifiedError):
+        return error.kind
+
+    # Imported here so loading this module doesn't load yt-dlp
+    from yt_dlp.utils import DownloadError, ExtractorError, GeoRestrictedError, UnsupportedError
+
+    # DownloadError wraps the extractor's exception
+    if isinstance(error, DownloadError) and error.exc_info and error.exc_info[1] is not None:
+        cause = error.exc_info[1]
+        if cause is not error:
+            return classify_error(cause)
+
+    if isinstance(error, (GeoRestrictedError, UnsupportedError)):
+        return PERMANENT
+    if isinstance(error, (asyncio.TimeoutError, socket.timeout, ConnectionError)):
+        return TRANSIENT
+    # A worker process hit its memory limit, the same media will again
+    if isinstance(error, MemoryError):
+        return PERMANENT
+
+    message = str(error).lower()
+    for fragment in TRANSIENT_MESSAGES:
+        if fragment in message:
+            return TRANSIENT
+    for fragment in PERMANENT_MESSAGES:
+        if fragment in message:
+            return PERMANENT
+
+    # Extractors mark errors they anticipated (e.g. removed media) as expected
+    if isinstance(error, ExtractorError) and error.expected:
+        return PERMANENT
+    return TRANSIENT
+
+
+class PlatformState:
+    """Retry budget, circuit breaker and counters for one platform"""
+
+    def __init__(self, window: float, budget_ratio: float, budget_max: float):
+        self.window = window
+        self.budget_ratio = budget_ratio
+        self.budget_max = budget_max
+        self.budget = budget_max
+
+        # (timestamp, failed) for every attempt within the window
+        self.outcomes: deque = deque()
+        self.opened_at = 0.0
+        self.half_open_trial = False
+
+        self.counters = {
+            'requests': 0,
+            'attempts': 0,
+            'successes': 0,
+            'transient_errors': 0,
+            'permanent_errors': 0,
+            'retries': 0,
+            'budget_exhausted': 0,
+            'circuit_rejections': 0,
+        }
+
+    def record(self, failed: bool):
+        """Record an attempt outcome for the error rate"""
+        now = time.monotonic()
+        self.outcomes.append((now, failed))
+        while self.outcomes and now - self.outcomes[0][0] > self.window:
+            self.outcomes.popleft()
+
+    def error_rate(self) -> float:
+        """Share of failed attempts within the window"""
+        now = time.monotonic()
+        while self.outcomes and now - self.outcomes[0][0] > self.window:
+            self.outcomes.popleft()
+        if not self.outcomes:
+            return 0.0
+        return sum(1 for _, failed in self.outcomes if failed) / len(self.outcomes)
+
+    def deposit(self):
+        """Every new request earns a fraction of a retry"""
+        self.budget = min(self.budget_max, self.budget + self.budget_ratio)
+
+    def withdraw(self) -> bool:
+        """Spend one retry from the budget if available"""
+        if self.budget >= 1:
+            self.budget -= 1
+            return True
+        return False
+
+
+class RetryPolicy:
+    """Runs download attempts under per-platform retry and breaker rules"""
+
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        base_delay: float = 1.0,
+        max_delay: float = 30.0,
+        budget_ratio: float = 0.2,
+        budget_max: float = 10,
+        breaker_threshold: float = 0.5,
+        breaker_min_requests: int = 5,
+        breaker_window: float = 60,
+        breaker_cooldown: float = 30,
+    ):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget_ratio = budget_ratio
+        self.budget_max = budget_max
+        self.breaker_threshold = breaker_threshold
+        self.breaker_min_requests = breaker_min_requests
+        self.breaker_window = breaker_window
+        self.breaker_cooldown = breaker_cooldown
+        self.platforms: Dict[str, PlatformState] = {}
+
+    def _state(self, platform: str) -> PlatformState:
+        """Get or create the state for a platform"""
+        if platform not in self.platforms:
+            self.platforms[platform] = PlatformState(self.breaker_window, self.budget_ratio, self.budget_max)
+        return self.platforms[platform]
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def circuit_state(self, platform: str) -> str:
+        """Return closed, open or half_open for a platform"""
+        state = self._state(platform)
+        if not state.opened_at:
+            return 'closed'
+        if time.monotonic() - state.opened_at < self.breaker_cooldown:
+            return 'open'
+        return 'half_open'
+
+    def _allow(self, state: PlatformState, platform: str) -> bool:
+        """Check the breaker before an attempt"""
+        circuit = self.circuit_state(platform)
+        if circuit == 'closed':
+            return True
+        if circuit == 'half_open' and not state.half_open_trial:
+            # Let a single trial request through after the cooldown
+            state.half_open_trial = True
+            return True
+        return False
+
+    def _on_result(self, state: PlatformState, platform: str, failed: bool):
+        """Update the breaker after an attempt"""
+        state.record(failed)
+        if state.half_open_trial:
+            state.half_open_trial = False
+            if failed:
+                state.opened_at = time.monotonic()
+                logger.warning(f"Circuit for {platform} stays open after trial request")
+            else:
+                state.opened_at = 0.0
+                state.outcomes.clear()
+                logger.info(f"Circuit for {platform} closed")
+            return
+
+        if (
+            not state.opened_at
+            and len(state.outcomes) >= self.breaker_min_requests
+            and state.error_rate() >= self.breaker_threshold
+        ):
+            state.opened_at = time.monotonic()
+            logger.warning(f"Circuit for {platform} opened, error rate {state.error_rate():.0%}")
+
+    async def call(self, platform: str, func: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """Call func with retries; raises the last error if every attempt fails"""
+        state = self._state(platform)
+        state.counters['requests'] += 1
+        state.deposit()
+
+        for attempt in range(self.max_attempts):
+            trial_taken = state.half_open_trial
+            if not self._allow(state, platform):
+                state.counters['circuit_rejections'] += 1
+                raise CircuitOpenError(f"{platform} is failing, try again later")
+            is_trial = state.half_open_trial and not trial_taken
+
+            state.counters['attempts'] += 1
+            try:
+                result = await func(*args, **kwargs)
+            except asyncio.CancelledError:
+                # A cancelled trial says nothing about the platform; the
+                # next request makes another one
+                if is_trial:
+                    state.half_open_trial = False
+                raise
+            except Exception as e:
+                kind = classify_error(e)
+                state.counters[f'{kind}_errors'] += 1
+                # Permanent errors are about the media, not the platform's health
+                self._on_result(state, platform, failed=kind == TRANSIENT)
+
+                if kind == PERMANENT or attempt == self.max_attempts - 1:
+                    raise
+                if not state.withdraw():
+                    state.counters['budget_exhausted'] += 1
+                    logger.warning(f"Retry budget for {platform} exhausted")
+                    raise
+
+                state.counters['retries'] += 1
+                delay = self.backoff(attempt)
+                logger.info("Retrying %s download in %.1fs after: %s", platform, delay, e)
+                await asyncio.sleep(delay)
+                continue
+
+            self._on_result(state, platform, failed=False)
+            state.counters['successes'] += 1
+            return result
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Return per-platform counters, error rate and breaker state"""
+        return {
+            platform: {
+                **state.counters,
+                'error_rate': round(state.error_rate(), 3),
+                'retry_budget': round(state.budget, 2),
+                'circuit': self.circuit_state(platform),
+            }
+            for platform, state in self.platforms.items()
+        }
@@ -0,0 +1,72 @@
+"""
+Search result cache
+Inline queries repeat a lot (the same song names, typed by many users), so
+Shazam search results are kept for a while under the normalized query
+instead of asking Shazam again for every keystroke that lands on it.
+"""
+
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+
+def normalize_query(query: str) -> str:
+    """Case- and whitespace-insensitive form of a search query"""
+    return ' '.join(query.casefold().split())
+
+
+class SearchCache:
+    """Size-bounded LRU of search results with a fixed TTL"""
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # normalized query -> (expires_at, limit searched with, results),
+        # least recently used first
+        self._entries: "OrderedDict[str, Tuple[float, int, List[Any]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, query: str, limit: int) -> Optional[List[Any]]:
+        """Return cached results of a search with at least this limit"""
+        key = normalize_query(query)
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, searched, results = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+            elif searched >= limit:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return results[:limit]
+
+        self.misses += 1
+        return None
+
+    def put(self, query: str, limit: int, results: List[Any]):
+        """Remember the results of a search"""
+        key = normalize_query(query)
+        self._entries.pop(key, None)
+        self._entries[key] = (time.monotonic() + self.ttl, limit, list(results))
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def resize(self, max_entries: int):
+        """Change the size bound, dropping the least recently used entries"""
+        self.max_entries = max_entries
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def __contains__(self, query: str) -> bool:
+        entry = self._entries.get(normalize_query(query))
+        return entry is not None and entry[0] > time.monotonic()
+
+    def stats(self) -> Dict[str, float]:
+        """Return size and hit rate"""
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+        }
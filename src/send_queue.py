@@ -0,0 +1,252 @@
+"""
+Outbound Telegram API rate limiting
+Every Bot API request passes through PriorityRateLimiter, which enforces
+Telegram's global and per-chat limits with token buckets, honours
+retry_after on 429 responses and lets interactive edits go before bulk
+uploads.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import Any, Callable, Coroutine, Dict, List, Optional, Union
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from src.tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Lower value is sent first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_REPLY = 1
+PRIORITY_BULK = 2
+
+ENDPOINT_PRIORITIES = {
+    'editMessageText': PRIORITY_INTERACTIVE,
+    'editMessageCaption': PRIORITY_INTERACTIVE,
+    'editMessageReplyMarkup': PRIORITY_INTERACTIVE,
+    'deleteMessage': PRIORITY_INTERACTIVE,
+    'sendChatAction': PRIORITY_INTERACTIVE,
+    'sendMessage': PRIORITY_REPLY,
+    'sendAudio': PRIORITY_BULK,
+    'sendVoice': PRIORITY_BULK,
+    'sendDocument': PRIORITY_BULK,
+    'sendMediaGroup': PRIORITY_BULK,
+}
+
+# Idle chat buckets are dropped once this many chats are tracked
+MAX_CHAT_BUCKETS = 10000
+
+# Answers to user actions have their own limits and are never queued
+UNLIMITED_ENDPOINTS = {'answerCallbackQuery', 'answerInlineQuery', 'getUpdates'}
+
+
+def retry_after_seconds(error: RetryAfter) -> float:
+    """Read retry_after from a flood-control error as seconds"""
+    retry_after = error.retry_after
+    if hasattr(retry_after, 'total_seconds'):
+        return retry_after.total_seconds()
+    return float(retry_after)
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at ``rate`` tokens per second"""
+
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated', 'paused_until')
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def refill(self, now: float):
+        """Add the tokens accumulated since the last refill"""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def ready_at(self, now: float) -> float:
+        """Time at which one token is available"""
+        self.refill(now)
+        if self.tokens >= 1:
+            return max(now, self.paused_until)
+        return max(now + (1 - self.tokens) / self.rate, self.paused_until)
+
+    def consume(self):
+        """Take one token"""
+        self.tokens -= 1
+
+    def pause(self, until: float):
+        """Hold the bucket empty until a retry_after deadline"""
+        self.paused_until = max(self.paused_until, until)
+
+
+class PriorityRateLimiter(BaseRateLimiter):
+    """Rate limiter that schedules Bot API requests by priority"""
+
+    def __init__(
+        self,
+        global_rate: float = 30,
+        private_chat_rate: float = 1,
+        group_chat_rate_per_minute: float = 20,
+        max_retries: int = 3,
+        global_burst: Optional[float] = None,
+        chat_burst: float = 3,
+    ):
+        self.global_bucket = TokenBucket(global_rate, global_burst or global_rate)
+        self.private_chat_rate = private_chat_rate
+        self.group_chat_rate = group_chat_rate_per_minute / 60
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+
+        self._chat_buckets: Dict[Union[int, str], TokenBucket] = {}
+        # Heap of (priority, sequence number, chat_id, future)
+        self._waiters: List[tuple] = []
+        self._counter = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+
+        # Counters for monitoring
+        self.sent = 0
+        self.rate_limited = 0
+
+    async def initialize(self) -> None:
+        """Start the dispatcher"""
+        self._wakeup = asyncio.Event()
+        self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def shutdown(self) -> None:
+        """Stop the dispatcher and fail anything still waiting"""
+        if self._dispatcher:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+        for _, _, _, future in self._waiters:
+            if not future.done():
+                future.cancel()
+        self._waiters = []
+
+    def _chat_bucket(self, chat_id: Union[int, str]) -> TokenBucket:
+        """Per-chat bucket; groups and channels have negative IDs or @usernames"""
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) >= MAX_CHAT_BUCKETS:
+                self._prune_chat_buckets()
+            is_group = isinstance(chat_id, str) or chat_id < 0
+            rate = self.group_chat_rate if is_group else self.private_chat_rate
+            bucket = TokenBucket(rate, self.chat_burst)
+            self._chat_buckets[chat_id] = bucket
+        return bucket
+
+    def _prune_chat_buckets(self):
+        """Forget chats whose buckets are full again"""
+        now = time.monotonic()
+        for chat_id, bucket in list(self._chat_buckets.items()):
+            bucket.refill(now)
+            if bucket.tokens >= bucket.capacity and bucket.paused_until <= now:
+                del self._chat_buckets[chat_id]
+
+    async def _acquire(self, chat_id: Union[int, str], priority: int):
+        """Wait until the dispatcher grants this request a send slot"""
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._counter), chat_id, future))
+        self._wakeup.set()
+        await future
+
+    async def _dispatch(self):
+        """Grant send slots in priority order as tokens become available"""
+        while True:
+            self._wakeup.clear()
+            now = time.monotonic()
+            next_ready = None
+
+            # Requests whose chat has no token yet, put back after this pass;
+            # a busy chat does not hold up requests for other chats
+            blocked = []
+            while self._waiters:
+                global_ready = self.global_bucket.ready_at(now)
+                if global_ready > now:
+                    next_ready = global_ready
+                    break
+
+                entry = heapq.heappop(self._waiters)
+                _, _, chat_id, future = entry
+                if future.done():
+                    continue
+
+                bucket = self._chat_bucket(chat_id)
+                ready = bucket.ready_at(now)
+                if ready > now:
+                    blocked.append(entry)
+                    next_ready = ready if next_ready is None else min(next_ready, ready)
+                    continue
+
+                self.global_bucket.consume()
+                bucket.consume()
+                future.set_result(None)
+
+            for entry in blocked:
+                heapq.heappush(self._waiters, entry)
+
+            timeout = None if next_ready is None else max(0.0, next_ready - time.monotonic())
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def _pause(self, chat_id: Union[int, str], seconds: float):
+        """Apply a retry_after to the chat"""
+        self._chat_bucket(chat_id).pause(time.monotonic() + seconds)
+        self._wakeup.set()
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, Union[bool, Dict[str, Any], List[Dict[str, Any]]]]],
+        args: Any,
+        kwargs: Dict[str, Any],
+        endpoint: str,
+        data: Dict[str, Any],
+        rate_limit_args: Optional[int],
+    ) -> Union[bool, Dict[str, Any], List[Dict[str, Any]]]:
+        """Send one Bot API request once the limits allow it
+
+        ``rate_limit_args`` may be passed to override the endpoint priority.
+        """
+        # Requests without a chat (None values are already dropped from
+        # data) are not limited
+        if endpoint in UNLIMITED_ENDPOINTS or 'chat_id' not in data:
+            return await callback(*args, **kwargs)
+
+        chat_id = data['chat_id']
+        priority = rate_limit_args if rate_limit_args is not None else ENDPOINT_PRIORITIES.get(endpoint, PRIORITY_REPLY)
+
+        for attempt in range(self.max_retries + 1):
+            with span('send_queue_wait', endpoint=endpoint, attempt=attempt):
+                await self._acquire(chat_id, priority)
+            try:
+                with span('bot_api', endpoint=endpoint):
+                    result = await callback(*args, **kwargs)
+                self.sent += 1
+                return result
+            except RetryAfter as e:
+                self.rate_limited += 1
+                seconds = retry_after_seconds(e)
+                logger.warning("%s to chat %s rate limited, retrying after %ss", endpoint, chat_id, seconds)
+                self._pause(chat_id, seconds)
+                if attempt == self.max_retries:
+                    raise
+
+    def stats(self) -> Dict[str, int]:
+        """Return queue counters"""
+        return {
+            'queued': len(self._waiters),
+            'sent': self.sent,
+            'rate_limited': self.rate_limited,
+        }
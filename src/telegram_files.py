@@ -0,0 +1,171 @@
+"""
+Telegram media downloads for recognition
+Recognition only needs the first seconds of a clip, so the size and
+duration Telegram reports are checked before anything is fetched: files
+over the download limit are refused up front, long ones are read only as
+far as the recognition window (a Range request, and a reader that stops
+early if the server sends everything anyway), and small ones stay in memory.
+
+With a local Bot API server in --local mode, files are neither downloaded
+nor uploaded: incoming media is read from the path the server reports and
+outgoing audio is handed over by path.
+"""
+
+import logging
+import os
+import tempfile
+from contextlib import asynccontextmanager, contextmanager
+from pathlib import Path
+from typing import AsyncIterator, BinaryIO, Iterator, Optional, Union
+
+import httpx
+
+from config.config import (
+    CLIP_MEMORY_MAX_BYTES,
+    CLIP_RECOGNITION_SECONDS,
+    DOWNLOAD_PATH,
+    LOCAL_BOT_API_FILE_LIMIT,
+    LOCAL_BOT_API_LOCAL_MODE,
+    LOCAL_BOT_API_URL,
+    TELEGRAM_DOWNLOAD_LIMIT,
+)
+from src.metrics import stage
+
+logger = logging.getLogger(__name__)
+
+# Formats that decode from any prefix of the file; MP4/M4A may keep their
+# index at the end and are always fetched whole
+PREFIX_DECODABLE = (
+    'audio/mpeg', 'audio/mp3', 'audio/ogg', 'audio/opus', 'audio/flac', 'audio/x-flac',
+    'audio/wav', 'audio/x-wav', 'audio/aac',
+)
+
+# Extra bytes for headers and tags (e.g. ID3 cover art) in front of the audio
+PREFIX_MARGIN = 512 * 1024
+
+# Files are exchanged by path with a local Bot API server on this machine
+LOCAL_MODE = bool(LOCAL_BOT_API_URL) and LOCAL_BOT_API_LOCAL_MODE
+DOWNLOAD_LIMIT = LOCAL_BOT_API_FILE_LIMIT if LOCAL_BOT_API_URL else TELEGRAM_DOWNLOAD_LIMIT
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+class FileTooLarge(Exception):
+    """A file over the size limit of the step that refused it"""
+
+    def __init__(self, size: int, limit: int):
+        super().__init__(f"File of {size} bytes is over the {limit} byte limit")
+        self.size = size
+        self.limit = limit
+
+
+def too_large(media) -> bool:
+    """Whether the Bot API won't let the bot download this file"""
+    return bool(media.file_size and media.file_size > DOWNLOAD_LIMIT)
+
+
+def local_path(file_path: Optional[str]) -> Optional[str]:
+    """The path of a file a local Bot API server stored on this machine"""
+    if LOCAL_MODE and file_path and os.path.isabs(file_path) and os.path.exists(file_path):
+        return file_path
+    return None
+
+
+def prefix_bytes(media) -> Optional[int]:
+    """Bytes that hold the recognition window of a long clip, None to fetch it whole"""
+    size, duration = media.file_size, getattr(media, 'duration', None)
+    mime_type = (getattr(media, 'mime_type', None) or '').lower()
+    if not size or not duration or mime_type not in PREFIX_DECODABLE:
+        return None
+    budget = int(size * CLIP_RECOGNITION_SECONDS / duration) + PREFIX_MARGIN
+    # Not worth a partial read
+    if budget >= size * 0.8:
+        return None
+    return budget
+
+
+class FileFetchError(Exception):
+    """A file that could not be fetched; the message leaves out the URL,
+    which holds the bot token"""
+
+
+def http_client() -> httpx.AsyncClient:
+    """The client, and its connection pool, shared by every prefix fetch"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(timeout=30)
+    return _client
+
+
+async def close_http_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+async def fetch_prefix(url: str, limit: int) -> bytes:
+    """Read the first ``limit`` bytes of a file
+
+    Asks for a byte range; a server that ignores it sends the whole file,
+    and the reader stops once it has enough.
+    """
+    received = bytearray()
+    try:
+        async with http_client().stream('GET', url, headers={'Range': f'bytes=0-{limit - 1}'}) as response:
+            response.raise_for_status()
+            async for chunk in response.aiter_bytes():
+                received += chunk
+                if len(received) >= limit:
+                    break
+    except httpx.HTTPStatusError as e:
+        raise FileFetchError(f"File server answered {e.response.status_code}") from None
+    except httpx.HTTPError as e:
+        raise FileFetchError(f"File fetch failed: {type(e).__name__}") from None
+    return bytes(received[:limit])
+
+
+@asynccontextmanager
+async def downloaded_clip(media, suffix: str) -> AsyncIterator[Union[str, bytes]]:
+    """Download a Telegram voice note or audio file for recognition
+
+    A file on a local Bot API server's disk is yielded as its path. Long
+    clips are fetched up to the recognition window and clips up to
+    CLIP_MEMORY_MAX_BYTES whole, both into memory and yielded as bytes;
+    anything else goes to a temporary file whose path is yielded and which
+    is removed afterwards.
+    """
+    path = None
+    try:
+        with stage('telegram_download', 'telegram'):
+            telegram_file = await media.get_file()
+            limit = prefix_bytes(media)
+            if local_path(telegram_file.file_path):
+                # The server's copy; it is not ours to remove
+                clip = telegram_file.file_path
+            elif limit and telegram_file.file_path.startswith(('http://', 'https://')):
+                clip = await fetch_prefix(telegram_file.file_path, limit)
+                logger.info("Fetched %d of %d bytes for recognition", len(clip), media.file_size)
+            elif media.file_size and media.file_size <= CLIP_MEMORY_MAX_BYTES:
+                clip = bytes(await telegram_file.download_as_bytearray())
+            else:
+                fd, path = tempfile.mkstemp(prefix='clip_', suffix=suffix, dir=DOWNLOAD_PATH)
+                os.close(fd)
+                clip = str(await telegram_file.download_to_drive(path))
+        yield clip
+    finally:
+        if path and os.path.exists(path):
+            try:
+                os.remove(path)
+            except Exception as e:
+                logger.error(f"Error removing temp file: {e}")
+
+
+@contextmanager
+def upload_source(file_path: str) -> Iterator[Union[Path, BinaryIO]]:
+    """Audio to upload: the path for a local Bot API server, else the open file"""
+    if LOCAL_MODE:
+        yield Path(file_path).resolve()
+        return
+    with open(file_path, 'rb') as audio_file:
+        yield audio_file
@@ -0,0 +1,147 @@
+"""
+Per-request tracing
+Every update gets a request ID and a trace; timed spans opened anywhere
+below it (download, recognition, transcode, Bot API calls) attach to it
+through contextvars. Finished traces are written as one JSON line each to
+the ``traces`` logger, sampled except for slow or failed requests.
+"""
+
+import contextvars
+import functools
+import logging
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from config.config import TRACE_SAMPLE_RATE, TRACE_SLOW_THRESHOLD
+
+trace_logger = logging.getLogger('traces')
+
+_current_trace: contextvars.ContextVar = contextvars.ContextVar('trace', default=None)
+_current_span: contextvars.ContextVar = contextvars.ContextVar('span', default=None)
+
+
+class Trace:
+    """Spans recorded for one request"""
+
+    __slots__ = ('request_id', 'name', 'attrs', 'start', 'spans', '_ids', '_lock')
+
+    def __init__(self, name: str, attrs: Dict[str, Any]):
+        self.request_id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.attrs = attrs
+        self.start = time.time()
+        self.spans: List[Dict[str, Any]] = []
+        self._ids = 0
+        # Spans also finish in download pool threads
+        self._lock = threading.Lock()
+
+    def next_id(self) -> int:
+        """Allocate a span ID"""
+        with self._lock:
+            self._ids += 1
+            return self._ids
+
+    def add_span(self, span_id: int, name: str, start: float, duration: float,
+                 parent: Optional[int], attrs: Dict[str, Any], error: Optional[str] = None):
+        """Record a finished span"""
+        span = {
+            'id': span_id,
+            'parent': parent,
+            'name': name,
+            'offset_ms': round((start - self.start) * 1000, 1),
+            'duration_ms': round(duration * 1000, 1),
+        }
+        if attrs:
+            span['attrs'] = attrs
+        if error:
+            span['error'] = error
+        with self._lock:
+            self.spans.append(span)
+
+
+def current_request_id() -> Optional[str]:
+    """Request ID of the trace in the current context, if any"""
+    trace = _current_trace.get()
+    return trace.request_id if trace else None
+
+
+@contextmanager
+def start_trace(name: str, **attrs):
+    """Open the root trace for one update"""
+    trace = Trace(name, attrs)
+    trace_token = _current_trace.set(trace)
+    span_token = _current_span.set(None)
+    error = None
+    try:
+        yield trace
+    except BaseException as e:
+        error = repr(e)
+        raise
+    finally:
+        _current_span.reset(span_token)
+        _current_trace.reset(trace_token)
+        duration = time.time() - trace.start
+
+        # Slow and failed requests are always kept, the rest are sampled
+        if error or duration >= TRACE_SLOW_THRESHOLD or random.random() < TRACE_SAMPLE_RATE:
+            record = {
+                'request_id': trace.request_id,
+                'name': name,
+                'start': trace.start,
+                'duration_ms': round(duration * 1000, 1),
+                **attrs,
+                'spans': sorted(trace.spans, key=lambda span: (span['offset_ms'], span['id'])),
+            }
+            if error:
+                record['error'] = error
+            # Serialized to JSON on the logging thread
+            trace_logger.info(record)
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Time a block as a child of the current span; a no-op outside a trace"""
+    trace = _current_trace.get()
+    if trace is None:
+        yield attrs
+        return
+
+    start = time.time()
+    span_id = trace.next_id()
+    parent = _current_span.get()
+    token = _current_span.set(span_id)
+    error = None
+    try:
+        # Callers may add attributes while the span is open
+        yield attrs
+    except BaseException as e:
+        error = repr(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        trace.add_span(span_id, name, start, time.time() - start, parent, attrs, error)
+
+
+def record_span(name: str, start: float, end: float, **attrs):
+    """Record a span measured elsewhere (wall-clock timestamps)"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add_span(trace.next_id(), name, start, end - start, _current_span.get(), attrs)
+
+
+def traced(name: Optional[str] = None):
+    """Decorator running an async function inside a span"""
+    def decorator(func):
+        span_name = name or func.__name__
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with span(span_name):
+                return await func(*args, **kwargs)
+
+        return wrapper
+    return decorator
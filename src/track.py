@@ -0,0 +1,67 @@
+"""
+Compact track records
+A Shazam answer carries tens of kilobytes of JSON per track (hub actions,
+lyrics and video sections, share links, images) of which the bot shows
+four fields. Track keeps just those, built once per response, with artist
+and album names interned (many tracks share them) and the display text
+formatted once instead of on every reply.
+"""
+
+import sys
+from typing import Any, Dict, Optional
+
+UNKNOWN_TITLE = 'Unknown'
+UNKNOWN_ARTIST = 'Unknown Artist'
+UNKNOWN_ALBUM = 'Unknown Album'
+
+
+class Track:
+    """What the bot shows of a recognized or found track"""
+
+    __slots__ = ('key', 'title', 'artist', 'album', 'cover_url', 'card', 'summary')
+
+    def __init__(self, key: str, title: str, artist: str, album: str, cover_url: str = ''):
+        self.key = key
+        self.title = title
+        self.artist = sys.intern(artist)
+        self.album = sys.intern(album)
+        self.cover_url = cover_url
+        # Markdown card of replies and plain text of inline results
+        self.card = f"🎵 **{title}**\n👤 **{artist}**\n💿 **{album}**"
+        self.summary = f"🎵 {title}\n👤 {artist}\n💿 {album}"
+
+    @classmethod
+    def from_shazam(cls, data: Optional[Dict[str, Any]]) -> Optional['Track']:
+        """Build a track from a Shazam track dict or the output of to_dict()"""
+        if not data:
+            return None
+        album = data.get('album')
+        if album is None:
+            # The album is the first metadata entry of the song section
+            sections = data.get('sections') or [{}]
+            metadata = sections[0].get('metadata') or [{}]
+            album = metadata[0].get('text')
+        return cls(
+            key=str(data.get('key') or ''),
+            title=data.get('title') or UNKNOWN_TITLE,
+            artist=data.get('subtitle') or UNKNOWN_ARTIST,
+            album=album or UNKNOWN_ALBUM,
+            cover_url=(data.get('images') or {}).get('coverart') or data.get('cover_url') or '',
+        )
+
+    def to_dict(self) -> Dict[str, str]:
+        """Fields for storage, in Shazam's names where it has one"""
+        return {
+            'key': self.key,
+            'title': self.title,
+            'subtitle': self.artist,
+            'album': self.album,
+            'cover_url': self.cover_url,
+        }
+
+    def caption(self, success: str) -> str:
+        """The card followed by the localized success line"""
+        return f"{self.card}\n\n✅ {success}"
+
+    def __repr__(self) -> str:
+        return f"Track({self.title!r}, {self.artist!r})"
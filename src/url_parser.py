@@ -0,0 +1,177 @@
+"""
+URL classification for supported platforms
+Parses the host once, resolves the platform with a suffix lookup on the
+host labels and extracts the canonical media ID from the path.
+"""
+
+import re
+from typing import Dict, List, NamedTuple, Optional
+from urllib.parse import urlsplit
+
+from config.config import SUPPORTED_PLATFORMS
+
+# URLs inside free text, stopping at whitespace and common delimiters
+URL_PATTERN = re.compile(r'https?://[^\s<>"\'«»]+', re.IGNORECASE)
+URL_PREFIX_PATTERN = re.compile(r'https?://', re.IGNORECASE)
+TRAILING_PUNCTUATION = '.,;:!?)]}'
+
+# Domain -> platform, matched against every suffix of the host
+DOMAIN_INDEX: Dict[str, str] = {
+    domain.lower(): platform
+    for platform, domains in SUPPORTED_PLATFORMS.items()
+    for domain in domains
+}
+
+YOUTUBE_ID = re.compile(r'^[0-9A-Za-z_-]{11}$')
+YOUTUBE_PATH = re.compile(r'^/(?:shorts|embed|live|v|e)/([0-9A-Za-z_-]{11})')
+YOUTUBE_VIDEO_PARAM = re.compile(r'(?:^|&)v=([0-9A-Za-z_-]{11})(?:&|$)')
+YOUTUBE_LIST_PARAM = re.compile(r'(?:^|&)list=([\w-]+)')
+INSTAGRAM_PATH = re.compile(r'^/(?:[\w.]+/)?(?:p|reels?|tv)/([\w-]+)')
+TIKTOK_PATH = re.compile(r'^/(?:@[\w.-]+/video|v|embed(?:/v2)?)/(\d+)')
+TIKTOK_SHORT_PATH = re.compile(r'^/(?:t/)?([\w-]+)/?$')
+PINTEREST_PATH = re.compile(r'^/pin/(?:[\w-]*--)?(\d+)')
+SOUNDCLOUD_PATH = re.compile(r'^/([\w-]+)/(sets/)?([\w-]+)/?$')
+
+
+class ParsedURL(NamedTuple):
+    """A URL resolved to its platform and canonical media ID"""
+    url: str
+    platform: str
+    media_id: Optional[str]
+    is_playlist: bool = False
+
+    @property
+    def key(self) -> str:
+        """Stable identifier for the media, falling back to the raw URL"""
+        return self.media_id or self.url
+
+
+def lookup_platform(host: str) -> Optional[str]:
+    """Resolve a host name to a platform by walking its suffixes"""
+    host = host.rstrip('.')
+    while host:
+        platform = DOMAIN_INDEX.get(host)
+        if platform:
+            return platform
+        dot = host.find('.')
+        if dot < 0:
+            return None
+        host = host[dot + 1:]
+    return None
+
+
+def _youtube_id(host: str, path: str, query: str) -> tuple:
+    """Extract a YouTube video or playlist ID"""
+    if host == 'youtu.be' or host.endswith('.youtu.be'):
+        video_id = path.strip('/').split('/', 1)[0]
+        return (video_id if YOUTUBE_ID.match(video_id) else None), False
+
+    match = YOUTUBE_PATH.match(path)
+    if match:
+        return match.group(1), False
+
+    match = YOUTUBE_VIDEO_PARAM.search(query)
+    if match:
+        return match.group(1), False
+
+    match = YOUTUBE_LIST_PARAM.search(query)
+    if match:
+        return f"playlist:{match.group(1)}", True
+    return None, False
+
+
+def _instagram_id(host: str, path: str, query: str) -> tuple:
+    """Extract an Instagram post shortcode"""
+    match = INSTAGRAM_PATH.match(path)
+    return (match.group(1) if match else None), False
+
+
+def _tiktok_id(host: str, path: str, query: str) -> tuple:
+    """Extract a TikTok video ID"""
+    match = TIKTOK_PATH.match(path)
+    if match:
+        return match.group(1), False
+
+    # vm.tiktok.com/<code> and tiktok.com/t/<code> redirect to a video
+    if host.startswith(('vm.', 'vt.')) or path.startswith('/t/'):
+        match = TIKTOK_SHORT_PATH.match(path)
+        if match:
+            return f"short:{match.group(1)}", False
+    return None, False
+
+
+def _pinterest_id(host: str, path: str, query: str) -> tuple:
+    """Extract a Pinterest pin ID"""
+    match = PINTEREST_PATH.match(path)
+    return (match.group(1) if match else None), False
+
+
+def _soundcloud_id(host: str, path: str, query: str) -> tuple:
+    """Extract a SoundCloud user/track slug"""
+    match = SOUNDCLOUD_PATH.match(path)
+    if not match:
+        return None, False
+
+    user, sets, track = match.groups()
+    if user in ('discover', 'search', 'you', 'stream'):
+        return None, False
+    if sets:
+        return f"sets:{user.lower()}/{track.lower()}", True
+    return f"{user.lower()}/{track.lower()}", False
+
+
+MEDIA_ID_EXTRACTORS = {
+    'youtube': _youtube_id,
+    'instagram': _instagram_id,
+    'tiktok': _tiktok_id,
+    'pinterest': _pinterest_id,
+    'soundcloud': _soundcloud_id,
+}
+
+
+def parse_url(url: str) -> Optional[ParsedURL]:
+    """Classify a single URL, returning None for unsupported hosts"""
+    try:
+        parts = urlsplit(url)
+        host = parts.hostname
+    except ValueError:
+        return None
+
+    if parts.scheme not in ('http', 'https') or not host:
+        return None
+
+    platform = lookup_platform(host)
+    if not platform:
+        return None
+
+    extractor = MEDIA_ID_EXTRACTORS.get(platform)
+    media_id, is_playlist = extractor(host, parts.path, parts.query) if extractor else (None, False)
+    return ParsedURL(url, platform, media_id, is_playlist)
+
+
+def find_urls(text: str) -> List[str]:
+    """Find all http(s) URLs in free text"""
+    if '://' not in text:
+        return []
+    return [match.rstrip(TRAILING_PUNCTUATION) for match in URL_PATTERN.findall(text)]
+
+
+def extract_urls(text: str) -> List[ParsedURL]:
+    """Find supported URLs in free text, one entry per distinct media"""
+    parsed_urls = []
+    seen = set()
+    for url in find_urls(text):
+        parsed = parse_url(url)
+        if parsed is None:
+            continue
+        key = (parsed.platform, parsed.key)
+        if key in seen:
+            continue
+        seen.add(key)
+        parsed_urls.append(parsed)
+    return parsed_urls
+
+
+def starts_with_url(text: str) -> bool:
+    """Check whether a message starts with a URL"""
+    return URL_PREFIX_PATTERN.match(text) is not None
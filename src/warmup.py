@@ -0,0 +1,201 @@
+"""
+Cache warm-up after startup
+A restart empties the in-memory caches, so the first users after it wait
+for the most popular songs. Shortly after startup the warm-up searches
+Shazam for the current chart tracks (filling the search cache used by
+inline queries) and fetches the links most requested in the job history
+into the media cache; with an upload chat configured, it also uploads them
+there once so their Telegram file_id is ready for the next request.
+
+Each search or link comes out of a fixed budget, requests are spaced out
+and only made while the bot leaves download slots free, at the lowest
+scheduling share.
+"""
+
+import asyncio
+import logging
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.search_cache import normalize_query
+from src.telegram_files import upload_source
+from src.url_parser import extract_urls
+
+logger = logging.getLogger(__name__)
+
+# Scheduler identity of warm-up downloads, never a Telegram user
+WARMUP_USER_ID = 0
+
+# Job history texts looked at when ranking links
+HISTORY_TEXTS = 500
+
+
+def chart_queries(charts: Dict[str, Any]) -> List[str]:
+    """Track titles of a Shazam chart response
+
+    Older shazamio versions return ``{'tracks': [track, ...]}``, newer ones
+    ``{'data': [{'attributes': {'name': ...}}, ...]}``.
+    """
+    titles = [track.get('title') for track in charts.get('tracks') or []]
+    titles += [item.get('attributes', {}).get('name') for item in charts.get('data') or []]
+    queries, seen = [], set()
+    for title in titles:
+        if title and normalize_query(title) not in seen:
+            seen.add(normalize_query(title))
+            queries.append(title)
+    return queries
+
+
+class WarmUp:
+    """Background warm-up of the search and media caches"""
+
+    def __init__(
+        self,
+        bot,
+        store,
+        budget: int,
+        interval: float,
+        chart_tracks: int = 20,
+        chart_country: str = '',
+        top_links: int = 10,
+        history_days: float = 7,
+        upload_chat_id: int = 0,
+        search_limit: int = 10,
+    ):
+        self.bot = bot
+        self.store = store
+        self.budget = budget
+        self.interval = interval
+        self.chart_tracks = chart_tracks
+        self.chart_country = chart_country
+        self.top_links = top_links
+        self.history_days = history_days
+        self.upload_chat_id = upload_chat_id
+        self.search_limit = search_limit
+        self._task: Optional[asyncio.Future] = None
+        self.spent = 0
+        self.searched = 0
+        self.downloaded = 0
+        self.uploaded = 0
+        self.done = False
+
+    def start(self, telegram_bot, delay: float):
+        """Run the warm-up in the background after ``delay`` seconds"""
+        self._task = asyncio.ensure_future(self.run(telegram_bot, delay))
+
+    def stop(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+
+    async def run(self, telegram_bot, delay: float = 0):
+        await asyncio.sleep(delay)
+        start = time.monotonic()
+        try:
+            if self.chart_tracks:
+                await self.warm_searches()
+            if self.top_links:
+                await self.warm_links(telegram_bot)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error warming up caches: {e}")
+        self.done = True
+        logger.info(
+            "Warm-up finished in %.0fs: %d searches, %d downloads, %d uploads (%d of %d budget)",
+            time.monotonic() - start, self.searched, self.downloaded, self.uploaded, self.spent, self.budget,
+        )
+
+    def _idle(self) -> bool:
+        """Nobody is waiting and a download slot stays free for live requests"""
+        for scheduler in (self.bot.download_scheduler, self.bot.recognition_scheduler):
+            stats = scheduler.stats()
+            if stats['queued'] or stats['running'] >= max(1, stats['capacity'] - 1):
+                return False
+        return True
+
+    async def _spend(self) -> bool:
+        """Wait for a quiet moment and take one request from the budget"""
+        if self.spent >= self.budget:
+            return False
+        await asyncio.sleep(self.interval)
+        while not self._idle():
+            await asyncio.sleep(self.interval)
+        self.spent += 1
+        return True
+
+    async def warm_searches(self):
+        """Search for the current chart tracks so inline queries hit the cache"""
+        if not await self._spend():
+            return
+        shazam = self.bot.shazam
+        if self.chart_country:
+            charts = await shazam.top_country_tracks(self.chart_country, self.chart_tracks)
+        else:
+            charts = await shazam.top_world_tracks(limit=self.chart_tracks)
+
+        for query in chart_queries(charts or {})[:self.chart_tracks]:
+            if query in self.bot.search_cache:
+                continue
+            if not await self._spend():
+                return
+            await self.bot.search_song(query, limit=self.search_limit)
+            self.searched += 1
+
+    async def popular_links(self) -> List[Tuple[str, Tuple[str, str]]]:
+        """Links most requested in the job history with their (platform, media key), one per media"""
+        since = time.time() - self.history_days * 24 * 3600
+        requests: Counter = Counter()
+        links: Dict[str, Tuple[str, Tuple[str, str]]] = {}
+        for text, count in self.store.popular(since, HISTORY_TEXTS):
+            for parsed in extract_urls(text):
+                resolved = None if parsed.is_playlist else await self.bot.resolve_media_key(parsed.url)
+                if resolved:
+                    key = resolved[1]
+                    requests[key] += count
+                    links.setdefault(key, (parsed.url, resolved))
+        return [links[key] for key, _ in requests.most_common(self.top_links)]
+
+    async def warm_links(self, telegram_bot):
+        """Fetch popular links and, with an upload chat, remember their file_id"""
+        for url, resolved in await self.popular_links():
+            key = resolved[1]
+            if self.bot.link_jobs.get_result(key) or (not self.upload_chat_id and key in self.bot.media_cache):
+                continue
+            if not await self._spend():
+                return
+            # A remembered result answers the next request for this media
+            await self.bot.link_jobs.run(key, lambda: self.fetch(telegram_bot, url, resolved))
+
+    async def fetch(self, telegram_bot, url: str, resolved: Tuple[str, str]) -> Optional[Dict[str, Any]]:
+        """Download a link, and upload it to the upload chat if there is one"""
+        file_path = None
+        try:
+            file_path = await self.bot.download_audio(url, WARMUP_USER_ID, resolved=resolved)
+            if not file_path:
+                return None
+            self.downloaded += 1
+            if not self.upload_chat_id:
+                return None
+
+            track = await self.bot.recognize_download(file_path, resolved)
+            names = {'title': track.title, 'performer': track.artist} if track else {}
+            with upload_source(file_path) as audio:
+                sent = await telegram_bot.send_audio(
+                    self.upload_chat_id, audio=audio, disable_notification=True, **names
+                )
+            self.uploaded += 1
+            return {'file_id': sent.audio.file_id, 'track': track}
+        finally:
+            self.bot.media_cache.release(file_path)
+
+    def stats(self) -> Dict[str, int]:
+        """Return warm-up counters"""
+        return {
+            'budget': self.budget,
+            'spent': self.spent,
+            'searched': self.searched,
+            'downloaded': self.downloaded,
+            'uploaded': self.uploaded,
+            'done': int(self.done),
+        }
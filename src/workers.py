@@ -0,0 +1,406 @@
+"""
+Worker processes for media jobs
+Optional tier that moves yt-dlp downloads, FFmpeg transcodes and Shazam
+recognitions out of the bot process. Each worker is a separate interpreter
+(``python -m src.workers``) with its own memory limit, connected to the bot
+over an authenticated Unix socket; it runs one job at a time and reports
+download progress back while it works. The bot process only handles
+Telegram updates and stays small and responsive.
+"""
+
+import asyncio
+import atexit
+import logging
+import os
+import secrets
+import signal
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import Client, Connection, Listener
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Union
+
+from src.retry_policy import TRANSIENT, ClassifiedError, classify_error
+
+logger = logging.getLogger(__name__)
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+
+# The socket's auth key reaches workers through the environment, not argv
+AUTHKEY_ENV = 'MUSICBOT_WORKER_AUTHKEY'
+
+# Seconds between relayed download progress updates
+RELAY_INTERVAL = 0.5
+
+# Keys of a yt-dlp progress status the bot's progress messages use
+RELAYED_KEYS = ('status', 'downloaded_bytes', 'total_bytes', 'total_bytes_estimate')
+
+
+def worker_count(configured: int = 0) -> int:
+    """Configured pool size, or one worker per CPU core available to us"""
+    if configured > 0:
+        return configured
+    try:
+        return max(1, len(os.sched_getaffinity(0)))
+    except AttributeError:
+        return max(1, os.cpu_count() or 1)
+
+
+def run_ytdlp(
+    ydl_opts: Dict[str, Any],
+    url: str,
+    on_progress: Optional[Callable[[Dict], None]] = None,
+    on_postprocess: Optional[Callable[[Dict], None]] = None,
+) -> Dict[str, Any]:
+    """Run a blocking yt-dlp download
+
+    Returns the output filename with the wall-clock times the download
+    started, the first postprocessor (FFmpeg) started and everything
+    finished. Errors are raised as ClassifiedError naming the failed stage,
+    ytdlp_extract or ffmpeg_transcode.
+    """
+    started = time.time()
+    transcode_started = []
+
+    def postprocessor_hook(d):
+        if d['status'] == 'started' and not transcode_started:
+            transcode_started.append(time.time())
+        if on_postprocess:
+            on_postprocess(d)
+
+    ydl_opts = dict(ydl_opts)
+    ydl_opts['postprocessor_hooks'] = [postprocessor_hook]
+    if on_progress:
+        ydl_opts['progress_hooks'] = [on_progress]
+
+    import yt_dlp
+
+    try:
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            info = ydl.extract_info(url, download=True)
+            filename = ydl.prepare_filename(info)
+    except Exception as e:
+        failed_stage = 'ffmpeg_transcode' if transcode_started else 'ytdlp_extract'
+        raise ClassifiedError(str(e) or type(e).__name__, classify_error(e), failed_stage) from e
+
+    return {
+        'filename': filename,
+        'started': started,
+        'transcode_started': transcode_started[0] if transcode_started else None,
+        'finished': time.time(),
+    }
+
+
+# Worker side
+
+_shazam = None
+_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _ytdlp_task(relay: Callable[[str, Dict], None], ydl_opts: Dict[str, Any], url: str) -> Dict[str, Any]:
+    last_relayed = [0.0]
+
+    def on_progress(d):
+        now = time.monotonic()
+        if d.get('status') == 'downloading' and now - last_relayed[0] < RELAY_INTERVAL:
+            return
+        last_relayed[0] = now
+        relay('download', {key: d.get(key) for key in RELAYED_KEYS})
+
+    def on_postprocess(d):
+        relay('postprocess', {'status': d.get('status')})
+
+    return run_ytdlp(ydl_opts, url, on_progress, on_postprocess)
+
+
+def _recognize_task(relay: Callable[[str, Dict], None], audio: Union[str, bytes], timeout: float) -> Optional[Dict[str, Any]]:
+    global _shazam, _loop
+    if _shazam is None:
+        from shazamio import Shazam
+        _shazam = Shazam()
+        _loop = asyncio.new_event_loop()
+    return _loop.run_until_complete(asyncio.wait_for(_shazam.recognize(audio), timeout))
+
+
+TASKS = {
+    'ytdlp': _ytdlp_task,
+    'recognize': _recognize_task,
+}
+
+
+def limit_resources(memory_limit: int):
+    """Cap this process's address space and give way to the bot process"""
+    try:
+        import resource
+        if memory_limit > 0:
+            resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+    except (ImportError, ValueError, OSError) as e:
+        logger.warning(f"Cannot set worker memory limit: {e}")
+    try:
+        os.nice(5)
+    except (AttributeError, OSError):
+        pass
+
+
+def serve(conn: Connection):
+    """Run jobs sent by the bot until it closes the connection"""
+    def relay(kind: str, status: Dict):
+        conn.send(('progress', kind, status))
+
+    while True:
+        try:
+            task, args = conn.recv()
+        except EOFError:
+            return
+        try:
+            result = TASKS[task](relay, *args)
+        except ClassifiedError as e:
+            conn.send(('error', e))
+        except Exception as e:
+            # Only the classification and message travel back
+            conn.send(('error', ClassifiedError(f"{type(e).__name__}: {e}", classify_error(e))))
+        else:
+            conn.send(('done', result))
+
+
+def main():
+    """Worker process entry point: python -m src.workers <address> <memory limit>"""
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - worker %(process)d - %(levelname)s - %(message)s')
+    address, memory_limit = sys.argv[1], int(sys.argv[2])
+    authkey = bytes.fromhex(os.environ.pop(AUTHKEY_ENV))
+
+    # Ctrl-C reaches the whole process group; the bot drains its jobs and
+    # then closes the connection, which ends the worker
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    limit_resources(memory_limit)
+
+    conn = Client(address, family='AF_UNIX', authkey=authkey)
+    conn.send(os.getpid())
+    try:
+        serve(conn)
+    finally:
+        conn.close()
+
+
+# Bot side
+
+class Worker:
+    """A worker process and its connection"""
+
+    def __init__(self, process: subprocess.Popen, conn: Connection):
+        self.process = process
+        self.conn = conn
+        self.alive = True
+
+    def kill(self):
+        self.alive = False
+        try:
+            self.conn.close()
+        except OSError:
+            pass
+        if self.process.poll() is None:
+            self.process.kill()
+        self.process.wait()
+
+
+class WorkerPool:
+    """Runs media jobs on a pool of worker processes
+
+    Workers are started on first use. A worker that dies (e.g. it hit its
+    memory limit) fails its job with a transient error and is replaced.
+    """
+
+    def __init__(self, size: int, memory_limit: int, start_timeout: float = 30):
+        self.size = size
+        self.memory_limit = memory_limit
+        self.start_timeout = start_timeout
+        self._authkey = secrets.token_bytes(32)
+        self._listener: Optional[Listener] = None
+        self._idle: Optional[asyncio.Queue] = None
+        self._start_lock = asyncio.Lock()
+        self._connecting: Dict[int, asyncio.Future] = {}
+        self._workers: Dict[int, Worker] = {}
+        # Blocking socket I/O, one thread per busy worker
+        self._threads = ThreadPoolExecutor(max_workers=size, thread_name_prefix='worker-io')
+        self._closed = False
+        # Workers being started in the background
+        self._starting = 0
+        self.counters = {'jobs': 0, 'failures': 0, 'restarts': 0}
+
+    async def start(self):
+        """Start the worker processes if they aren't running yet"""
+        async with self._start_lock:
+            if self._listener is not None:
+                return
+            self._listener = Listener(family='AF_UNIX', authkey=self._authkey)
+            self._idle = asyncio.Queue()
+            loop = asyncio.get_running_loop()
+            threading.Thread(target=self._accept, args=(loop,), name='worker-accept', daemon=True).start()
+            atexit.register(self.close)
+
+            workers = await asyncio.gather(*(self._spawn() for _ in range(self.size)), return_exceptions=True)
+            started = [worker for worker in workers if isinstance(worker, Worker)]
+            for worker in started:
+                self._idle.put_nowait(worker)
+            logger.info(f"Started {len(started)} of {self.size} worker processes")
+
+    def _accept(self, loop: asyncio.AbstractEventLoop):
+        """Hand each incoming worker connection to the spawn waiting for its PID"""
+        while True:
+            try:
+                conn = self._listener.accept()
+                pid = conn.recv()
+            except OSError:
+                # Listener closed
+                return
+            except Exception as e:
+                logger.warning(f"Rejected worker connection: {e}")
+                continue
+            loop.call_soon_threadsafe(self._connected, pid, conn)
+
+    def _connected(self, pid: int, conn: Connection):
+        future = self._connecting.pop(pid, None)
+        if future is None or future.done():
+            conn.close()
+        else:
+            future.set_result(conn)
+
+    async def _spawn(self) -> Worker:
+        env = dict(os.environ, **{AUTHKEY_ENV: self._authkey.hex()})
+        process = subprocess.Popen(
+            [sys.executable, '-m', 'src.workers', self._listener.address, str(self.memory_limit)],
+            cwd=PROJECT_DIR,
+            env=env,
+        )
+        future = asyncio.get_running_loop().create_future()
+        self._connecting[process.pid] = future
+        try:
+            conn = await asyncio.wait_for(future, self.start_timeout)
+        except asyncio.TimeoutError:
+            self._connecting.pop(process.pid, None)
+            process.kill()
+            logger.error(f"Worker process {process.pid} did not connect within {self.start_timeout}s")
+            raise
+
+        worker = Worker(process, conn)
+        self._workers[process.pid] = worker
+        return worker
+
+    def _add(self):
+        """Start one more worker in the background"""
+        self._starting += 1
+        asyncio.ensure_future(self._add_worker())
+
+    async def _add_worker(self):
+        try:
+            worker = await self._spawn()
+        except Exception as e:
+            logger.error(f"Could not start worker process: {e}")
+            return
+        finally:
+            self._starting -= 1
+        self._idle.put_nowait(worker)
+
+    def _replace(self, worker: Worker):
+        """Start a new worker for one that died, unless the pool shrank"""
+        self._workers.pop(worker.process.pid, None)
+        if self._closed or len(self._workers) + self._starting >= self.size:
+            return
+        self.counters['restarts'] += 1
+        self._add()
+
+    def _retire(self, worker: Worker):
+        self._workers.pop(worker.process.pid, None)
+        worker.kill()
+
+    def resize(self, size: int):
+        """Grow or shrink the pool while jobs run
+
+        Missing workers are started in the background and surplus ones stop
+        once they are idle; jobs in progress are not interrupted.
+        """
+        self.size = size
+        # Exchanges in progress finish on the old I/O threads
+        threads, self._threads = self._threads, ThreadPoolExecutor(max_workers=size, thread_name_prefix='worker-io')
+        threads.shutdown(wait=False)
+        if self._listener is None or self._closed:
+            return
+        while len(self._workers) > self.size and not self._idle.empty():
+            self._retire(self._idle.get_nowait())
+        for _ in range(self.size - len(self._workers) - self._starting):
+            self._add()
+
+    def _exchange(self, worker: Worker, task: str, args: tuple, hooks: Dict[str, Callable[[Dict], None]]) -> Any:
+        """Send a job to a worker and wait for its result (blocking)"""
+        try:
+            worker.conn.send((task, args))
+            while True:
+                kind, *payload = worker.conn.recv()
+                if kind == 'progress':
+                    hook = hooks.get(payload[0])
+                    if hook:
+                        hook(payload[1])
+                elif kind == 'done':
+                    return payload[0]
+                else:
+                    raise payload[0]
+        except (EOFError, OSError) as e:
+            worker.alive = False
+            raise ClassifiedError(f"Worker process exited during {task}: {e!r}", TRANSIENT) from e
+
+    async def run(self, task: str, *args, hooks: Optional[Dict[str, Callable[[Dict], None]]] = None) -> Any:
+        """Run a task on the next idle worker
+
+        ``hooks`` maps relayed progress kinds (download, postprocess) to
+        callables; they run on a worker I/O thread.
+        """
+        await self.start()
+        worker = await self._idle.get()
+        self.counters['jobs'] += 1
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self._threads, self._exchange, worker, task, args, hooks or {})
+        except asyncio.CancelledError:
+            # The worker is still busy with the job; stop it rather than wait
+            worker.kill()
+            raise
+        except Exception:
+            self.counters['failures'] += 1
+            raise
+        finally:
+            if not worker.alive:
+                if worker.process.poll() is None:
+                    worker.kill()
+                self._replace(worker)
+            elif len(self._workers) > self.size:
+                # The pool was shrunk
+                self._retire(worker)
+            else:
+                self._idle.put_nowait(worker)
+
+    def stats(self) -> Dict[str, int]:
+        """Return pool size and job counters"""
+        return {
+            'size': self.size,
+            'alive': sum(1 for worker in self._workers.values() if worker.alive),
+            'idle': self._idle.qsize() if self._idle else 0,
+            **self.counters,
+        }
+
+    def close(self):
+        """Stop every worker process"""
+        if self._closed:
+            return
+        self._closed = True
+        for worker in list(self._workers.values()):
+            worker.kill()
+        if self._listener is not None:
+            self._listener.close()
+        self._threads.shutdown(wait=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -33,22 +33,28 @@ bot_instance = None
 bot_thread = None
 
 def run_bot():
-    """Run the Telegram bot"""
-    global bot_instance
+    """Run the Telegram bot, restarting it after a crash"""
+    import asyncio
     
-    try:
-        logger.info("Starting Telegram Music Bot...")
-        
-        # Import and run the bot
-        from src.main import main
-        main()
+    while True:
+        try:
+            logger.info("Starting Telegram Music Bot...")
+            
+            # run_polling() needs an event loop in this thread
+            asyncio.set_event_loop(asyncio.new_event_loop())
+            
+            # Import and run the bot
+            from src.main_optimized import main
+            main()
+            
+            logger.info("Bot stopped")
+            return
+            
+        except Exception as e:
+            logger.error(f"Error running bot: {e}")
         
-    except Exception as e:
-        logger.error(f"Error running bot: {e}")
         # Wait before restarting
         time.sleep(30)
-        # Try to restart
-        run_bot()
 
 def start_bot_thread():
     """Start the bot in a separate thread"""
@@ -64,12 +70,17 @@ def start_bot_thread():
 def application(environ, start_response):
     """
     WSGI application entry point
-    This is required by PythonAnywhere but not used for the bot
+    Keeps the bot thread alive and serves /metrics
     """
     
     # Start the bot thread if not already running
     start_bot_thread()
     
+    # Prometheus scrapes share the bot's process, so they see its metrics
+    if environ.get('PATH_INFO') == '/metrics':
+        from src.metrics import metrics_app
+        return metrics_app(environ, start_response)
+    
     # Return a simple response
     status = '200 OK'
     headers = [('Content-type', 'text/plain')]